@@ -0,0 +1,191 @@
+"""Analyzer metric benchmarks.
+
+Times add_tick ingest across symbol counts and window sets and batch add_ticks against
+an add_tick loop, times metric reads at several window densities, reports the per-tick
+cost of rolling min/max and quantile tracking against sorting the window, and reports
+bytes per stored tick. The equivalence checks (incremental metrics vs the list-based
+reference math, threaded reads, ...) live in tests/test_analyzer_equivalence.py; the
+run reports whether they pass and ``--check`` runs only them.
+
+    python -m bench.bench_analyzer            # timings, JSON to stdout
+    python -m bench.bench_analyzer --check    # equivalence only, exits 1 on mismatch
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+import numpy as np
+
+from services.analyzer import Analyzer, TickBuffer, TickWindow
+from tests.test_analyzer_equivalence import (
+    mixed_stream, ref_log_return_std, ref_quantile, ref_sma, ref_std, run_checks, synthetic_ticks,
+)
+
+
+def bench_batch_ingest(ticks: int = 1_000_000, symbols=(1, 100, 1000)) -> list:
+    """Analyzer.add_ticks vs an add_tick loop over the same mixed-symbol stream."""
+    results = []
+    for n_symbols in symbols:
+        syms, ts, px, sz = mixed_stream(ticks, n_symbols)
+        cols = np.asarray(syms), np.asarray(ts, dtype=np.int64), np.asarray(px), np.asarray(sz)
+        kwargs = dict(default_window_seconds=60, window_seconds=(10, 60, 300, 900), bar_seconds=(1, 60, 300, 900, 3600))
+        a = Analyzer(**kwargs)
+        add = a.add_tick
+        t0 = time.perf_counter()
+        for i in range(ticks):
+            add(syms[i], ts[i], px[i], sz[i])
+        loop = time.perf_counter() - t0
+        b = Analyzer(**kwargs)
+        t0 = time.perf_counter()
+        b.add_ticks(*cols)
+        bulk = time.perf_counter() - t0
+        results.append({
+            "symbols": n_symbols,
+            "ticks": ticks,
+            "add_tick_loop_per_sec": round(ticks / loop),
+            "add_ticks_per_sec": round(ticks / bulk),
+        })
+    return results
+
+
+def _time_reads(fn, reps: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - t0) / reps * 1e6
+
+
+def bench_reads(densities, reps: int = 200) -> list:
+    results = []
+    for ticks_in_window in densities:
+        a = Analyzer(default_window_seconds=60)
+        rate = ticks_in_window / 60.0
+        for ts, p, s in synthetic_ticks(ticks_in_window * 2, rate):
+            a.add_tick("SYM", ts, p, s)
+        w = a._get_window("SYM", 60)
+        a.ema("SYM", span=20)
+        row = {"ticks_in_window": len(w)}
+        for name, fn in (
+            ("vwap", lambda: a.vwap("SYM")),
+            ("sma", lambda: a.sma("SYM")),
+            ("ema", lambda: a.ema("SYM", span=20)),
+            ("std", lambda: a.std("SYM")),
+            ("volatility", lambda: a.volatility("SYM")),
+            ("ref_sma", lambda: ref_sma(w)),
+            ("ref_std", lambda: ref_std(w)),
+            ("ref_volatility", lambda: ref_log_return_std(w)),
+        ):
+            row[f"{name}_us"] = round(_time_reads(fn, reps), 3)
+        results.append(row)
+    return results
+
+
+def bench_order_stats(densities, ticks: int = 50000) -> list:
+    """Per-tick cost of a dense window with and without order-statistic tracking, and
+    the cost of a median read vs sorting the window."""
+    results = []
+    for ticks_in_window in densities:
+        rate = ticks_in_window / 60.0
+        stream = list(synthetic_ticks(ticks_in_window + ticks, rate, seed=29))
+        row = {"ticks_in_window": ticks_in_window}
+        for name, track in (("add", None), ("add_minmax", "minmax"), ("add_quantiles", "quantiles")):
+            w = TickWindow(60)
+            for ts, p, s in stream[:ticks_in_window]:
+                w.add(ts, p, s)
+            if track == "minmax":
+                w.max()
+            elif track == "quantiles":
+                w.max()
+                w.median()
+            add = w.add
+            t0 = time.perf_counter()
+            for ts, p, s in stream[ticks_in_window:]:
+                add(ts, p, s)
+            row[f"{name}_us"] = round((time.perf_counter() - t0) / ticks * 1e6, 3)
+        reps = max(5, min(200, 2_000_000 // ticks_in_window))
+        row["median_us"] = round(_time_reads(w.median, reps), 3)
+        row["ref_median_us"] = round(_time_reads(lambda: ref_quantile(w, 0.5), reps), 3)
+        results.append(row)
+    return results
+
+
+def bench_ingest(symbol_counts, window_sets, ticks: int = 200000) -> list:
+    """Analyzer.add_tick throughput with ticks round-robined across N symbols."""
+    stream = list(synthetic_ticks(ticks, 1000.0, seed=13))
+    results = []
+    for windows in window_sets:
+        for n_symbols in symbol_counts:
+            a = Analyzer(default_window_seconds=windows[0], window_seconds=windows, bar_seconds=(1, 60))
+            names = [f"S{i:04d}" for i in range(n_symbols)]
+            for name in names:
+                a.register(name)
+            add = a.add_tick
+            t0 = time.perf_counter()
+            for i, (ts, p, s) in enumerate(stream):
+                add(names[i % n_symbols], ts, p, s)
+            elapsed = time.perf_counter() - t0
+            results.append({
+                "symbols": n_symbols,
+                "windows": list(windows),
+                "add_tick_per_sec": round(ticks / elapsed),
+                "add_tick_us": round(elapsed / ticks * 1e6, 3),
+            })
+    return results
+
+
+def bench_memory(n: int = 200000) -> dict:
+    """Bytes per stored tick: deque of (ts, price, size) tuples vs columnar TickBuffer."""
+    ticks = list(synthetic_ticks(n, 1000.0))
+    out = {"ticks": n}
+    for name, factory in (("deque_of_tuples", deque), ("tick_buffer", TickBuffer)):
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        store = factory()
+        for ts, p, sz in ticks:
+            # fresh objects, as they arrive from the decoder
+            store.append((int(ts), float(p) * 1.0, float(sz) + 0.0))
+        used = tracemalloc.get_traced_memory()[0] - base
+        tracemalloc.stop()
+        out[f"{name}_bytes_per_tick"] = round(used / n, 1)
+        del store
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", action="store_true", help="run the equivalence check only")
+    parser.add_argument("--densities", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--symbols", type=int, nargs="+", default=[1, 100, 1000])
+    args = parser.parse_args()
+
+    mismatches = run_checks()
+    if args.check:
+        for m in mismatches[:20]:
+            print(m)
+        print(f"equivalence: {'OK' if not mismatches else f'{len(mismatches)} mismatches'}")
+        sys.exit(1 if mismatches else 0)
+
+    print(json.dumps(run(args.symbols, args.densities, mismatches), indent=2))
+
+
+def run(
+    symbol_counts=(1, 100, 1000), densities=(100, 1000, 10000, 100000), mismatches=None, batch_ticks: int = 1_000_000
+) -> dict:
+    if mismatches is None:
+        mismatches = run_checks()
+    return {
+        "benchmark": "analyzer",
+        "equivalent": not mismatches,
+        "ingest": bench_ingest(symbol_counts, ((60,), (10, 60, 300, 900))),
+        "batch_ingest": bench_batch_ingest(batch_ticks, symbol_counts),
+        "metric_reads": bench_reads(densities),
+        "order_stats": bench_order_stats(densities),
+        "memory": bench_memory(),
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Rolling correlation / beta matrix benchmark and equivalence check.
+
+Feeds synthetic 1s bars for baskets of correlated symbols (a market factor plus
+idiosyncratic noise, some symbols skipping seconds) into CorrelationMatrix and checks
+its incrementally maintained correlation and betas against NumPy recomputed from the
+retained return rows, across window wrap-around, resyncs and late bars. Timings
+compare the per-second rank-one update against recomputing the matrix from the window,
+and report the cost of building the broadcast message.
+
+    python -m bench.bench_correlation --symbols 50 100 200 --seconds 1200
+    python -m bench.bench_correlation --check    # equivalence only, exits 1 on mismatch
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from services.correlation import CorrelationMatrix
+
+BENCHMARK = "SPY"
+
+
+def _basket(n: int) -> List[str]:
+    return [f"S{i:03d}" for i in range(n)]
+
+
+def _bar_seconds(symbols: List[str], seconds: int, seed: int = 11, skip: float = 0.1):
+    """Per second, the basket's 1s bars: price = exp(beta * market + noise)."""
+    rng = random.Random(seed)
+    betas = {s: 0.5 + rng.random() for s in symbols}
+    betas[BENCHMARK] = 1.0
+    log_price = {s: 4.0 + rng.random() for s in symbols}
+    t0 = 1_700_000_000
+    for k in range(seconds):
+        move = rng.gauss(0.0, 1e-3)  # market return this second
+        bars = []
+        for s in symbols:
+            log_price[s] += betas[s] * move + rng.gauss(0.0, 5e-4)
+            if s != BENCHMARK and rng.random() < skip:
+                continue  # no trade this second; the move shows up in its next bar
+            bars.append({"type": "bar", "symbol": s, "bar_s": 1, "time": t0 + k, "close": float(np.exp(log_price[s]))})
+        yield bars
+
+
+def _reference(m: CorrelationMatrix):
+    rows = m.returns()
+    cov = np.cov(rows, rowvar=False, bias=True)
+    sd = np.sqrt(np.diag(cov))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / np.outer(sd, sd)
+    b = m.symbols.index(m.benchmark)
+    return corr, cov[:, b] / cov[b, b]
+
+
+def _max_err(a: np.ndarray, b: np.ndarray) -> float:
+    mask = np.isfinite(a) & np.isfinite(b)
+    return float(np.max(np.abs(a[mask] - b[mask]))) if mask.any() else 0.0
+
+
+def check(symbols: int = 40, window: int = 60, seconds: int = 400) -> List[str]:
+    failures = []
+    names = _basket(symbols)
+    m = CorrelationMatrix(names, BENCHMARK, window=window, lag_s=2)
+    held = []
+    for k, bars in enumerate(_bar_seconds(names + [BENCHMARK], seconds)):
+        if k % 17 == 5 and bars:
+            held.append(bars.pop())  # delivered a few seconds late
+        for bar in bars:
+            m.add_bar(bar)
+        if k % 17 == 9:
+            for bar in held:
+                m.add_bar(bar)
+            held = []
+        if k >= 3 and k % 13 == 0:
+            corr, beta = _reference(m)
+            err = max(_max_err(m.correlation(), corr), _max_err(m.beta(), beta))
+            if err > 1e-9:
+                failures.append(f"second {k}: max error {err:.3g} vs recompute")
+    if m.samples != window:
+        failures.append(f"window holds {m.samples} rows, expected {window}")
+    msg = m.message()
+    n = len(m.symbols)
+    if len(msg["corr"]) != n or any(len(row) != n for row in msg["corr"]) or len(msg["beta"]) != n:
+        failures.append("message matrix has the wrong shape")
+    if msg["beta"][m.symbols.index(BENCHMARK)] != 1.0:
+        failures.append(f"benchmark beta {msg['beta'][m.symbols.index(BENCHMARK)]} != 1")
+    json.dumps(msg, allow_nan=False)  # NaN must not reach the wire
+    return failures
+
+
+def bench(symbols: int, window: int, seconds: int) -> Dict:
+    names = _basket(symbols)
+    m = CorrelationMatrix(names, BENCHMARK, window=window, lag_s=0)
+    seconds_bars = list(_bar_seconds(names + [BENCHMARK], seconds))
+    warm = min(window, seconds // 2)
+    for bars in seconds_bars[:warm]:
+        for bar in bars:
+            m.add_bar(bar)
+    t0 = time.perf_counter()
+    rows = 0
+    for bars in seconds_bars[warm:]:
+        for bar in bars:
+            rows += m.add_bar(bar)
+    update_s = time.perf_counter() - t0
+    bar_count = sum(len(bars) for bars in seconds_bars[warm:])
+
+    t0 = time.perf_counter()
+    reps = 20
+    for _ in range(reps):
+        np.corrcoef(m.returns(), rowvar=False)
+    recompute_s = (time.perf_counter() - t0) / reps
+
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        m.message()
+    message_s = (time.perf_counter() - t0) / reps
+    return {
+        "symbols": len(m.symbols),
+        "window_s": window,
+        "bars_per_sec": round(bar_count / update_s, 1),
+        # one committed grid second: n^2 rank-one update (plus its bars)
+        "update_us": round(update_s / max(rows, 1) * 1e6, 2),
+        # the same second recomputed from the whole window
+        "recompute_us": round(recompute_s * 1e6, 2),
+        "message_us": round(message_s * 1e6, 2),
+    }
+
+
+def run(symbol_counts=(50, 100, 200), window: int = 300, seconds: int = 1200) -> Dict:
+    return {
+        "benchmark": "correlation",
+        "results": [bench(n, window, seconds) for n in symbol_counts],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--window", type=int, default=300, help="window in grid seconds")
+    parser.add_argument("--seconds", type=int, default=1200, help="seconds of bars fed")
+    parser.add_argument("--check", action="store_true", help="verify against NumPy only")
+    args = parser.parse_args()
+    if args.check:
+        failures = check()
+        for f in failures:
+            print(f)
+        print(f"correlation equivalence: {'OK' if not failures else f'{len(failures)} failures'}")
+        sys.exit(1 if failures else 0)
+    print(json.dumps(run(args.symbols, args.window, args.seconds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Upstream frame decode microbenchmark: generic json + datetime vs typed Trade decoding.
+
+"legacy" is the previous path (json.loads into dicts, field lookups, timestamp via
+datetime.fromisoformat); "typed" is services.decode.decode_frame (msgspec when
+installed) and "typed_json" its json.loads fallback. Prints JSON.
+
+    python -m bench.bench_decode --frames 2000 --batch 50
+    python -m bench.bench_decode --check    # nanosecond parser vs datetime, exits 1 on mismatch
+"""
+import argparse
+import datetime
+import json
+import random
+import sys
+import time
+
+from services import decode
+from services.decode import decode_frame, parse_rfc3339_ns
+from services.simulator import rfc3339_ns
+
+
+def make_frames(frames: int, batch: int, seed: int = 3) -> list:
+    rng = random.Random(seed)
+    ts_ns = 1_704_205_800_000_000_000
+    out = []
+    trade_id = 0
+    for _ in range(frames):
+        items = []
+        for _ in range(batch):
+            trade_id += 1
+            ts_ns += rng.randint(1, 5_000_000)
+            items.append({"T": "t", "S": rng.choice(("AAPL", "MSFT", "NVDA")), "i": trade_id, "x": "V",
+                          "p": round(rng.uniform(100, 200), 4), "s": rng.randint(1, 500), "c": ["@", "I"],
+                          "z": "C", "t": rfc3339_ns(ts_ns)})
+        out.append(json.dumps(items))
+    return out
+
+
+def legacy_decode(raw: str) -> list:
+    """The pre-typed path: dicts, then the fields the analyzer needs."""
+    out = []
+    for item in json.loads(raw):
+        ts_raw = item.get("t")
+        try:
+            dt = datetime.datetime.fromisoformat(ts_raw.replace("Z", "+00:00"))
+            ts_ms = int(dt.timestamp() * 1000)
+        except Exception:
+            ts_ms = int(time.time() * 1000)
+        out.append((str(item.get("S")).upper(), ts_ms, float(item.get("p")), float(item.get("s"))))
+    return out
+
+
+def typed_decode(raw: str) -> list:
+    return [(t.symbol, t.ts_ns // 1_000_000, t.price, t.size) for t in decode_frame(raw)]
+
+
+def typed_json_decode(raw: str) -> list:
+    return [
+        (t.symbol, t.ts_ns // 1_000_000, t.price, t.size)
+        for t in (decode._trade_from_dict(it) for it in json.loads(raw))
+    ]
+
+
+def check(n: int = 200000) -> list:
+    """parse_rfc3339_ns against datetime (to the microsecond) on random timestamps and offsets."""
+    mismatches = []
+    rng = random.Random(1)
+    for _ in range(n):
+        sec = rng.randint(0, 4_000_000_000)
+        digits = f"{rng.randint(0, 999_999_999):09d}"[: rng.choice((0, 3, 6, 9))]
+        tz = rng.choice(("Z", "+00:00", "-05:00", "+05:30"))
+        s = datetime.datetime.fromtimestamp(sec, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        s += (f".{digits}" if digits else "") + tz
+        # datetime keeps 6 digits; compare the rest exactly
+        ref = datetime.datetime.fromisoformat(s.replace("Z", "+00:00").replace(f".{digits}", f".{digits[:6]}" if digits else ""))
+        want = int(ref.timestamp()) * 1_000_000_000 + int(digits.ljust(9, "0") or 0)
+        got = parse_rfc3339_ns(s)
+        if got != want:
+            mismatches.append(f"{s}: {got} != {want}")
+    for bad in ("2024-01-02T14:30:00", "2024-01-02 14:30", "2024-13-02T14:30:00Z", "2024-01-02T14:30:00.12x4Z"):
+        if parse_rfc3339_ns(bad) is not None:
+            mismatches.append(f"{bad!r} should not parse")
+    return mismatches
+
+
+def _time(fn, frames) -> float:
+    t0 = time.perf_counter()
+    for raw in frames:
+        fn(raw)
+    return time.perf_counter() - t0
+
+
+def run(frames: int = 2000, batch: int = 50) -> dict:
+    data = make_frames(frames, batch)
+    trades = frames * batch
+    # same records from every path (legacy truncates to ms the same way)
+    if legacy_decode(data[0]) != typed_decode(data[0]) or typed_decode(data[0]) != typed_json_decode(data[0]):
+        raise AssertionError("decoders disagree")
+    out = {
+        "benchmark": "decode",
+        "backend": "msgspec" if decode.msgspec is not None else "json",
+        "trades": trades,
+        "batch": batch,
+    }
+    for name, fn in (("legacy", legacy_decode), ("typed", typed_decode), ("typed_json", typed_json_decode)):
+        elapsed = min(_time(fn, data) for _ in range(3))
+        out[f"{name}_trades_per_sec"] = round(trades / elapsed)
+        out[f"{name}_trade_us"] = round(elapsed / trades * 1e6, 3)
+    stamps = [json.loads(raw)[0]["t"] for raw in data]
+    t0 = time.perf_counter()
+    for s in stamps:
+        parse_rfc3339_ns(s)
+    out["parse_rfc3339_ns_us"] = round((time.perf_counter() - t0) / len(stamps) * 1e6, 3)
+    t0 = time.perf_counter()
+    for s in stamps:
+        datetime.datetime.fromisoformat(s.replace("Z", "+00:00")).timestamp()
+    out["fromisoformat_us"] = round((time.perf_counter() - t0) / len(stamps) * 1e6, 3)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=50, help="trades per frame")
+    parser.add_argument("--check", action="store_true", help="run the timestamp parser check only")
+    args = parser.parse_args()
+    if args.check:
+        mismatches = check()
+        for m in mismatches[:20]:
+            print(m)
+        print(f"parse_rfc3339_ns: {'OK' if not mismatches else f'{len(mismatches)} mismatches'}")
+        sys.exit(1 if mismatches else 0)
+    print(json.dumps(run(args.frames, args.batch), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Full-server fan-out benchmark: tick-to-client latency vs number of /ws clients.
+
+For each client count the server is started against a paced simulator feed, the
+clients connect, then all subscribe over /ws at once (the first subscription starts
+the upstream stream), and every client records the latency of every stamped trade it
+receives. Prints JSON.
+
+    python -m bench.bench_fanout --clients 1 10 100 1000 --rate 200 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+import websockets
+
+from bench.common import ServerUnderTest, latency_summary, stamped_ticks
+
+IDLE_S = 2.0
+
+
+async def _client(url: str, ready: asyncio.Event, go: asyncio.Event, expected: int, deadline: float, out: List[float]):
+    async with websockets.connect(url, max_queue=None, open_timeout=30) as ws:
+        ready.set()
+        await go.wait()
+        await ws.send(json.dumps({"action": "subscribe", "symbols": ["AAPL"]}))
+        got = 0
+        while got < expected and time.time() < deadline:
+            # late subscribers miss the first trades, so stop once the feed goes quiet
+            wait = deadline - time.time() if not got else min(IDLE_S, deadline - time.time())
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=max(0.1, wait))
+            except asyncio.TimeoutError:
+                break
+            got += stamped_ticks(raw, time.time_ns(), out)
+
+
+async def _run_clients(server: ServerUnderTest, clients: int, expected: int, timeout: float):
+    per_client: List[List[float]] = [[] for _ in range(clients)]
+    go = asyncio.Event()
+    readies = [asyncio.Event() for _ in range(clients)]
+    deadline = time.time() + timeout
+    tasks = []
+    for i in range(clients):
+        tasks.append(asyncio.create_task(_client(server.ws_url, readies[i], go, expected, deadline, per_client[i])))
+        if i % 50 == 49:
+            await asyncio.sleep(0.05)  # don't stampede the accept backlog
+    await asyncio.wait_for(asyncio.gather(*(r.wait() for r in readies)), timeout=60)
+    go.set()
+    t0 = time.time()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return per_client, time.time() - t0
+
+
+def run_clients(clients: int, rate: float, seconds: float, timeout: float) -> dict:
+    expected = int(rate * seconds)
+    env = {"CLIENT_QUEUE_POLICY": "drop_oldest", "CLIENT_QUEUE_SIZE": str(max(1000, expected))}
+    with ServerUnderTest(env, symbols=("AAPL",), rate=rate, max_trades=expected) as server:
+        per_client, elapsed = asyncio.run(_run_clients(server, clients, expected, timeout))
+    latencies = [x for lat in per_client for x in lat]
+    delivered = len(latencies)
+    return {
+        "clients": clients,
+        "ticks_sent": expected,
+        "deliveries": delivered,
+        "delivery_ratio": round(delivered / (expected * clients), 4) if expected else None,
+        "deliveries_per_sec": round(delivered / elapsed, 1) if elapsed else None,
+        **latency_summary(latencies),
+    }
+
+
+def run(clients=(1, 10, 100, 1000), rate: float = 200.0, seconds: float = 10.0, timeout: float = 60.0) -> dict:
+    return {
+        "benchmark": "fanout",
+        "rate_per_sec": rate,
+        "seconds": seconds,
+        "results": [run_clients(n, rate, seconds, timeout) for n in clients],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--rate", type=float, default=200.0, help="simulated trades/sec")
+    parser.add_argument("--seconds", type=float, default=10.0, help="feed duration")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.clients, args.rate, args.seconds, args.timeout), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Multi-worker fan-out benchmark: one ingest hub, N uvicorn worker processes serving /ws.
+
+Runs the fan-out scenario of bench_fanout against ``uvicorn --workers N`` with
+``HUB_MODE=auto`` (one worker becomes the hub, the rest receive its serialized frames
+over the hub socket) and reports tick-to-client latency, delivery throughput and how
+many upstream connections the feed saw. Prints JSON.
+
+    python -m bench.bench_hub --workers 1 2 4 --clients 1000 --rate 200 --seconds 10
+    python -m bench.bench_hub --check    # one upstream connection, every client fed; exits 1 on failure
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from typing import Dict, List
+
+from bench.bench_fanout import _run_clients
+from bench.common import ServerUnderTest, latency_summary
+
+
+def run_workers(workers: int, clients: int, rate: float, seconds: float, timeout: float) -> Dict:
+    expected = int(rate * seconds)
+    env = {
+        "CLIENT_QUEUE_POLICY": "drop_oldest",
+        "CLIENT_QUEUE_SIZE": str(max(1000, expected)),
+        "HUB_MODE": "auto" if workers > 1 else "off",
+        # private socket so concurrent runs don't join each other's hub
+        "HUB_ADDRESS": os.path.join(tempfile.gettempdir(), f"stock-streamer-bench-{os.getpid()}.sock"),
+    }
+    with ServerUnderTest(env, workers=workers, symbols=("AAPL",), rate=rate, max_trades=expected) as server:
+        per_client, elapsed = asyncio.run(_run_clients(server, clients, expected, timeout))
+        upstream = server.sim.connects
+    latencies = [x for lat in per_client for x in lat]
+    return {
+        "workers": workers,
+        "clients": clients,
+        "upstream_connections": upstream,
+        "ticks_sent": expected,
+        "deliveries": len(latencies),
+        "delivery_ratio": round(len(latencies) / (expected * clients), 4) if expected else None,
+        "deliveries_per_sec": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "starved_clients": sum(1 for lat in per_client if not lat),
+        **latency_summary(latencies),
+    }
+
+
+def run(workers=(1, 2, 4), clients: int = 1000, rate: float = 200.0, seconds: float = 10.0,
+        timeout: float = 60.0) -> Dict:
+    return {
+        "benchmark": "hub",
+        "clients": clients,
+        "rate_per_sec": rate,
+        "seconds": seconds,
+        "results": [run_workers(n, clients, rate, seconds, timeout) for n in workers],
+    }
+
+
+def check(workers: int = 3, clients: int = 60) -> List[str]:
+    failures = []
+    r = run_workers(workers, clients, rate=100.0, seconds=3.0, timeout=30.0)
+    if r["upstream_connections"] != 1:
+        failures.append(f"{workers} workers opened {r['upstream_connections']} upstream connections")
+    if r["starved_clients"] or r["delivery_ratio"] < 0.99:
+        failures.append(f"{r['starved_clients']} clients got nothing, delivery ratio {r['delivery_ratio']}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=200.0, help="simulated trades/sec")
+    parser.add_argument("--seconds", type=float, default=10.0, help="feed duration")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--check", action="store_true", help="verify single ingest and delivery only")
+    args = parser.parse_args()
+    if args.check:
+        failures = check()
+        for f in failures:
+            print(f)
+        print(f"hub fan-out: {'OK' if not failures else f'{len(failures)} failures'}")
+        sys.exit(1 if failures else 0)
+    print(json.dumps(run(args.workers, args.clients, args.rate, args.seconds, args.timeout), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Tick journal benchmark: append throughput and warm-restart (replay) time.
+
+Writes a synthetic trading day into a temporary journal, then replays it into a
+fresh Analyzer configured like the server. Prints JSON.
+
+    python -m bench.bench_journal --ticks 10000000 --symbols 100
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+from services.analyzer import Analyzer
+from services.journal import TickJournal
+
+DAY_START_MS = 1_700_006_400_000  # 2023-11-15 00:00 UTC
+SESSION_MS = int(6.5 * 3600 * 1000)
+
+
+def synthetic_day(ticks: int, symbols: int, seed: int = 5):
+    rng = np.random.default_rng(seed)
+    ts = np.sort(rng.integers(0, SESSION_MS, ticks)) + DAY_START_MS + 14 * 3600 * 1000
+    sym = rng.integers(0, symbols, ticks)
+    price = 100.0 * np.exp(np.cumsum(rng.normal(0, 1e-4, ticks)))
+    size = rng.integers(1, 500, ticks).astype(np.float64)
+    return ts, sym, price, size
+
+
+def run(ticks: int = 10_000_000, symbols: int = 100) -> dict:
+    ts, sym, price, size = synthetic_day(ticks, symbols)
+    names = [f"S{i:04d}" for i in range(symbols)]
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = TickJournal(tmp, fsync_interval=1.0)
+        journal.start()
+        rows = zip(sym.tolist(), ts.tolist(), price.tolist(), size.tolist())
+        t0 = time.perf_counter()
+        for s, t, p, q in rows:
+            journal.append(names[s], t, p, q)
+        journal.close()
+        write_s = time.perf_counter() - t0
+
+        analyzer = Analyzer(
+            default_window_seconds=60,
+            window_seconds=(10, 60, 300, 900),
+            bar_seconds=(1, 60, 300, 900, 3600),
+        )
+        t0 = time.perf_counter()
+        replayed = TickJournal(tmp).replay(analyzer, day=journal.days()[0])
+        replay_s = time.perf_counter() - t0
+
+    return {
+        "benchmark": "journal",
+        "ticks": ticks,
+        "symbols": symbols,
+        "write_seconds": round(write_s, 3),
+        "write_ticks_per_sec": round(ticks / write_s),
+        "replayed_ticks": replayed,
+        "warm_restart_seconds": round(replay_s, 3),
+        "replay_ticks_per_sec": round(replayed / replay_s),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=10_000_000)
+    parser.add_argument("--symbols", type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(run(args.ticks, args.symbols), indent=2))
+
+
+if __name__ == "__main__":
+    main()
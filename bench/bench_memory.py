@@ -0,0 +1,142 @@
+"""Analyzer memory governance benchmark: accounting accuracy, budget and sweep cost.
+
+Feeds a universe of symbols with skewed activity (a few busy names, a long quiet
+tail that stops trading halfway), then runs ``Analyzer.sweep`` with an idle TTL and
+a byte budget. Reports the estimated bytes (``Analyzer.memory``) against what
+tracemalloc measured, the bytes left after the sweep and how long a sweep takes.
+Prints JSON.
+
+    python -m bench.bench_memory --symbols 5000 --budget-mb 64
+    python -m bench.bench_memory --check    # budget / idle eviction / estimate accuracy, exits 1 on failure
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+import numpy as np
+
+from services.analyzer import Analyzer
+
+CONFIG = dict(default_window_seconds=60, window_seconds=(10, 60, 300, 900), bar_seconds=(1, 60, 300, 900, 3600),
+              bar_history=1000)
+
+
+def feed(analyzer: Analyzer, symbols: int, ticks: int, seconds: int, seed: int = 9) -> List[str]:
+    """``ticks`` trades over ``seconds`` of feed time; the quieter half stops at the midpoint."""
+    rng = np.random.default_rng(seed)
+    names = [f"S{i:05d}" for i in range(symbols)]
+    # Zipf-like activity: symbol k trades ~1/(k+1) as often as the busiest
+    weights = 1.0 / np.arange(1, symbols + 1)
+    sym = rng.choice(symbols, size=ticks, p=weights / weights.sum())
+    ts = np.sort(rng.integers(0, seconds * 1000, ticks)) + 1_700_000_000_000
+    quiet = sym >= symbols // 2
+    keep = ~quiet | (ts < ts[0] + seconds * 500)
+    sym, ts = sym[keep], ts[keep]
+    prices = 100.0 + rng.normal(0, 0.05, len(ts)).cumsum() * 0.01
+    analyzer.add_ticks(np.asarray(names)[sym], ts, prices, rng.integers(1, 500, len(ts)).astype(np.float64),
+                       collect=False)
+    return names
+
+
+def _measured_bytes(symbols: int, ticks: int, seconds: int) -> Dict:
+    gc.collect()
+    tracemalloc.start()
+    analyzer = Analyzer(**CONFIG)
+    feed(analyzer, symbols, ticks, seconds)
+    gc.collect()
+    measured = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {"estimated_bytes": analyzer.memory(0)["bytes"], "measured_bytes": measured}
+
+
+def run_sweep(symbols: int, ticks: int, seconds: int, idle_ttl_s: float, budget_mb: float) -> Dict:
+    analyzer = Analyzer(**CONFIG, idle_ttl_s=idle_ttl_s, max_bytes=int(budget_mb * 1024 * 1024))
+    feed(analyzer, symbols, ticks, seconds)
+    before = analyzer.memory(0)
+    last_ms = {symbol: st.last_ms for symbol, st in analyzer.symbols.items()}
+    t0 = time.perf_counter()
+    evicted = analyzer.sweep()
+    first_us = (time.perf_counter() - t0) * 1e6
+    t0 = time.perf_counter()
+    analyzer.sweep()
+    steady_us = (time.perf_counter() - t0) * 1e6
+    after = analyzer.memory(0)
+    return {
+        "bytes_before": before["bytes"],
+        "bytes_after": after["bytes"],
+        "budget_bytes": analyzer.max_bytes,
+        "symbols_before": before["symbols"],
+        "symbols_after": after["symbols"],
+        "evicted": len(evicted),
+        "sweep_us": round(first_us),
+        "steady_sweep_us": round(steady_us),
+        "_analyzer": analyzer,
+        "_evicted_last_ms": [last_ms[s] for s in evicted],
+    }
+
+
+def run(symbols: int = 5000, ticks: int = 1_000_000, seconds: int = 3600, idle_ttl_s: float = 900,
+        budget_mb: float = 64) -> Dict:
+    accuracy = _measured_bytes(symbols, ticks, seconds)
+    accuracy["estimate_ratio"] = round(accuracy["estimated_bytes"] / accuracy["measured_bytes"], 3)
+    sweep = run_sweep(symbols, ticks, seconds, idle_ttl_s, budget_mb)
+    sweep.pop("_analyzer")
+    sweep.pop("_evicted_last_ms")
+    return {"benchmark": "memory", "symbols": symbols, "ticks": ticks, "accounting": accuracy, "sweep": sweep}
+
+
+def check() -> List[str]:
+    failures = []
+    symbols, ticks, seconds = 2000, 200_000, 3600
+    acc = _measured_bytes(symbols, ticks, seconds)
+    ratio = acc["estimated_bytes"] / acc["measured_bytes"]
+    if not 0.7 <= ratio <= 1.3:
+        failures.append(f"estimate {acc['estimated_bytes']} vs measured {acc['measured_bytes']} ({ratio:.2f}x)")
+
+    r = run_sweep(symbols, ticks, seconds, idle_ttl_s=600, budget_mb=0)
+    analyzer = r["_analyzer"]
+    cutoff = analyzer.clock_ms() - 600_000
+    stale = [s for s, st in analyzer.symbols.items() if st.last_ms < cutoff]
+    if stale or not r["evicted"]:
+        failures.append(f"idle: {r['evicted']} evicted, {len(stale)} idle symbols left")
+    for symbol, st in analyzer.symbols.items():
+        w = st.windows[60]
+        if len(w) and st.buffer.ts_at(w._start) < analyzer.clock_ms() - 60_000:
+            failures.append(f"{symbol}: 60s window holds ticks older than the feed clock allows")
+            break
+
+    budget_mb = 4
+    r = run_sweep(symbols, ticks, seconds, idle_ttl_s=0, budget_mb=budget_mb)
+    if r["bytes_after"] > r["budget_bytes"]:
+        failures.append(f"budget: {r['bytes_after']} bytes after sweep > {r['budget_bytes']}")
+    # least recently traded first: every survivor traded no earlier than any evicted symbol
+    kept = [st.last_ms for st in r["_analyzer"].symbols.values()]
+    if not r["evicted"] or (kept and max(r["_evicted_last_ms"]) > min(kept)):
+        failures.append(f"budget: {r['evicted']} evicted, not in least-recently-traded order")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=5000)
+    parser.add_argument("--ticks", type=int, default=1_000_000)
+    parser.add_argument("--seconds", type=int, default=3600, help="feed time covered by the ticks")
+    parser.add_argument("--idle-ttl", type=float, default=900, help="Analyzer idle_ttl_s")
+    parser.add_argument("--budget-mb", type=float, default=64, help="Analyzer max_bytes in MiB")
+    parser.add_argument("--check", action="store_true", help="verify eviction and accounting only")
+    args = parser.parse_args()
+    if args.check:
+        failures = check()
+        for f in failures:
+            print(f)
+        print(f"memory governance: {'OK' if not failures else f'{len(failures)} failures'}")
+        sys.exit(1 if failures else 0)
+    print(json.dumps(run(args.symbols, args.ticks, args.seconds, args.idle_ttl, args.budget_mb), indent=2))
+
+
+if __name__ == "__main__":
+    main()
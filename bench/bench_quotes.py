@@ -0,0 +1,158 @@
+"""Quote path benchmark: decode and top-of-book ingest throughput plus book conflation.
+
+"decode" is services.decode.decode_frame on quote-only frames; "ingest" adds
+``Analyzer.add_quote`` per quote, as the server does. "conflation" replays the quote
+timestamps through a ``MetricsScheduler`` at ``QUOTE_INTERVAL_MS`` and reports how
+many book messages clients would receive per quote. Prints JSON.
+
+    python -m bench.bench_quotes --frames 2000 --batch 200 --symbols 500
+    python -m bench.bench_quotes --check    # spread stats vs closed form, exits 1 on mismatch
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from typing import Dict, List
+
+from services.analyzer import Analyzer, QuoteBook
+from services.decode import Quote, decode_frame
+from services.scheduler import MetricsScheduler
+from services.simulator import rfc3339_ns
+
+
+def make_frames(frames: int, batch: int, symbols: int, seed: int = 5,
+                min_gap_ns: int = 1, max_gap_ns: int = 200_000) -> List[str]:
+    rng = random.Random(seed)
+    names = [f"S{i:04d}" for i in range(symbols)]
+    mids = {s: rng.uniform(20, 500) for s in names}
+    ts_ns = 1_704_205_800_000_000_000
+    out = []
+    for _ in range(frames):
+        items = []
+        for _ in range(batch):
+            ts_ns += rng.randint(min_gap_ns, max_gap_ns)
+            s = rng.choice(names)
+            mids[s] *= math.exp(rng.gauss(0, 1e-4))
+            half = 0.005 + abs(rng.gauss(0, mids[s] * 5e-5))
+            items.append({"T": "q", "S": s, "bx": "V", "bp": round(mids[s] - half, 2), "bs": rng.randint(1, 20) * 100,
+                          "ax": "V", "ap": round(mids[s] + half, 2), "as": rng.randint(1, 20) * 100,
+                          "c": ["R"], "z": "C", "t": rfc3339_ns(ts_ns)})
+        out.append(json.dumps(items))
+    return out
+
+
+def _decode_all(frames: List[str]) -> List[Quote]:
+    return [q for raw in frames for q in decode_frame(raw)]
+
+
+def run_decode(frames: List[str]) -> float:
+    t0 = time.perf_counter()
+    n = 0
+    for raw in frames:
+        n += len(decode_frame(raw))
+    return n / (time.perf_counter() - t0)
+
+
+def run_ingest(frames: List[str]) -> float:
+    analyzer = Analyzer(default_window_seconds=60)
+    add = analyzer.add_quote
+    t0 = time.perf_counter()
+    n = 0
+    for raw in frames:
+        quotes = decode_frame(raw)
+        for q in quotes:
+            add(q.symbol.upper(), q.ts_ns // 1_000_000, q.bid, q.bid_size, q.ask, q.ask_size)
+        n += len(quotes)
+    return n / (time.perf_counter() - t0)
+
+
+def run_conflation(quotes: List[Quote], interval_ms: float) -> Dict:
+    """Books emitted when the scheduler ticks every ``interval_ms`` of feed time."""
+    scheduler = MetricsScheduler(lambda symbols: [], lambda messages: None, interval_ms)
+    books = 0
+    t_next = quotes[0].ts_ns / 1e6 + interval_ms
+    for q in quotes:
+        now_ms = q.ts_ns / 1e6
+        while now_ms >= t_next:
+            books += len(scheduler.due(t_next))
+            t_next += interval_ms
+        scheduler.mark(q.symbol)
+    books += len(scheduler.due(t_next))
+    return {"interval_ms": interval_ms, "books": books, "books_per_quote": round(books / len(quotes), 4)}
+
+
+def _reference(book_quotes: List[tuple], tau_ms: float):
+    """Closed-form time-weighted spread mean/std of a QuoteBook fed ``book_quotes``."""
+    ts = [q[0] for q in book_quotes]
+    spreads = [q[3] - q[1] for q in book_quotes]
+    last = ts[-1]
+    if len(book_quotes) < 2:
+        return None, None
+    # the first spread seeds the average; every later one weighs the time it was in force
+    weights = [math.exp(-(last - ts[1]) / tau_ms)]
+    weights += [math.exp(-(last - ts[i + 1]) / tau_ms) - math.exp(-(last - ts[i]) / tau_ms) for i in range(1, len(ts) - 1)]
+    mean = sum(w * s for w, s in zip(weights, spreads))
+    var = sum(w * (s - mean) ** 2 for w, s in zip(weights, spreads))
+    return mean, math.sqrt(var)
+
+
+def check(frames: int = 50, batch: int = 100, symbols: int = 5, tau_ms: float = 5000.0) -> List[str]:
+    mismatches = []
+    # at least 1ms between quotes, so every quote after the first two enters the statistics
+    quotes = _decode_all(make_frames(frames, batch, symbols, min_gap_ns=1_000_000, max_gap_ns=20_000_000))
+    by_symbol: Dict[str, List[tuple]] = {}
+    books: Dict[str, QuoteBook] = {}
+    for q in quotes:
+        ts_ms = q.ts_ns // 1_000_000
+        by_symbol.setdefault(q.symbol, []).append((ts_ms, q.bid, q.bid_size, q.ask, q.ask_size))
+        book = books.get(q.symbol)
+        if book is None:
+            book = books[q.symbol] = QuoteBook(q.symbol, tau_ms)
+        book.update(ts_ms, q.bid, q.bid_size, q.ask, q.ask_size)
+    for symbol, seq in sorted(by_symbol.items()):
+        want_mean, want_std = _reference(seq, tau_ms)
+        msg = books[symbol].message(60)
+        if msg["bid"] != seq[-1][1] or msg["ask"] != seq[-1][3] or msg["ask_size"] != seq[-1][4]:
+            mismatches.append(f"{symbol}: top of book {msg['bid']}/{msg['ask']} != last quote")
+        for name, got, want in (("spread_avg", msg["spread_avg"], want_mean), ("spread_std", msg["spread_std"], want_std)):
+            if got is None or want is None or abs(got - want) > 1e-9 * max(1.0, abs(want)):
+                mismatches.append(f"{symbol}: {name} {got} != {want}")
+    return mismatches
+
+
+def run(frames: int = 2000, batch: int = 200, symbols: int = 500, intervals=(100, 250, 1000)) -> Dict:
+    data = make_frames(frames, batch, symbols)
+    quotes = _decode_all(data)
+    return {
+        "benchmark": "quotes",
+        "quotes": len(quotes),
+        "symbols": symbols,
+        "results": [
+            {"mode": "decode", "quotes_per_sec": round(run_decode(data))},
+            {"mode": "ingest", "quotes_per_sec": round(run_ingest(data))},
+        ],
+        "conflation": [run_conflation(quotes, ms) for ms in intervals],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=200, help="quotes per frame")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--intervals", type=float, nargs="+", default=[100, 250, 1000], help="book intervals (ms)")
+    parser.add_argument("--check", action="store_true", help="verify spread statistics only")
+    args = parser.parse_args()
+    if args.check:
+        mismatches = check()
+        for m in mismatches[:20]:
+            print(m)
+        print(f"quote book vs closed form: {'OK' if not mismatches else f'{len(mismatches)} mismatches'}")
+        sys.exit(1 if mismatches else 0)
+    print(json.dumps(run(args.frames, args.batch, args.symbols, args.intervals), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Upstream reconnect benchmark against a simulator that drops every connection.
+
+Runs each streamer mode in-process against ``MarketSimulator(drop_every=...)``:
+symbols are subscribed one call at a time (coalesced into one payload), half of
+them are unsubscribed midway, and the run reports reconnect time, the missed-data
+gap per reconnect and the control frames the feed received. Prints JSON.
+
+    python -m bench.bench_reconnect --seconds 6 --drop-every 1
+    python -m bench.bench_reconnect --check   # resubscription / coalescing invariants, exits 1 on failure
+"""
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from queue import Empty, Queue
+from typing import Dict, List, Set
+
+from bench.common import free_port
+from services.decode import Trade
+from services.metrics import PipelineMetrics
+from services.simulator import MarketSimulator
+from services.websocket_alpaca import AsyncWebSocketStreamer, WebSocketStreamer
+
+SYMBOLS = [f"S{i:02d}" for i in range(20)]
+
+
+def _hist_ms(name: str, h) -> Dict:
+    return {
+        f"{name}_ms_p50": round(h.quantile(0.5) / 1000, 3) if h.count else None,
+        f"{name}_ms_max": round(h.max_us / 1000, 3) if h.count else None,
+    }
+
+
+class _Seen:
+    """Symbols with trades per connection epoch (bumped on every authentication)."""
+
+    def __init__(self):
+        self.epoch = 0
+        self.by_epoch: Dict[int, Set[str]] = {0: set()}
+        self.trades = 0
+
+    def add(self, item):
+        if type(item) is Trade:
+            self.by_epoch[self.epoch].add(item.symbol)
+            self.trades += 1
+        elif isinstance(item, dict) and item.get("T") == "success" and item.get("msg") == "authenticated":
+            self.epoch += 1
+            self.by_epoch[self.epoch] = set()
+
+
+def _result(mode: str, streamer, sim: MarketSimulator, metrics: PipelineMetrics, seen: _Seen, half: int,
+            switch_epoch: int) -> Dict:
+    keep = set(SYMBOLS[half:])
+    # epochs fully after the unsubscribe; the last one may be cut short by the end of the run
+    later = [seen.by_epoch[e] for e in range(switch_epoch + 1, seen.epoch)]
+    return {
+        "mode": mode,
+        "connects": sim.connects,
+        "drops": sim.drops,
+        "reconnects": streamer.reconnects,
+        "control_frames": sim.control_frames,
+        "trades": seen.trades,
+        **_hist_ms("reconnect", metrics.reconnect),
+        **_hist_ms("gap", metrics.gap),
+        "_resubscribed": all(s == set(SYMBOLS) for s in (seen.by_epoch[e] for e in range(1, switch_epoch)))
+        and all(s == keep for s in later) and bool(later),
+    }
+
+
+def _setup(drop_every: float, rate: float):
+    sim = MarketSimulator(port=free_port(), symbols=SYMBOLS, rate=rate, drop_every=drop_every).start_in_thread()
+    return sim, PipelineMetrics(), _Seen(), len(SYMBOLS) // 2
+
+
+def run_thread(seconds: float, drop_every: float, rate: float) -> Dict:
+    sim, metrics, seen, half = _setup(drop_every, rate)
+    q: Queue = Queue()
+    streamer = WebSocketStreamer(out_queue=q, url=f"ws://127.0.0.1:{sim.port}", metrics=metrics,
+                                 backoff_min_ms=50, backoff_max_ms=400)
+    stop = threading.Event()
+
+    def drain():
+        while not stop.is_set():
+            try:
+                seen.add(q.get(timeout=0.1))
+            except Empty:
+                pass
+
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+    try:
+        for s in SYMBOLS:
+            streamer.subscribe_trades([s])
+        streamer.start()
+        time.sleep(seconds / 2)
+        for s in SYMBOLS[:half]:
+            streamer.unsubscribe_trades([s])
+        switch_epoch = seen.epoch
+        time.sleep(seconds / 2)
+    finally:
+        streamer.stop()
+        stop.set()
+        reader.join(2)
+        sim.stop()
+    return _result("thread", streamer, sim, metrics, seen, half, switch_epoch)
+
+
+def run_async(seconds: float, drop_every: float, rate: float) -> Dict:
+    sim, metrics, seen, half = _setup(drop_every, rate)
+
+    async def main():
+        q: asyncio.Queue = asyncio.Queue()
+        streamer = AsyncWebSocketStreamer(out_queue=q, url=f"ws://127.0.0.1:{sim.port}", metrics=metrics,
+                                          backoff_min_ms=50, backoff_max_ms=400)
+
+        async def drain():
+            while True:
+                seen.add(await q.get())
+
+        reader = asyncio.get_event_loop().create_task(drain())
+        for s in SYMBOLS:
+            streamer.subscribe_trades([s])
+        streamer.start()
+        await asyncio.sleep(seconds / 2)
+        for s in SYMBOLS[:half]:
+            streamer.unsubscribe_trades([s])
+        switch_epoch = seen.epoch
+        await asyncio.sleep(seconds / 2)
+        streamer.stop()
+        reader.cancel()
+        return streamer, switch_epoch
+
+    try:
+        streamer, switch_epoch = asyncio.run(main())
+    finally:
+        sim.stop()
+    return _result("async", streamer, sim, metrics, seen, half, switch_epoch)
+
+
+def run(seconds: float = 6.0, drop_every: float = 1.0, rate: float = 50.0) -> Dict:
+    results = [run_thread(seconds, drop_every, rate), run_async(seconds, drop_every, rate)]
+    for r in results:
+        r.pop("_resubscribed")
+    return {"benchmark": "reconnect", "seconds": seconds, "drop_every": drop_every, "results": results}
+
+
+def check() -> List[str]:
+    failures = []
+    for r in (run_thread(6.0, 1.0, 50.0), run_async(6.0, 1.0, 50.0)):
+        mode = r["mode"]
+        if r["reconnects"] < r["drops"] - 1:
+            failures.append(f"{mode}: {r['reconnects']} reconnects for {r['drops']} drops")
+        if not r["_resubscribed"]:
+            failures.append(f"{mode}: symbols after a reconnect differ from the desired set")
+        # one subscribe per connection plus the coalesced midway unsubscribe
+        if r["control_frames"] > r["connects"] + 1:
+            failures.append(f"{mode}: {r['control_frames']} control frames for {r['connects']} connections")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=6.0)
+    parser.add_argument("--drop-every", type=float, default=1.0)
+    parser.add_argument("--rate", type=float, default=50.0, help="trades/sec per symbol")
+    parser.add_argument("--check", action="store_true", help="verify resubscription and coalescing only")
+    args = parser.parse_args()
+    if args.check:
+        failures = check()
+        for f in failures:
+            print(f)
+        print(f"reconnect / resubscribe: {'OK' if not failures else f'{len(failures)} failures'}")
+        sys.exit(1 if failures else 0)
+    print(json.dumps(run(args.seconds, args.drop_every, args.rate), indent=2))
+
+
+if __name__ == "__main__":
+    main()
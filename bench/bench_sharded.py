@@ -0,0 +1,170 @@
+"""Sharded analyzer benchmark: ingest throughput vs worker processes, plus an
+equivalence check against the in-process Analyzer.
+
+Every tick goes through ``ShardedAnalyzer.submit`` (metrics requested on every
+``metrics_every``-th tick of a symbol); the run ends when
+the last shard has answered a call, i.e. processed everything sent before it.
+Prints JSON.
+
+    python -m bench.bench_sharded --ticks 500000 --symbols 200 --shards 1 2 4
+    python -m bench.bench_sharded --check    # sharded output == in-process, killed worker fails fast; exits 1 on failure
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from services.analyzer import Analyzer
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from services.sharded import ShardDied, ShardedAnalyzer
+
+CONFIG = dict(default_window_seconds=60, window_seconds=(10, 60, 300), bar_seconds=(1, 60, 300), bar_history=1000)
+
+
+def make_ticks(n: int, symbols: int, seed: int = 11) -> list:
+    rng = random.Random(seed)
+    names = [f"S{i:04d}" for i in range(symbols)]
+    prices = {s: 100.0 for s in names}
+    ts = 1_700_000_000_000
+    out = []
+    for _ in range(n):
+        ts += rng.randint(0, 3)
+        s = rng.choice(names)
+        prices[s] = max(0.01, prices[s] * math.exp(rng.gauss(0, 0.0005)))
+        out.append((s, ts, round(prices[s], 4), float(rng.randint(1, 500))))
+    return out
+
+
+def _with_metrics_flags(ticks: list, metrics_every: int) -> list:
+    seen: Dict[str, int] = defaultdict(int)
+    out = []
+    for symbol, ts, price, size in ticks:
+        seen[symbol] += 1
+        out.append((symbol, ts, price, size, seen[symbol] % metrics_every == 0))
+    return out
+
+
+def run_single(ticks: list) -> Dict[str, List]:
+    """In-process reference: per-symbol sequence of bars and metrics messages."""
+    analyzer = Analyzer(**CONFIG)
+    out: Dict[str, List] = defaultdict(list)
+    for symbol, ts, price, size, want_metrics in ticks:
+        for bar in analyzer.add_tick(symbol, ts, price, size):
+            out[symbol].append(bar)
+        if want_metrics:
+            out[symbol].append(analyzer.snapshot(symbol))
+    return out
+
+
+def run_sharded(ticks: list, shards: int, max_batch: int = 512):
+    out: Dict[str, List] = defaultdict(list)
+    lock = threading.Lock()
+
+    def collect(messages):
+        with lock:
+            for _, msg in messages:
+                out[msg["symbol"]].append(msg)
+
+    sa = ShardedAnalyzer(shards, CONFIG, collect, max_batch=max_batch).start()
+    try:
+        # workers are up once they answer
+        for fut in sa.call_all("symbol_count"):
+            fut.result(timeout=60)
+        t0 = time.perf_counter()
+        for tick in ticks:
+            sa.submit(*tick)
+        sa.flush()
+        for fut in sa.call_all("symbol_count"):
+            fut.result(timeout=600)
+        elapsed = time.perf_counter() - t0
+    finally:
+        sa.close()
+    return out, elapsed, sa.batches
+
+
+def check(n: int = 100_000, symbols: int = 50, shard_counts=(1, 3)) -> list:
+    ticks = _with_metrics_flags(make_ticks(n, symbols), 20)
+    want = run_single(ticks)
+    mismatches = []
+    for shards in shard_counts:
+        got, _, _ = run_sharded(ticks, shards, max_batch=97)
+        for symbol in sorted(set(want) | set(got)):
+            if want.get(symbol) != got.get(symbol):
+                mismatches.append(f"shards={shards} {symbol}: {len(got.get(symbol, []))} vs {len(want.get(symbol, []))} messages")
+    return mismatches
+
+
+def check_dead_shard(n: int = 200_000, symbols: int = 50) -> list:
+    """Kill a worker with work and a call queued behind it: the call fails instead of
+    hanging, later calls to it fail at once, ticks for it are dropped, the others answer."""
+    failures = []
+    sa = ShardedAnalyzer(3, CONFIG, lambda messages: None).start()
+    try:
+        for fut in sa.call_all("symbol_count"):
+            fut.result(timeout=60)
+        victim = 1
+        for tick in make_ticks(n, symbols):
+            sa.submit(*tick)
+        sa.flush()
+        pending = sa.call(victim, "symbol_count")
+        sa._procs[victim].kill()
+        try:
+            pending.result(timeout=10)  # answered before the kill: fine too
+        except ShardDied:
+            pass
+        except FutureTimeout:
+            failures.append("dead shard: outstanding call still pending after 10s")
+        later = sa.call(victim, "symbol_count")
+        if not later.done() or not isinstance(later.exception(), ShardDied):
+            failures.append("dead shard: a new call did not fail immediately")
+        if victim not in sa.dead:
+            failures.append("dead shard: not marked dead")
+        for symbol, ts, price, size in make_ticks(1000, symbols, seed=5):
+            sa.submit(symbol, ts, price, size)
+        sa.flush()
+        for i in (0, 2):
+            try:
+                sa.call(i, "symbol_count").result(timeout=30)
+            except Exception as e:
+                failures.append(f"dead shard: live shard {i} failed: {e!r}")
+    finally:
+        sa.close()
+    return failures
+
+
+def run(ticks: int = 500_000, symbols: int = 200, shard_counts=(1, 2, 4), metrics_every: int = 50) -> dict:
+    data = _with_metrics_flags(make_ticks(ticks, symbols), metrics_every)
+    t0 = time.perf_counter()
+    run_single(data)
+    single = time.perf_counter() - t0
+    results = [{"shards": 0, "ticks_per_sec": round(ticks / single)}]
+    for shards in shard_counts:
+        _, elapsed, batches = run_sharded(data, shards)
+        results.append({"shards": shards, "ticks_per_sec": round(ticks / elapsed), "batches": batches})
+    return {"benchmark": "sharded", "ticks": ticks, "symbols": symbols, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=500_000)
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--check", action="store_true", help="run the equivalence check only")
+    args = parser.parse_args()
+    if args.check:
+        mismatches = check() + check_dead_shard()
+        for m in mismatches[:20]:
+            print(m)
+        print(f"sharded vs in-process: {'OK' if not mismatches else f'{len(mismatches)} mismatches'}")
+        sys.exit(1 if mismatches else 0)
+    print(json.dumps(run(args.ticks, args.symbols, args.shards), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Compare the threaded and asyncio ingest pipelines end to end.
+
+Starts the local market simulator, launches the server once per STREAMER_MODE,
+connects one /ws client and reports ticks/sec and tick-to-client latency as JSON.
+
+    python -m bench.bench_streamer --ticks 50000 --modes thread async
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import websockets
+
+from bench.common import ServerUnderTest, latency_summary, stamped_ticks
+
+
+async def _measure(server: ServerUnderTest, ticks: int, timeout: float):
+    latencies = []
+    async with websockets.connect(server.ws_url, max_queue=None) as ws:
+        await ws.send(json.dumps({"action": "subscribe", "symbols": ["AAPL"]}))
+        first = None
+        deadline = time.time() + timeout
+        while len(latencies) < ticks and time.time() < deadline:
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=max(0.1, deadline - time.time()))
+            except asyncio.TimeoutError:
+                break
+            now_ns = time.time_ns()
+            if stamped_ticks(raw, now_ns, latencies) and first is None:
+                first = now_ns
+        elapsed = (time.time_ns() - first) / 1e9 if first else 0.0
+    return latencies, elapsed
+
+
+def run_mode(mode: str, ticks: int, batch: int, timeout: float) -> dict:
+    env = {
+        "STREAMER_MODE": mode,
+        # measure the pipeline, not the slow-consumer policy
+        "CLIENT_QUEUE_POLICY": "drop_oldest",
+        "CLIENT_QUEUE_SIZE": str(ticks * 4),
+    }
+    with ServerUnderTest(env, rate=0, batch=batch, max_trades=ticks) as server:
+        latencies, elapsed = asyncio.run(_measure(server, ticks, timeout))
+    return {
+        "mode": mode,
+        "ticks_sent": ticks,
+        "ticks_received": len(latencies),
+        "ticks_per_sec": round(len(latencies) / elapsed, 1) if elapsed else None,
+        **latency_summary(latencies),
+    }
+
+
+def run(ticks: int = 20000, batch: int = 50, timeout: float = 60.0, modes=("thread", "async")) -> dict:
+    return {"benchmark": "streamer", "results": [run_mode(m, ticks, batch, timeout) for m in modes]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=50, help="trades per upstream frame")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--modes", nargs="+", default=["thread", "async"])
+    args = parser.parse_args()
+    print(json.dumps(run(args.ticks, args.batch, args.timeout, args.modes), indent=2))
+
+
+if __name__ == "__main__":
+    main()
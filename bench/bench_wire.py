@@ -0,0 +1,68 @@
+"""Broadcast frame encoding benchmark: JSON text vs the packed binary wire format.
+
+Builds batches the way the server does (trades plus the occasional 1s bar and metrics
+message) and reports bytes per tick and encode cost per batch for both encodings.
+Prints JSON.
+
+    python -m bench.bench_wire --batches 2000 --batch 50
+"""
+import argparse
+import json
+import random
+import time
+
+from services import wire
+from services.decode import Trade
+from services.fanout import dumps
+
+
+def make_batches(batches: int, batch: int, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    ts_ns = 1_704_205_800_000_000_000
+    out = []
+    for _ in range(batches):
+        items = []
+        for _ in range(batch):
+            ts_ns += rng.randint(1, 5_000_000)
+            sec, nanos = divmod(ts_ns, 1_000_000_000)
+            stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec)) + f".{nanos:09d}Z"
+            items.append(Trade(rng.choice(("AAPL", "MSFT", "NVDA")), round(rng.uniform(100, 200), 4),
+                               stamp, float(rng.randint(1, 500))))
+        sym = rng.choice(("AAPL", "MSFT", "NVDA"))
+        items.append({"time": ts_ns // 1_000_000_000, "open": 150.0, "high": 151.0, "low": 149.5, "close": 150.5,
+                      "volume": 1200.0, "type": "bar", "symbol": sym, "bar_s": 1})
+        items.append({"type": "metrics", "symbol": sym, "window_s": 60, "vwap": 150.2, "sma": 150.1,
+                      "ema20": 150.3, "std": 0.4, "min": 149.1, "max": 151.2, "median": 150.1})
+        out.append(items)
+    return out
+
+
+def _time(fn, batches) -> float:
+    t0 = time.perf_counter()
+    for b in batches:
+        fn(b)
+    return time.perf_counter() - t0
+
+
+def run(batches: int = 2000, batch: int = 50) -> dict:
+    data = make_batches(batches, batch)
+    ticks = batches * batch
+    out = {"benchmark": "wire", "batches": batches, "batch": batch}
+    for name, fn in (("json", lambda b: dumps(b).encode()), ("binary", wire.encode)):
+        size = sum(len(fn(b)) for b in data)
+        elapsed = min(_time(fn, data) for _ in range(3))
+        out[f"{name}_bytes_per_tick"] = round(size / ticks, 2)
+        out[f"{name}_encode_batch_us"] = round(elapsed / batches * 1e6, 3)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batches", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=50, help="trades per batch")
+    args = parser.parse_args()
+    print(json.dumps(run(args.batches, args.batch), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Shared helpers for the end-to-end benchmarks: ports, percentiles, and a server
+under test (market simulator + uvicorn subprocess)."""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from services.simulator import MarketSimulator
+
+ROOT = Path(__file__).parents[1]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return round(values[idx], 3)
+
+
+def latency_summary(latencies: List[float]) -> Dict:
+    return {
+        "latency_ms_p50": percentile(latencies, 0.50),
+        "latency_ms_p99": percentile(latencies, 0.99),
+        "latency_ms_max": round(max(latencies), 3) if latencies else None,
+    }
+
+
+def wait_http(port: int, timeout: float = 15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1)
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def stamped_ticks(raw, now_ns: int, out: List[float]) -> int:
+    """Append tick-to-client latencies (ms) for every simulator-stamped trade in a frame."""
+    data = json.loads(raw)
+    items = data if isinstance(data, list) else [data]
+    n = 0
+    for it in items:
+        if isinstance(it, dict) and it.get("T") == "t" and "_gen_ns" in it:
+            out.append((now_ns - it["_gen_ns"]) / 1e6)
+            n += 1
+    return n
+
+
+class ServerUnderTest:
+    """Context manager: simulator on a free port + the app in a uvicorn subprocess
+    pointed at it. ``env`` overrides server settings; ``sim`` configures the simulator
+    (``stamp`` is always on); ``workers`` > 1 runs ``uvicorn --workers``."""
+
+    def __init__(self, env: Optional[Dict[str, str]] = None, workers: int = 1, **sim):
+        self.env = env or {}
+        self.workers = workers
+        self.sim_kwargs = dict(sim, stamp=True)
+        self.app_port = free_port()
+        self.sim: Optional[MarketSimulator] = None
+        self.proc: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "ServerUnderTest":
+        feed_port = free_port()
+        self.sim = MarketSimulator(port=feed_port, **self.sim_kwargs).start_in_thread()
+        env = dict(os.environ, FEED="simulator", SIMULATOR_URL=f"ws://127.0.0.1:{feed_port}")
+        env.update(self.env)
+        cmd = [sys.executable, "-m", "uvicorn", "server.app_server:app",
+               "--port", str(self.app_port), "--log-level", "warning"]
+        if self.workers > 1:
+            cmd += ["--workers", str(self.workers)]
+        self.proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+        wait_http(self.app_port)
+        time.sleep(0.5)  # let the streamer authenticate
+        return self
+
+    def __exit__(self, *exc):
+        if self.proc is not None:
+            self.proc.terminate()
+            self.proc.wait(10)
+        if self.sim is not None:
+            self.sim.stop()
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://127.0.0.1:{self.app_port}/ws"
+
+    def post(self, path: str, body: Dict) -> Dict:
+        req = urllib.request.Request(
+            f"http://127.0.0.1:{self.app_port}{path}",
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return json.loads(resp.read())
+
+    def get(self, path: str) -> Dict:
+        with urllib.request.urlopen(f"http://127.0.0.1:{self.app_port}{path}", timeout=10) as resp:
+            return json.loads(resp.read())
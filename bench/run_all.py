@@ -0,0 +1,153 @@
+"""Run the benchmark suites and write one machine-readable JSON report.
+
+    python -m bench.run_all --out bench-results.json
+    python -m bench.run_all --quick --baseline bench-results.json --tolerance 0.2
+
+With ``--baseline`` every numeric metric is compared against the same path in the
+baseline report; metrics ending in ``_per_sec`` are higher-is-better, ``_us``,
+``_ms*``, ``_seconds`` and ``_bytes*`` lower-is-better. Regressions beyond the
+tolerance are listed and the exit status is 1.
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+from bench import (
+    bench_analyzer, bench_correlation, bench_decode, bench_fanout, bench_hub, bench_journal, bench_memory, bench_quotes,
+    bench_reconnect, bench_sharded, bench_streamer, bench_wire,
+)
+from bench.common import ROOT
+
+HIGHER_IS_BETTER = ("_per_sec",)
+LOWER_IS_BETTER = ("_us", "_seconds", "_bytes_per_tick", "_p50", "_p99", "_max")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _row_key(row: Dict) -> str:
+    # identify list rows by their parameters, not their position
+    for k in ("mode", "workers", "clients", "shards", "ticks_in_window"):
+        if k in row:
+            return f"{k}={row[k]}"
+    if "symbols" in row and "windows" in row:
+        return f"symbols={row['symbols']},windows={'/'.join(map(str, row['windows']))}"
+    if "symbols" in row:
+        return f"symbols={row['symbols']}"
+    return ""
+
+
+def flatten(report, prefix: str = "") -> Dict[str, float]:
+    """Map "suite.section[row].metric" -> value for every numeric leaf."""
+    out: Dict[str, float] = {}
+    if isinstance(report, dict):
+        for k, v in report.items():
+            out.update(flatten(v, f"{prefix}.{k}" if prefix else k))
+    elif isinstance(report, list):
+        for i, v in enumerate(report):
+            key = _row_key(v) if isinstance(v, dict) else ""
+            out.update(flatten(v, f"{prefix}[{key or i}]"))
+    elif isinstance(report, (int, float)) and not isinstance(report, bool):
+        out[prefix] = report
+    return out
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    base = flatten(baseline.get("suites", {}))
+    for path, value in flatten(current.get("suites", {})).items():
+        old = base.get(path)
+        if not old or value is None:
+            continue
+        if path.endswith(HIGHER_IS_BETTER):
+            change = (old - value) / old
+        elif path.endswith(LOWER_IS_BETTER):
+            change = (value - old) / old
+        else:
+            continue
+        if change > tolerance:
+            regressions.append(f"{path}: {old} -> {value} ({change:+.0%} worse)")
+    return regressions
+
+
+def run(quick: bool = False, suites=("analyzer", "sharded", "decode", "wire", "journal", "streamer", "fanout", "reconnect", "quotes", "memory", "hub", "correlation")) -> Dict:
+    runners = {
+        "analyzer": lambda: bench_analyzer.run(
+            symbol_counts=(1, 100) if quick else (1, 100, 1000),
+            densities=(100, 1000) if quick else (100, 1000, 10000, 100000),
+            batch_ticks=200_000 if quick else 1_000_000,
+        ),
+        "sharded": lambda: bench_sharded.run(ticks=100_000 if quick else 500_000),
+        "decode": lambda: bench_decode.run(frames=500 if quick else 2000),
+        "wire": lambda: bench_wire.run(batches=500 if quick else 2000),
+        "journal": lambda: bench_journal.run(ticks=200_000 if quick else 10_000_000, symbols=100),
+        "streamer": lambda: bench_streamer.run(ticks=5000 if quick else 20000),
+        "fanout": lambda: bench_fanout.run(
+            clients=(1, 10) if quick else (1, 10, 100, 1000), seconds=3.0 if quick else 10.0
+        ),
+        "reconnect": lambda: bench_reconnect.run(seconds=3.0 if quick else 6.0),
+        "quotes": lambda: bench_quotes.run(frames=500 if quick else 2000),
+        "memory": lambda: bench_memory.run(
+            symbols=1000 if quick else 5000, ticks=200_000 if quick else 1_000_000
+        ),
+        "hub": lambda: bench_hub.run(
+            workers=(1, 2) if quick else (1, 2, 4), clients=100 if quick else 1000, seconds=3.0 if quick else 10.0
+        ),
+        "correlation": lambda: bench_correlation.run(
+            symbol_counts=(50, 200) if quick else (50, 100, 200), seconds=600 if quick else 1200
+        ),
+    }
+    report = {
+        "meta": {
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "suites": {},
+    }
+    for name in suites:
+        print(f"running {name} ...", file=sys.stderr)
+        report["suites"][name] = runners[name]()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suites", nargs="+", default=["analyzer", "sharded", "decode", "wire", "journal", "streamer", "fanout", "reconnect", "quotes", "memory", "hub", "correlation"])
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, for CI smoke runs")
+    parser.add_argument("--out", default=None, help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    report = run(args.quick, args.suites)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r}", file=sys.stderr)
+        print(f"baseline: {len(regressions)} regressions", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,131 @@
 import asyncio
 import datetime
+import functools
 import json
+import os
 import threading
 import time
+from concurrent.futures import Future
 from queue import Queue
-from typing import Dict, Optional, Set
+from typing import Callable, Dict, List, Optional, Union
 
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 
-from services.websocket_alpaca import WebSocketStreamer
+from services.websocket_alpaca import AsyncWebSocketStreamer, WebSocketStreamer
 from services.analyzer import Analyzer
+from services.correlation import CorrelationMatrix
+from services.sharded import ShardedAnalyzer
+from services.decode import Quote, Trade, parse_rfc3339_ns
+from services.fanout import WILDCARD, ClientQueue, Frame, FrameBatcher, Message, TopicIndex, dumps
+from services.hub import DEFAULT_ADDRESS as DEFAULT_HUB_ADDRESS, HubClient, HubServer
+from services.journal import TickJournal
+from services.metrics import PipelineMetrics
+from services.scheduler import MetricsScheduler
+from services.snapshot import SnapshotCache
+from services import wire
+from services.wire import SUBPROTOCOL as BINARY_SUBPROTOCOL
+
+# "async" runs ingest + fan-out on the uvicorn loop; "thread" keeps the websocket-client thread + Queue
+STREAMER_MODE = os.getenv("STREAMER_MODE", "async").lower()
+# per-client outbound queue: size and overflow policy (drop_oldest | conflate | disconnect)
+CLIENT_QUEUE_SIZE = int(os.getenv("CLIENT_QUEUE_SIZE", "1000"))
+CLIENT_QUEUE_POLICY = os.getenv("CLIENT_QUEUE_POLICY", "drop_oldest").lower()
+# coalesce everything produced within this window into one array frame; 0 sends one frame per message
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "50"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+# analyzer worker processes (symbols hash-partitioned across them); 0 analyzes in-process
+ANALYZER_SHARDS = int(os.getenv("ANALYZER_SHARDS", "0"))
+# seconds to wait for a shard's answer (a dead shard fails at once; this bounds a hung one)
+SHARD_CALL_TIMEOUT_S = float(os.getenv("SHARD_CALL_TIMEOUT_S", "10"))
+# metrics messages are emitted on this cadence for symbols that traded since the last emission
+METRICS_INTERVAL_MS = float(os.getenv("METRICS_INTERVAL_MS", "1000"))
+# per-symbol cadence overrides, e.g. "AAPL:250,MSFT:2000"
+METRICS_SYMBOL_INTERVALS = {
+    sym.strip().upper(): float(ms)
+    for sym, _, ms in (x.partition(":") for x in os.getenv("METRICS_SYMBOL_INTERVALS", "").split(","))
+    if sym.strip() and ms.strip()
+}
+# also subscribe upstream quotes for every symbol; clients get the top of book at most once per QUOTE_INTERVAL_MS
+QUOTES_ENABLED = os.getenv("QUOTES_ENABLED", "0").lower() in ("1", "true", "yes", "on")
+QUOTE_INTERVAL_MS = float(os.getenv("QUOTE_INTERVAL_MS", "250"))
+# finished bars per timeframe kept in each symbol's late-join snapshot (0 = trade + metrics only)
+SNAPSHOT_BARS = int(os.getenv("SNAPSHOT_BARS", "300"))
+# analyzer memory governance: evict symbols idle this long (feed time) and, over the budget,
+# the least recently traded; the sweeper also expires stale windows (0 = no limit)
+ANALYZER_IDLE_TTL_S = float(os.getenv("ANALYZER_IDLE_TTL_S", "0"))
+ANALYZER_MAX_MB = float(os.getenv("ANALYZER_MAX_MB", "0"))
+SWEEP_INTERVAL_MS = float(os.getenv("SWEEP_INTERVAL_MS", "5000"))
+# rolling correlation / beta matrix over this basket's 1s bar returns (empty = off); the basket stays
+# subscribed upstream and the matrix goes to /ws clients subscribed to CORRELATION_TOPIC on the metrics cadence
+CORRELATION_SYMBOLS = [s.strip().upper() for s in os.getenv("CORRELATION_SYMBOLS", "").split(",") if s.strip()]
+CORRELATION_BENCHMARK = os.getenv("CORRELATION_BENCHMARK", "").strip().upper() or None
+CORRELATION_WINDOW_S = int(os.getenv("CORRELATION_WINDOW_S", "300"))
+CORRELATION_TOPIC = "$CORR"
+# per-stage latency histograms + GET /metrics; 0 removes every timing call from the hot path
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no", "off")
+# multi-process fan-out (uvicorn --workers N): "hub" ingests, analyzes and publishes serialized frames
+# to "worker" processes that only serve /ws; "auto" makes the first worker to claim HUB_ADDRESS the hub
+HUB_MODE = os.getenv("HUB_MODE", "off").lower()
+HUB_ADDRESS = os.getenv("HUB_ADDRESS", DEFAULT_HUB_ADDRESS)
 
 #globals
 streamer: Optional[WebSocketStreamer] = None
 _forwarder_thread: Optional[threading.Thread] = None
+_forwarder_task: Optional[asyncio.Task] = None
+_ingest_queue = None  # forward_q or the async streamer's asyncio.Queue, for the depth gauge
+stage_metrics: Optional[PipelineMetrics] = PipelineMetrics() if METRICS_ENABLED else None
 
 #client communication
 forward_q: Queue = Queue()
-clients: Set[WebSocket] = set()
+clients: Dict[WebSocket, ClientQueue] = {}
 clients_lock = threading.Lock()
+# symbol -> subscribed clients; also reference-counts the upstream subscriptions
+topics = TopicIndex()
+# latest bars / metrics / trade per symbol, sent to clients as they subscribe
+snapshots = SnapshotCache(SNAPSHOT_BARS)
+
+def _env_ints(name: str, default: str) -> List[int]:
+    return [int(x) for x in os.getenv(name, default).split(",") if x.strip()]
 
-# analyzer instance
-analyzer = Analyzer(default_window_seconds=60)
+# analyzer instance: rolling windows and bar timeframes kept for every symbol
+ANALYZER_CONFIG = dict(
+    default_window_seconds=60,
+    window_seconds=_env_ints("ANALYZER_WINDOWS", "10,60,300,900"),
+    bar_seconds=_env_ints("ANALYZER_BAR_SECONDS", "1,60,300,900,3600"),
+    bar_history=int(os.getenv("BAR_HISTORY_SIZE", "1000")),
+    # metrics messages carry the window's min / max / median only on opt-in (or with quantiles)
+    quantiles=[float(x) for x in os.getenv("ANALYZER_QUANTILES", "").split(",") if x.strip()],
+    order_stats=os.getenv("ANALYZER_ORDER_STATS", "0").lower() in ("1", "true", "yes", "on"),
+    idle_ttl_s=ANALYZER_IDLE_TTL_S,
+    # sharded mode splits the budget evenly across the workers
+    max_bytes=int(ANALYZER_MAX_MB * 1024 * 1024 / max(1, ANALYZER_SHARDS)),
+)
+analyzer = Analyzer(**ANALYZER_CONFIG)
+# sharded mode: the workers' Analyzers replace ``analyzer``; started on startup
+shards: Optional[ShardedAnalyzer] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_sweeper_task: Optional[asyncio.Task] = None
+# last sweep's Analyzer.memory() totals (summed over shards), for /metrics
+_memory_stats: Dict[str, int] = {}
+# fed with every finished 1s bar on the loop, so it sees all symbols in sharded mode too
+correlation: Optional[CorrelationMatrix] = (
+    CorrelationMatrix(CORRELATION_SYMBOLS, CORRELATION_BENCHMARK, CORRELATION_WINDOW_S)
+    if CORRELATION_SYMBOLS else None
+)
+# HUB_MODE: the hub publishes to worker processes; a worker has hub_client instead of a streamer/analyzer
+hub: Optional[HubServer] = None
+hub_client: Optional[HubClient] = None
 
-# simple throttling state: send metrics no more often than metrics_interval_ms per symbol
-_last_metrics_sent: Dict[str, float] = {}
-_metrics_interval_ms = 1000
+# optional tick journal (JOURNAL_DIR unset = disabled); replayed into the analyzer on startup
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "")
+# UTC days replayed on startup, today included (2 also restores the previous day's session)
+JOURNAL_REPLAY_DAYS = max(1, int(os.getenv("JOURNAL_REPLAY_DAYS", "1")))
+journal: Optional[TickJournal] = (
+    TickJournal(JOURNAL_DIR, fsync_interval=float(os.getenv("JOURNAL_FSYNC_MS", "1000")) / 1000)
+    if JOURNAL_DIR else None
+)
 
 app = FastAPI()
 app.mount("/static", StaticFiles(directory="server/static", html=True), name="static")
@@ -48,118 +146,753 @@ def _iso_to_ms(s: str) -> Optional[int]:
             return int(num * 1000)
     except Exception:
         pass
+    # RFC3339 with up to nanosecond precision (what Alpaca sends)
+    ns = parse_rfc3339_ns(s)
+    if ns is not None:
+        return ns // 1_000_000
     try:
-        # parse ISO string
+        # parse other ISO strings
         dt = datetime.datetime.fromisoformat(s.replace("Z", "+00:00"))
         return int(dt.timestamp() * 1000)
     except Exception:
         return None
 
+def _process_item(item: Union[Trade, dict, list, Callable[[], List[Message]]]) -> List[Message]:
+    """Run one upstream item through the analyzer; return the messages to broadcast.
+
+    Callables are analyzer reads and maintenance queued behind the ticks (see
+    _on_ingest), so they never run concurrently with add_tick.
+    """
+    if type(item) is Trade:
+        return _process_trade(item)
+    if type(item) is list:
+        return _process_quotes(item)
+    if callable(item):
+        return item()
+
+    rx_ns = item.pop("_rx_ns", None) if stage_metrics is not None else None
+    if rx_ns is not None:
+        stage_metrics.queue.record_ns(time.time_ns() - rx_ns)
+
+    # First: forward raw item to clients (tick/control)
+    messages: List[Message] = [(("t", item.get("S")) if item.get("T") == "t" else None, item)]
+
+    # Try to extract tick fields for analysis
+    try:
+        symbol = item.get("S")
+        price = item.get("p")
+        # optional size/volume
+        size = item.get("s")
+        ts_raw = item.get("t")
+        ts_ms = None
+        if isinstance(ts_raw, (int, float)):
+            ts_ms = int(float(ts_raw) * (1000 if ts_raw < 1e12 else 1))
+        elif isinstance(ts_raw, str):
+            ts_ms = _iso_to_ms(ts_raw)
+        # fallback to now
+        if ts_ms is None:
+            ts_ms = int(time.time() * 1000)
+        if symbol and price is not None:
+            # normalize
+            symbol = str(symbol).upper()
+            price = float(price)
+            size = float(size) if size is not None else 1.0
+            if rx_ns is not None and ts_raw is not None:
+                stage_metrics.exchange.record_ns(rx_ns - ts_ms * 1_000_000)
+            _analyze_tick(symbol, ts_ms, price, size, messages)
+    except Exception:
+        # swallow per-item errors, optionally log
+        import traceback
+        traceback.print_exc()
+    return messages
+
+def _process_trade(trade: Trade) -> List[Message]:
+    """Fast path for decoded trades: fields are already typed, the timestamp already parsed."""
+    if stage_metrics is not None and trade.rx_ns:
+        stage_metrics.queue.record_ns(time.time_ns() - trade.rx_ns)
+        if trade.ts_ns:
+            stage_metrics.exchange.record_ns(trade.rx_ns - trade.ts_ns)
+    symbol = trade.symbol.upper()
+    messages: List[Message] = [(("t", symbol), trade)]
+    try:
+        ts_ms = trade.ts_ns // 1_000_000 if trade.ts_ns else int(time.time() * 1000)
+        _analyze_tick(symbol, ts_ms, trade.price, trade.size, messages)
+    except Exception:
+        import traceback
+        traceback.print_exc()
+    return messages
+
+def _process_quotes(quotes: List[Quote]) -> List[Message]:
+    """One frame's quotes: update the top of book only; books go out on book_scheduler's cadence."""
+    if stage_metrics is not None:
+        stage_metrics.quotes += len(quotes)
+        if quotes[0].rx_ns:
+            stage_metrics.queue.record_ns(time.time_ns() - quotes[0].rx_ns)
+    mark = book_scheduler.mark
+    add = analyzer.add_quote if shards is None else shards.submit_quote
+    now_ms = 0
+    for q in quotes:
+        symbol = q.symbol.upper()
+        ts_ms = q.ts_ns // 1_000_000
+        if not ts_ms:
+            ts_ms = now_ms = now_ms or int(time.time() * 1000)
+        add(symbol, ts_ms, q.bid, q.bid_size, q.ask, q.ask_size)
+        mark(symbol)
+    return []
+
+def _analyze_tick(symbol: str, ts_ms: int, price: float, size: float, messages: List[Message]):
+    """Journal + analyzer for one normalized tick; appends finished bars, marks metrics dirty."""
+    if journal is not None:
+        journal.append(symbol, ts_ms, price, size)
+
+    if shards is not None:
+        # bars come back from the symbol's worker (_on_shard_messages)
+        shards.submit(symbol, ts_ms, price, size)
+        scheduler.mark(symbol)
+        if stage_metrics is not None:
+            stage_metrics.ticks += 1
+        return
+
+    # feed analyzer (returns finished bars if any)
+    if stage_metrics is None:
+        finished_bars = analyzer.add_tick(symbol, ts_ms, price, size)
+    else:
+        t0 = time.perf_counter_ns()
+        finished_bars = analyzer.add_tick(symbol, ts_ms, price, size)
+        stage_metrics.analyzer.record_ns(time.perf_counter_ns() - t0)
+        stage_metrics.ticks += 1
+
+    # send finished bars to clients
+    for fb in finished_bars:
+        messages.append((None, fb))
+
+    # metrics go out on the scheduler's cadence
+    scheduler.mark(symbol)
+
+def _on_shard_messages(messages: List[Message]):
+    """Sharded mode: bars from a worker (reader thread) -> batcher on the loop."""
+    try:
+        _loop.call_soon_threadsafe(_emit, messages)
+    except RuntimeError:
+        pass  # loop closed (shutdown)
+
 def _queue_forwarder(loop: asyncio.AbstractEventLoop):
+    """Threaded mode: drain forward_q and hand each item's frames to the event loop once."""
     while True:
         item = forward_q.get()
+        messages = _process_item(item)
+        if shards is not None and forward_q.empty():
+            shards.flush()
         try:
-            text = json.dumps(item, default=str)
-        except Exception:
-            text = json.dumps({"_serialize_error": True, "raw": str(item)})
+            loop.call_soon_threadsafe(_emit, messages)
+        except RuntimeError:
+            # loop closed (shutdown)
+            return
 
-        # First: forward raw item to clients (tick/control)
-        with clients_lock:
-            for ws in list(clients):
-                try:
-                    asyncio.run_coroutine_threadsafe(ws.send_text(text), loop)
-                except Exception:
-                    pass
-                
-        # Try to extract tick fields for analysis
+def _settle(done: asyncio.Future, result, exc: Optional[BaseException]):
+    if done.cancelled():
+        return
+    if exc is not None:
+        done.set_exception(exc)
+    else:
+        done.set_result(result)
+
+async def _on_ingest(fn: Callable, *args):
+    """Run in-process analyzer work where add_tick runs and return its result.
+
+    Threaded mode queues ``fn`` behind the ticks on forward_q: metric reads seed lazy
+    window state (EMA, order statistics) that add_tick updates, so they must never run
+    concurrently with it. Async mode ingests on the loop and calls ``fn`` directly.
+    """
+    if _ingest_queue is not forward_q:
+        return fn(*args)
+    done = _loop.create_future()
+
+    def run() -> List[Message]:
+        try:
+            result, exc = fn(*args), None
+        except Exception as e:
+            result, exc = None, e
+        try:
+            _loop.call_soon_threadsafe(_settle, done, result, exc)
+        except RuntimeError:
+            pass  # loop closed (shutdown)
+        return []
+
+    forward_q.put_nowait(run)
+    return await done
+
+def _broadcast(frames: List[Frame]):
+    """Enqueue each frame on the bounded queue of every client subscribed to its topic."""
+    with clients_lock:
+        everyone = list(clients.values())
+    for topic, key, text, data in frames:
+        for cq in everyone if topic is None else topics.clients_for(topic):
+            cq.put(data if cq.binary else text, key, topic)
+    if hub is not None:
+        hub.publish(frames)
+
+# serialize-once stage between the analyzer and the client queues (runs on the loop)
+batcher = FrameBatcher(_broadcast, window_ms=BATCH_WINDOW_MS, max_items=BATCH_MAX_ITEMS, metrics=stage_metrics)
+
+def _emit(messages: List[Message]):
+    """Loop thread: keep the late-join snapshots current, then batch for broadcast."""
+    snapshots.update(messages)
+    if correlation is not None:
+        _feed_correlation(messages)
+    batcher.add(messages)
+
+def _feed_correlation(messages: List[Message]):
+    """Finished 1s bars -> the correlation grid; the matrix goes out with the next metrics pass."""
+    committed = 0
+    for key, msg in messages:
+        if key is None and isinstance(msg, dict) and msg.get("type") == "bar" and msg.get("bar_s") == 1:
+            committed += correlation.add_bar(msg)
+    if committed:
+        scheduler.mark(CORRELATION_TOPIC)
+
+def _correlation_frame(binary: bool) -> Optional[Frame]:
+    """The current correlation message as a frame (late joiners of CORRELATION_TOPIC)."""
+    if correlation is None or not correlation.samples:
+        return None
+    msg = correlation.message()
+    return CORRELATION_TOPIC, ("correlation", CORRELATION_TOPIC), dumps(msg), wire.encode((msg,)) if binary else None
+
+async def _shard_results(futures: List[Future], timeout: Optional[float] = SHARD_CALL_TIMEOUT_S) -> List:
+    """Await shard call futures, giving up after ``timeout`` seconds (None: wait)."""
+    return await asyncio.wait_for(asyncio.gather(*map(asyncio.wrap_future, futures)), timeout)
+
+async def _analyzer_pass(method: str, kind: str, symbols: List[str]) -> List[Message]:
+    """``Analyzer.<method>(symbols)`` in one call (one per shard in sharded mode), keyed by ``kind``."""
+    if shards is None:
+        out = await _on_ingest(getattr(analyzer, method), symbols)
+    else:
+        by_shard: Dict[int, List[str]] = {}
+        for symbol in symbols:
+            by_shard.setdefault(shards.shard(symbol), []).append(symbol)
+        # a dead shard's symbols are skipped (logged once when it died), the rest still go out
+        results = await _shard_results([
+            shards.call(idx, method, syms) for idx, syms in by_shard.items() if idx not in shards.dead
+        ])
+        out = [msg for part in results for msg in part]
+    return [((kind, msg["symbol"]), msg) for msg in out]
+
+async def _compute_metrics(symbols: List[str]) -> List[Message]:
+    if CORRELATION_TOPIC not in symbols:
+        return await _analyzer_pass("snapshots", "metrics", symbols)
+    messages = await _analyzer_pass("snapshots", "metrics", [s for s in symbols if s != CORRELATION_TOPIC])
+    messages.append((("correlation", CORRELATION_TOPIC), correlation.message()))
+    return messages
+
+async def _compute_books(symbols: List[str]) -> List[Message]:
+    return await _analyzer_pass("book_messages", "book", symbols)
+
+def _broadcast_scheduled(messages: List[Message]):
+    """Serialize scheduler output once per symbol; each client gets it at its own metrics cadence."""
+    snapshots.update(messages)
+    now_ms = time.monotonic() * 1000
+    frames = batcher.serialize(messages)
+    for topic, key, text, data in frames:
+        for cq in topics.clients_for(topic):
+            if cq.metrics_due(key, now_ms):
+                cq.put(data if cq.binary else text, key, topic)
+    if hub is not None:
+        hub.publish(frames)
+
+def _deliver_hub_frames(frames: List[Frame]):
+    """Worker: the hub's serialized frames -> this process's client queues (as _broadcast /
+    _broadcast_scheduled do in the hub)."""
+    with clients_lock:
+        everyone = list(clients.values())
+    now_ms = time.monotonic() * 1000
+    for topic, key, text, data in frames:
+        scheduled = key is not None and key[0] in ("metrics", "book", "correlation")
+        for cq in everyone if topic is None else topics.clients_for(topic):
+            if scheduled and not cq.metrics_due(key, now_ms):
+                continue
+            if not cq.binary:
+                cq.put(text, key, topic)
+            elif data is not None:  # encoded before the hub learned about this worker's binary clients
+                cq.put(data, key, topic)
+
+# dirty-symbol metrics / top-of-book emission on a fixed cadence (started on startup)
+scheduler = MetricsScheduler(_compute_metrics, _broadcast_scheduled, METRICS_INTERVAL_MS, METRICS_SYMBOL_INTERVALS)
+book_scheduler = MetricsScheduler(_compute_books, _broadcast_scheduled, QUOTE_INTERVAL_MS)
+
+async def _async_forwarder(queue: asyncio.Queue):
+    """Async mode: consume the streamer's asyncio.Queue and fan out on the same loop."""
+    while True:
+        item = await queue.get()
+        _emit(_process_item(item))
+        if shards is not None and queue.empty():
+            shards.flush()
+
+def _start_pipeline():
+    """Create the streamer and its forwarder for the configured STREAMER_MODE."""
+    global streamer, _forwarder_thread, _forwarder_task, _ingest_queue
+    loop = asyncio.get_event_loop()
+    if STREAMER_MODE == "thread":
+        if _forwarder_thread is None or not _forwarder_thread.is_alive():
+            _forwarder_thread = threading.Thread(
+                target=_queue_forwarder, args=(loop,), daemon=True, name="queue-forwarder"
+            )
+            _forwarder_thread.start()
+        streamer = WebSocketStreamer(on_message_cb=None, out_queue=forward_q, metrics=stage_metrics)
+        _ingest_queue = forward_q
+    else:
+        async_q: asyncio.Queue = asyncio.Queue()
+        if _forwarder_task is not None:
+            _forwarder_task.cancel()
+        _forwarder_task = loop.create_task(_async_forwarder(async_q))
+        streamer = AsyncWebSocketStreamer(on_message_cb=None, out_queue=async_q, metrics=stage_metrics)
+        _ingest_queue = async_q
+    streamer.start()
+    # queued until authenticated
+    _subscribe_upstream(topics.symbols)
+
+def _forget_symbols(evicted: List[str]):
+    """Loop thread: drop the server-side state of symbols the analyzer evicted."""
+    for symbol in evicted:
+        scheduler.forget(symbol)
+        book_scheduler.forget(symbol)
+        snapshots.forget(symbol)
+    with clients_lock:
+        queues = list(clients.values())
+    for cq in queues:
+        for symbol in evicted:
+            cq.forget(symbol)
+
+def _after_sweep(evicted: List[str], memory: List[Dict]):
+    _memory_stats.update(
+        bytes=sum(m["bytes"] for m in memory),
+        symbols=sum(m["symbols"] for m in memory),
+        evicted=sum(m["evicted"] for m in memory),
+    )
+    if evicted:
+        _forget_symbols(evicted)
+
+def _sweep_in_process(keep: set):
+    """Ingest path (via _on_ingest): bound the in-process analyzer's memory."""
+    return analyzer.sweep(keep=keep), analyzer.memory(0)
+
+async def _sweep():
+    """One sweep: idle / over-budget eviction and stale window expiry (Analyzer.sweep)."""
+    # symbols clients asked for keep their history however quiet they are
+    keep = set(topics.symbols)
+    if shards is None:
+        evicted, memory = await _on_ingest(_sweep_in_process, keep)
+        _after_sweep(evicted, [memory])
+        return
+    # one feed clock for every shard: a worker whose symbols all went quiet still ages them
+    live = [i for i in range(shards.shards) if i not in shards.dead]
+    now_ms = max(await _shard_results([shards.call(i, "clock_ms") for i in live]), default=0)
+    parts = await _shard_results([shards.call(i, "sweep", now_ms, keep) for i in live])
+    memory = await _shard_results([shards.call(i, "memory", 0) for i in live])
+    _after_sweep([symbol for part in parts for symbol in part], memory)
+
+async def _sweeper():
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL_MS / 1000)
         try:
-            symbol = item.get("S")
-            price = item.get("p")
-            # optional size/volume
-            size = item.get("s")
-            ts_raw = item.get("t")
-            ts_ms = None
-            if isinstance(ts_raw, (int, float)):
-                ts_ms = int(float(ts_raw) * (1000 if ts_raw < 1e12 else 1))
-            elif isinstance(ts_raw, str):
-                ts_ms = _iso_to_ms(ts_raw)
-            # fallback to now
-            if ts_ms is None:
-                ts_ms = int(time.time() * 1000)
-            if symbol and price is not None:
-                # normalize
-                symbol = str(symbol).upper()
-                price = float(price)
-                size = float(size) if size is not None else 1.0
-
-                # feed analyzer (returns finished bars if any)
-                finished_bars = analyzer.add_tick(symbol, ts_ms, price, size)
-
-                # send finished bars to clients
-                if finished_bars:
-                    for fb in finished_bars:
-                        try:
-                            asyncio.run_coroutine_threadsafe(
-                                ws.send_text(json.dumps(fb, default=str)), loop
-                            )
-                        except Exception:
-                            pass
-
-                # throttle metrics per symbol
-                now_ms = int(time.time() * 1000)
-                last = _last_metrics_sent.get(symbol, 0)
-                if now_ms - last >= _metrics_interval_ms:
-                    _last_metrics_sent[symbol] = now_ms
-                    metrics = {
-                        "type": "metrics",
-                        "symbol": symbol,
-                        "window_s": analyzer.default_window_seconds,
-                        "vwap": analyzer.vwap(symbol),
-                        "sma": analyzer.sma(symbol),
-                        "ema20": analyzer.ema(symbol, span=20),
-                        "std": analyzer.std(symbol),
-                        # do not call heavy ops too frequently
-                    }
-                    metrics_text = json.dumps(metrics, default=str)
-                    with clients_lock:
-                        for ws in list(clients):
-                            try:
-                                asyncio.run_coroutine_threadsafe(ws.send_text(metrics_text), loop)
-                            except Exception:
-                                pass
+            await _sweep()
+        except asyncio.CancelledError:
+            raise
         except Exception:
-            # swallow per-item errors, optionally log
             import traceback
             traceback.print_exc()
 
+def _subscribe_upstream(symbols: List[str]):
+    if symbols and hub_client is not None:
+        hub_client.subscribe(symbols)
+        return
+    # served by this process, not the feed
+    symbols = [s for s in symbols if s != CORRELATION_TOPIC]
+    if symbols and streamer is not None:
+        streamer.subscribe(trades=symbols, quotes=symbols if QUOTES_ENABLED else None)
+        print(f"Subscribed to {', '.join(symbols)}")
+
+def _unsubscribe_upstream(symbols: List[str]):
+    if symbols and hub_client is not None:
+        hub_client.unsubscribe(symbols)
+        return
+    symbols = [s for s in symbols if s != CORRELATION_TOPIC]
+    if symbols and streamer is not None:
+        streamer.unsubscribe(trades=symbols, quotes=symbols if QUOTES_ENABLED else None)
+        print(f"Unsubscribed from {', '.join(symbols)}")
+
+def _on_hub_topics(symbols: List[str], subscribe: bool):
+    """Hub: a worker's first client for these symbols arrived (or its last left); pin them upstream."""
+    if subscribe:
+        _subscribe_upstream([s for s in symbols if topics.pin(s)])
+    else:
+        _unsubscribe_upstream([s for s in symbols if topics.unpin(s)])
+
+def _hub_snapshot(symbols: List[str], binary: bool) -> List[Frame]:
+    """Hub: cached late-join snapshot frames for a worker's newly subscribed clients."""
+    frames = []
+    for symbol in snapshots.symbols if WILDCARD in symbols else symbols:
+        text = snapshots.text(symbol)
+        if text is not None:
+            frames.append((symbol, ("snapshot", symbol), text, snapshots.data(symbol) if binary else None))
+    if CORRELATION_TOPIC in symbols:
+        frame = _correlation_frame(binary)
+        if frame is not None:
+            frames.append(frame)
+    return frames
+
+async def _start_hub() -> bool:
+    """Take this process's HUB_MODE role; True if it is a worker (no ingest of its own)."""
+    global hub, hub_client
+    if HUB_MODE in ("hub", "auto"):
+        server = HubServer(HUB_ADDRESS, _on_hub_topics, _hub_snapshot, calls={
+            "bars": api_bars,
+            "snapshot": functools.partial(_snapshot_state, text=True),
+            "memory": api_memory,
+            "streamer": api_streamer,
+            "connect": api_connect,
+            "disconnect": api_disconnect,
+            "subscribe": _pin_symbol,
+            "unsubscribe": _unpin_symbol,
+            "metrics_interval": _set_metrics_interval,
+            "correlation": api_correlation,
+        }, on_binary=_update_binary)
+        try:
+            hub = await server.start()
+            print(f"Hub publishing on {HUB_ADDRESS}")
+            return False
+        except OSError:
+            if HUB_MODE == "hub":
+                raise
+    if HUB_MODE in ("worker", "auto"):
+        hub_client = HubClient(HUB_ADDRESS, _deliver_hub_frames)
+        hub_client.start()
+        print(f"Worker {os.getpid()} receiving from hub {HUB_ADDRESS}")
+        return True
+    return False
+
 @app.on_event("startup")
-def startup_event():
-    global streamer, _forwarder_thread
-    loop = asyncio.get_event_loop()
-    # start forwarder thread
-    if _forwarder_thread is None or not _forwarder_thread.is_alive():
-        _forwarder_thread = threading.Thread(target=_queue_forwarder, args=(loop,), daemon=True)
-        _forwarder_thread.start()
-    # start your Alpaca streamer and point it at forward_q
-    streamer = WebSocketStreamer(on_message_cb=None, out_queue=forward_q)
-    streamer.start()
+async def startup_event():
+    global shards, _loop, _sweeper_task
+    _loop = asyncio.get_event_loop()
+    if await _start_hub():
+        # the hub owns the streamer, analyzer, journal and schedulers
+        return
+    if ANALYZER_SHARDS > 0:
+        shards = ShardedAnalyzer(ANALYZER_SHARDS, ANALYZER_CONFIG, _on_shard_messages).start()
+    if journal is not None:
+        # warm restart: rebuild the windows and bar history of the last JOURNAL_REPLAY_DAYS UTC days
+        t0 = time.perf_counter()
+        if shards is None:
+            n = journal.replay(analyzer, days=JOURNAL_REPLAY_DAYS)
+        else:
+            journal.flush(sync=False)
+            replays = shards.call_all("replay", JOURNAL_DIR, None, JOURNAL_REPLAY_DAYS)
+            n = sum(await _shard_results(replays, timeout=None))
+        print(f"Replayed {n} journaled ticks in {time.perf_counter() - t0:.2f}s")
+        # reconnecting dashboards get the replayed bars and metrics before the first new tick
+        if shards is None:
+            state = analyzer.recent_state(SNAPSHOT_BARS)
+        else:
+            parts = await _shard_results(shards.call_all("recent_state", SNAPSHOT_BARS), timeout=None)
+            state = [msg for part in parts for msg in part]
+        snapshots.update(
+            [(("metrics", msg["symbol"]) if msg["type"] == "metrics" else None, msg) for msg in state]
+        )
+        if correlation is not None:
+            await _seed_correlation()
+        journal.start()
+    if correlation is not None:
+        # the basket is analyzed whether or not a client watches it
+        for symbol in correlation.symbols:
+            topics.pin(symbol)
+    scheduler.start()
+    book_scheduler.start()
+    if SWEEP_INTERVAL_MS > 0:
+        _sweeper_task = _loop.create_task(_sweeper())
+    # start your Alpaca streamer and its forwarder
+    _start_pipeline()
+
+async def _seed_correlation():
+    """Warm restart: replay the basket's retained 1s bars into the correlation grid."""
+    limit = correlation.window + correlation.lag_s + 1
+    if shards is None:
+        parts = [analyzer.get_recent_bars(symbol, 1, limit) for symbol in correlation.symbols]
+    else:
+        parts = await _shard_results(
+            [shards.call_symbol(symbol, "get_recent_bars", symbol, 1, limit) for symbol in correlation.symbols],
+            timeout=None,
+        )
+    bars = [dict(bar, symbol=symbol, bar_s=1) for symbol, part in zip(correlation.symbols, parts) for bar in part]
+    bars.sort(key=lambda bar: bar["time"])
+    for bar in bars:
+        correlation.add_bar(bar)
+    if correlation.samples:
+        scheduler.mark(CORRELATION_TOPIC)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if hub_client is not None:
+        hub_client.stop()
+        return
+    if hub is not None:
+        hub.close()
+    scheduler.stop()
+    book_scheduler.stop()
+    if _sweeper_task is not None:
+        _sweeper_task.cancel()
+    if journal is not None:
+        journal.close()
+    if shards is not None:
+        shards.close()
+
+def _handle_client_message(cq: ClientQueue, raw: str):
+    """{"action": "subscribe" | "unsubscribe", "symbols": [...]} from a /ws client ("*" = all);
+    {"action": "metrics_interval", "interval_ms": N} slows this client's metrics cadence (0 = server's)."""
+    try:
+        req = json.loads(raw)
+    except ValueError:
+        return
+    if not isinstance(req, dict):
+        return
+    if req.get("action") == "metrics_interval":
+        try:
+            cq.metrics_interval_ms = max(0.0, float(req.get("interval_ms") or 0))
+        except (TypeError, ValueError):
+            return
+        reply = {"type": "metrics_interval", "interval_ms": cq.metrics_interval_ms}
+        cq.put(wire.encode((reply,)) if cq.binary else dumps(reply))
+        return
+    if req.get("action") not in ("subscribe", "unsubscribe"):
+        return
+    symbols = [str(s).strip().upper() for s in req.get("symbols") or []]
+    symbols = [s for s in symbols if s]
+    _subscribe_client(cq, symbols, req["action"] == "subscribe")
+
+def _subscribe_client(cq: ClientQueue, symbols: List[str], subscribe: bool = True):
+    """Apply a client's (un)subscribe, reply with its topics and send snapshots of the new symbols."""
+    try:
+        if subscribe:
+            _subscribe_upstream(topics.subscribe(cq, symbols))
+        else:
+            _unsubscribe_upstream(topics.unsubscribe(cq, symbols))
+    except Exception as e:
+        print(f"Upstream {'subscribe' if subscribe else 'unsubscribe'} failed: {e}")
+    reply = {"type": "subscriptions", "symbols": topics.topics(cq)}
+    cq.put(wire.encode((reply,)) if cq.binary else dumps(reply))
+    if subscribe and hub_client is not None:
+        asyncio.ensure_future(_send_hub_snapshots(cq, symbols))
+    elif subscribe:
+        for symbol in snapshots.symbols if WILDCARD in symbols else symbols:
+            payload = snapshots.data(symbol) if cq.binary else snapshots.text(symbol)
+            if payload is not None:
+                cq.put(payload, ("snapshot", symbol))
+        frame = _correlation_frame(cq.binary) if CORRELATION_TOPIC in symbols else None
+        if frame is not None:
+            cq.put(frame[3] if cq.binary else frame[2], frame[1])
+
+async def _send_hub_snapshots(cq: ClientQueue, symbols: List[str]):
+    """Worker: the hub's snapshot frames for a client's new symbols."""
+    try:
+        frames = await hub_client.snapshot(symbols)
+    except (ConnectionError, asyncio.TimeoutError) as e:
+        print(f"Hub snapshot failed: {e!r}")
+        return
+    for _, key, text, data in frames:
+        payload = data if cq.binary else text
+        if payload is not None:
+            cq.put(payload, key)
+
+def _update_binary():
+    """Encode batches in the binary wire format only while a binary client is connected (here or,
+    on the hub, in any worker)."""
+    with clients_lock:
+        binary = any(cq.binary for cq in clients.values())
+    if hub_client is not None:
+        hub_client.set_binary(binary)
+    else:
+        batcher.binary = binary or (hub is not None and hub.binary)
 
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
-    await ws.accept()
+    # clients offering the binary subprotocol get packed binary frames, others JSON text
+    binary = BINARY_SUBPROTOCOL in ws.scope.get("subprotocols", ())
+    await ws.accept(subprotocol=BINARY_SUBPROTOCOL if binary else None)
+    client = ws.client
+    cq = ClientQueue(
+        ws.send_bytes if binary else ws.send_text,
+        maxsize=CLIENT_QUEUE_SIZE,
+        policy=CLIENT_QUEUE_POLICY,
+        close=ws.close,
+        name=f"{client.host}:{client.port}" if client else "",
+        metrics=stage_metrics,
+        binary=binary,
+    )
+    writer = asyncio.create_task(cq.run())
     with clients_lock:
-        clients.add(ws)
+        clients[ws] = cq
+    if binary:
+        _update_binary()
+    # /ws?symbols=AAPL,MSFT subscribes on connect (and sends their snapshots right away)
+    initial = [s.strip().upper() for s in ws.query_params.get("symbols", "").split(",") if s.strip()]
+    if initial:
+        _subscribe_client(cq, initial)
     try:
-        # keep the socket open; clients usually don't send data here
+        # clients only send subscribe / unsubscribe / metrics_interval requests
         while True:
-            await ws.receive_text()
-    except WebSocketDisconnect:
+            _handle_client_message(cq, await ws.receive_text())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
         with clients_lock:
-            clients.discard(ws)
+            clients.pop(ws, None)
+        writer.cancel()
+        try:
+            _unsubscribe_upstream(topics.remove(cq))
+        except Exception as e:
+            print(f"Upstream unsubscribe failed: {e}")
+        if binary:
+            _update_binary()
+
+async def _hub_call(method: str, **kwargs):
+    """Worker: run an API call on the hub, which owns the analyzer and the streamer."""
+    try:
+        return await hub_client.call(method, **kwargs)
+    except (ConnectionError, RuntimeError, asyncio.TimeoutError) as e:
+        return {"ok": False, "error": f"hub: {e!r}"}
+
+@app.get("/api/bars/{symbol}")
+async def api_bars(symbol: str, bar_s: int = 60, limit: int = 100):
+    """Last `limit` finished bars (oldest first) for one symbol/timeframe."""
+    symbol = symbol.strip().upper()
+    if hub_client is not None:
+        return await _hub_call("bars", symbol=symbol, bar_s=bar_s, limit=limit)
+    limit = max(0, min(limit, analyzer.bar_history))
+    if shards is not None:
+        bars = (await _shard_results([shards.call_symbol(symbol, "get_recent_bars", symbol, bar_s, limit)]))[0]
+    else:
+        bars = await _on_ingest(analyzer.get_recent_bars, symbol, bar_s, limit)
+    return {"symbol": symbol, "bar_s": bar_s, "bars": bars}
+
+@app.get("/api/snapshot/{symbol}")
+async def api_snapshot(symbol: str, request: Request):
+    """The symbol's late-join snapshot frame (JSON array), with ETag / If-None-Match revalidation."""
+    state = await _snapshot_state(symbol.strip().upper(), request.headers.get("if-none-match", ""))
+    if state.get("etag") is None:
+        return Response(b'{"error": "unknown_symbol"}', status_code=404, media_type="application/json")
+    headers = {"ETag": state["etag"], "Cache-Control": "no-cache"}
+    if state["body"] is None:
+        return Response(status_code=304, headers=headers)
+    return Response(state["body"], media_type="application/json", headers=headers)
+
+async def _snapshot_state(symbol: str, if_none_match: str = "", text: bool = False) -> Dict:
+    """ETag and body of a symbol's snapshot; body is None if ``if_none_match`` already has it."""
+    if hub_client is not None:
+        return await _hub_call("snapshot", symbol=symbol, if_none_match=if_none_match)
+    etag = snapshots.etag(symbol)
+    if etag is None or etag in (t.strip() for t in if_none_match.split(",")):
+        return {"etag": etag, "body": None}
+    return {"etag": etag, "body": snapshots.text(symbol) if text else snapshots.body(symbol)}
+
+@app.get("/api/clients")
+async def api_clients():
+    """Per-client outbound queue depth and drop counters, to spot slow consumers."""
+    with clients_lock:
+        stats = [dict(cq.stats(), topics=topics.topics(cq)) for cq in clients.values()]
+    out = {"count": len(stats), "clients": stats, "upstream": topics.symbols}
+    if hub is not None:
+        out["hub"] = hub.stats()
+    elif hub_client is not None:
+        out["hub"] = hub_client.stats()
+    return out
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape: per-stage latency histograms, tick counters, queue depths, clients."""
+    if stage_metrics is None:
+        return PlainTextResponse("metrics disabled (METRICS_ENABLED=0)\n", status_code=404)
+    with clients_lock:
+        queues = list(clients.values())
+    if shards is not None:
+        live = [i for i in range(shards.shards) if i not in shards.dead]
+        symbol_count = sum(await _shard_results([shards.call(i, "symbol_count") for i in live]))
+    elif hub_client is not None:
+        symbol_count = 0  # analyzed by the hub
+    else:
+        symbol_count = len(analyzer.symbols)
+    gauges = {
+        "ingest_queue_depth": _ingest_queue.qsize() if _ingest_queue is not None else 0,
+        "clients": len(queues),
+        "clients_binary": sum(1 for cq in queues if cq.binary),
+        "client_queue_depth": sum(cq.depth for cq in queues),
+        "client_queue_depth_max": max((cq.depth for cq in queues), default=0),
+        "client_frames_dropped": sum(cq.dropped for cq in queues),
+        "symbols": symbol_count,
+        "upstream_symbols": len(topics.symbols),
+        "upstream_connected": 1 if streamer is not None and streamer.connected else 0,
+        "metrics_dirty_symbols": scheduler.dirty,
+        "metrics_emitted": scheduler.emitted,
+        "books_emitted": book_scheduler.emitted,
+        "snapshot_symbols": len(snapshots),
+        "snapshot_builds": snapshots.builds,
+        "analyzer_bytes": _memory_stats.get("bytes", 0),
+        "analyzer_evicted_symbols": _memory_stats.get("evicted", 0),
+        "correlation_samples": correlation.samples if correlation is not None else 0,
+        "analyzer_shards_dead": len(shards.dead) if shards is not None else 0,
+        "hub_workers": hub.peers if hub is not None else 0,
+        "hub_connected": 1 if hub_client is not None and hub_client.connected else 0,
+    }
+    return PlainTextResponse(stage_metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/memory")
+async def api_memory(limit: int = 20, symbol: Optional[str] = None):
+    """Analyzer memory accounting: estimated bytes, symbol count, evictions and the largest
+    symbols (or one symbol's bytes with ?symbol=)."""
+    if hub_client is not None:
+        return await _hub_call("memory", limit=limit, symbol=symbol)
+    if symbol:
+        symbol = symbol.strip().upper()
+        if shards is None:
+            n = await _on_ingest(analyzer.symbol_nbytes, symbol)
+        else:
+            n = (await _shard_results([shards.call_symbol(symbol, "symbol_nbytes", symbol)]))[0]
+        return {"symbol": symbol, "bytes": n}
+    if shards is None:
+        parts = [await _on_ingest(analyzer.memory, limit)]
+    else:
+        parts = await _shard_results(shards.call_all("memory", limit))
+    top = sorted((row for m in parts for row in m["top"]), key=lambda row: row["bytes"], reverse=True)
+    return {
+        "bytes": sum(m["bytes"] for m in parts),
+        "budget_bytes": int(ANALYZER_MAX_MB * 1024 * 1024),
+        "idle_ttl_s": ANALYZER_IDLE_TTL_S,
+        "symbols": sum(m["symbols"] for m in parts),
+        "query_windows": sum(m["query_windows"] for m in parts),
+        "evicted": sum(m["evicted"] for m in parts),
+        "top": top[:max(0, limit)],
+    }
+
+@app.get("/api/correlation")
+async def api_correlation():
+    """The basket's rolling correlation matrix, betas to the benchmark and 1s return stds."""
+    if hub_client is not None:
+        return await _hub_call("correlation")
+    if correlation is None:
+        return {"ok": False, "error": "correlation_disabled"}
+    return correlation.message()
+
+@app.get("/api/streamer")
+async def api_streamer():
+    """Upstream connection state: reconnects, last reconnect time / data gap, desired subscriptions."""
+    if hub_client is not None:
+        return await _hub_call("streamer")
+    if streamer is None:
+        return {"running": False}
+    return streamer.stats()
 
 @app.post("/api/connect")
 async def api_connect():
-    global streamer, _forwarder_thread
+    if hub_client is not None:
+        return await _hub_call("connect")
     if streamer is not None and streamer.running:
         # streamer already initialized and running
         print("Streamer already connected and running")
@@ -167,14 +900,7 @@ async def api_connect():
     else:
         # streamer not running, start it
         try:
-            loop = asyncio.get_event_loop()
-            streamer = WebSocketStreamer(on_message_cb=None, out_queue=Queue())
-            streamer.start()
-            if _forwarder_thread is None or not _forwarder_thread.is_alive():
-                _forwarder_thread = threading.Thread(
-                    target=_queue_forwarder, args=(loop,), daemon=True, name="queue-forwarder"
-                )
-                _forwarder_thread.start()
+            _start_pipeline()
             print("Streamer connected and started")
             return {"running": True, "started": True}
         except Exception:
@@ -183,6 +909,8 @@ async def api_connect():
 
 @app.post("/api/disconnect")
 async def api_disconnect():
+    if hub_client is not None:
+        return await _hub_call("disconnect")
     try:
         global streamer
         if streamer:
@@ -196,40 +924,67 @@ async def api_disconnect():
 
 @app.post("/api/subscribe")
 async def api_subscribe(req: Request):
-    global streamer
     body = await req.json()
     symbol = (body.get("symbol") or "").strip().upper()
     
     if not symbol:
         return {"ok": False, "error": "missing_symbol"}
+    return await _pin_symbol(symbol)
+
+async def _pin_symbol(symbol: str) -> Dict:
+    if hub_client is not None:
+        return await _hub_call("subscribe", symbol=symbol)
 
     if streamer is None:
         return {"ok": False, "error": "streamer_not_running"}
 
+    # holds the upstream subscription; /ws clients still subscribe to receive the symbol
     try:
-        streamer.subscribe_trades([symbol])
+        if topics.pin(symbol):
+            _subscribe_upstream([symbol])
     except Exception as e:
         return {"ok": False, "error": str(e)}
-    print(f"Subscribed to {symbol}")
     return {"ok": True, "symbol": symbol}
 
+@app.post("/api/metrics_interval")
+async def api_metrics_interval(req: Request):
+    """Per-symbol metrics cadence: {"symbol": "AAPL", "interval_ms": 250}; omit interval_ms to reset."""
+    body = await req.json()
+    symbol = (body.get("symbol") or "").strip().upper()
+    if not symbol:
+        return {"ok": False, "error": "missing_symbol"}
+    return await _set_metrics_interval(symbol, body.get("interval_ms"))
+
+async def _set_metrics_interval(symbol: str, interval_ms=None) -> Dict:
+    if hub_client is not None:
+        return await _hub_call("metrics_interval", symbol=symbol, interval_ms=interval_ms)
+    try:
+        scheduler.set_interval(symbol, None if interval_ms is None else float(interval_ms))
+    except (TypeError, ValueError):
+        return {"ok": False, "error": "bad_interval"}
+    return {"ok": True, "symbol": symbol, "interval_ms": scheduler.symbol_intervals.get(symbol, scheduler.interval_ms)}
+
 @app.post("/api/unsubscribe")
 async def api_unsubscribe(req: Request):
-    global streamer
     body = await req.json()
     symbol = (body.get("symbol") or "").strip().upper()
 
     if not symbol:
         return {"ok": False, "error": "missing_symbol"}
+    return await _unpin_symbol(symbol)
+
+async def _unpin_symbol(symbol: str) -> Dict:
+    if hub_client is not None:
+        return await _hub_call("unsubscribe", symbol=symbol)
 
     if streamer is None:
         return {"ok": False, "error": "streamer_not_running"}
 
     try:
-        streamer.unsubscribe_trades([symbol])
+        if topics.unpin(symbol):
+            _unsubscribe_upstream([symbol])
     except Exception as e:
         print(e)
         return {"ok": False, "error": str(e)}
-    
-    print(f"Unsubscribed from {symbol}")
-    return {"ok": True, "symbol": symbol}
\ No newline at end of file
+
+    return {"ok": True, "symbol": symbol}
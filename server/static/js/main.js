@@ -6,6 +6,8 @@ const stopBtn = document.getElementById('btn-stop-stream')
 const streamerStatus = document.getElementById('status-stream')
 const symbolInput = document.getElementById('input-symbol')
 const symbolStatus = document.getElementById('status-symbol')
+const bookStatus = document.getElementById('status-book')
+const rangeStatus = document.getElementById('status-range')
 const streamMessagesContainer = document.getElementById('stream-messages-container')
 const flashMessageContainer = document.getElementById('flash-message-container')
 const flashMessage = document.getElementById('flash-message')
@@ -18,9 +20,13 @@ symbolInput.value = ""
 symbolInput.disabled = false
 
 // open forward socket to receive stream messages
+// offer the packed binary protocol (services/wire.py); ?wire=json keeps JSON text frames
+const BINARY_SUBPROTOCOL = "stock-streamer.bin.v1"
 const wsProto = location.protocol === "https:" ? "wss" : "ws"
 const wsUrl = wsProto + "://" + location.host + "/ws"
-const forwardWs = new WebSocket(wsUrl)
+const wantBinary = new URLSearchParams(location.search).get("wire") !== "json"
+const forwardWs = wantBinary ? new WebSocket(wsUrl, [BINARY_SUBPROTOCOL]) : new WebSocket(wsUrl)
+forwardWs.binaryType = "arraybuffer"
 
 
 // initialize chart (guard missing container)
@@ -68,6 +74,8 @@ if (chartDiv && window.LightweightCharts) {
 
 function parseTimestampMs(item) {
     if (!item) return null
+    // binary frames carry epoch ms already
+    if (item._epoch_ms !== undefined) return item._epoch_ms || Date.now()
     if (item.t) {
         const parsed = Date.parse(item.t)
         if (!isNaN(parsed)) return parsed
@@ -82,67 +90,179 @@ function parseTimestampMs(item) {
         const num = Number(item.ts)
         if (!isNaN(num)) return (String(item.ts).length === 10) ? num * 1000 : num
     }
-    if (item._epoch_ms) return Number(item._epoch_ms)
     return null
 }
 
+// decode one binary frame (record layout in services/wire.py) into the same item shapes as JSON
+const wireText = new TextDecoder()
+
+function decodeWireFrame(buf) {
+    const view = new DataView(buf)
+    const bytes = new Uint8Array(buf)
+    const symbols = []
+    const items = []
+    const num = (off) => {
+        const v = view.getFloat64(off, true)
+        return Number.isNaN(v) ? null : v
+    }
+    let off = 0
+    while (off < buf.byteLength) {
+        const rec = view.getUint8(off)
+        if (rec === 1) {  // SYMBOL
+            const len = view.getUint8(off + 3)
+            symbols[view.getUint16(off + 1, true)] = wireText.decode(bytes.subarray(off + 4, off + 4 + len))
+            off += 4 + len
+        } else if (rec === 2) {  // TRADE
+            items.push({
+                T: "t", S: symbols[view.getUint16(off + 1, true)],
+                _epoch_ms: Number(view.getBigInt64(off + 3, true)),
+                p: view.getFloat64(off + 11, true), s: view.getFloat64(off + 19, true),
+            })
+            off += 27
+        } else if (rec === 3) {  // BAR
+            items.push({
+                type: "bar", symbol: symbols[view.getUint16(off + 1, true)], bar_s: view.getUint32(off + 3, true),
+                time: Number(view.getBigInt64(off + 7, true)), open: num(off + 15), high: num(off + 23),
+                low: num(off + 31), close: num(off + 39), volume: num(off + 47),
+            })
+            off += 55
+        } else if (rec === 4) {  // METRICS
+            items.push({
+                type: "metrics", symbol: symbols[view.getUint16(off + 1, true)], window_s: view.getUint32(off + 3, true),
+                vwap: num(off + 7), sma: num(off + 15), ema20: num(off + 23), std: num(off + 31),
+            })
+            off += 39
+        } else if (rec === 6) {  // RANGE: order statistics of the METRICS record before it
+            const n = view.getUint8(off + 31)
+            const quantiles = {}
+            for (let i = 0; i < n; i++) {
+                quantiles[String(view.getFloat64(off + 32 + 16 * i, true))] = num(off + 40 + 16 * i)
+            }
+            const range = { min: num(off + 7), max: num(off + 15), median: num(off + 23) }
+            if (n) range.quantiles = quantiles
+            Object.assign(items[items.length - 1] || {}, range)
+            off += 32 + 16 * n
+        } else if (rec === 5) {  // BOOK
+            const bid = num(off + 15), ask = num(off + 31)
+            const mid = bid > 0 && ask > 0 ? (bid + ask) / 2 : null
+            items.push({
+                type: "book", symbol: symbols[view.getUint16(off + 1, true)], window_s: view.getUint32(off + 3, true),
+                time: Number(view.getBigInt64(off + 7, true)), bid, bid_size: num(off + 23), ask, ask_size: num(off + 39),
+                mid, spread: mid === null ? null : ask - bid, spread_bps: mid ? (ask - bid) / mid * 1e4 : null,
+                spread_avg: num(off + 47), spread_std: num(off + 55),
+            })
+            off += 63
+        } else if (rec === 0) {  // JSON
+            const len = view.getUint32(off + 1, true)
+            items.push(JSON.parse(wireText.decode(bytes.subarray(off + 5, off + 5 + len))))
+            off += 5 + len
+        } else {
+            throw new Error("unknown wire record " + rec)
+        }
+    }
+    return items
+}
+
 forwardWs.addEventListener("open", () => {
-    console.log("Forward socket open", wsUrl)
+    console.log("Forward socket open", wsUrl, forwardWs.protocol || "json")
 })
 
 forwardWs.addEventListener("message", (evt) => {
+    let items
     try {
-        const item = JSON.parse(evt.data)
-
-        // If analyzer forwarded a metrics message, update overlay series
-        if (item.type === 'metrics' && item.symbol) {
-            const nowSec = Math.round((Date.now()) / 1000)
-            const sym = item.symbol
-            // use now as time for metrics (backend throttles frequency)
-            if (item.vwap !== null && item.vwap !== undefined) {
-                vwapSeries.update({ time: nowSec, value: Number(item.vwap) })
-            }
-            if (item.sma !== null && item.sma !== undefined) {
-                smaSeries.update({ time: nowSec, value: Number(item.sma) })
-            }
-            if (item.ema20 !== null && item.ema20 !== undefined) {
-                emaSeries.update({ time: nowSec, value: Number(item.ema20) })
-            }
-            // update symbol label
-            if (symbolStatus) symbolStatus.textContent = `Symbol: ${sym}`
-            return
+        if (evt.data instanceof ArrayBuffer) {
+            items = decodeWireFrame(evt.data)
+        } else {
+            const data = JSON.parse(evt.data)
+            // server may coalesce several messages into one array frame
+            items = Array.isArray(data) ? data : [data]
         }
-
-        // If backend sent a finished bar, update priceSeries with close
-        if (item.type === 'bar' && item.close !== undefined && item.time !== undefined) {
-            // backend bar.time is seconds
-            const timeSec = Number(item.time)
-            pushPricePoint(timeSec, Number(item.close))
-            return
+    } catch (err) {
+        console.error("parse forward message", err, evt.data)
+        return
+    }
+    for (const item of items) {
+        try {
+            handleItem(item)
+        } catch (err) {
+            console.error("handle forward message", err, item)
         }
+    }
+})
 
-        // Try to extract price and timestamp; adapt to your Alpaca message shape
-        const price = item.p ?? item.price ?? item.last ?? item.px
-        const tsMs = parseTimestampMs(item)
+function handleItem(item) {
+    if (!item) return
 
-        if (price !== undefined && tsMs !== null) {
-            const timeSec = Math.round(tsMs / 1000)
-            pushPricePoint(timeSec, Number(price))
-            return
+    if (item.type === 'subscriptions') {
+        handleSubscriptions(item.symbols || [])
+        return
+    }
+    if (item.type === 'metrics_interval') return
+    // a late-join snapshot frame is [header, bars..., metrics, trade]; the rest is applied as usual
+    if (item.type === 'snapshot') return
+
+    // If analyzer forwarded a metrics message, update overlay series
+    if (item.type === 'metrics' && item.symbol) {
+        const nowSec = Math.round((Date.now()) / 1000)
+        const sym = item.symbol
+        // use now as time for metrics (backend emits them on a fixed cadence)
+        if (item.vwap !== null && item.vwap !== undefined) {
+            vwapSeries.update({ time: nowSec, value: Number(item.vwap) })
+        }
+        if (item.sma !== null && item.sma !== undefined) {
+            smaSeries.update({ time: nowSec, value: Number(item.sma) })
         }
+        if (item.ema20 !== null && item.ema20 !== undefined) {
+            emaSeries.update({ time: nowSec, value: Number(item.ema20) })
+        }
+        // rolling low / high / median of the metrics window
+        if (rangeStatus && item.min !== null && item.min !== undefined && item.max !== null) {
+            const median = item.median === null || item.median === undefined ? '' : `, median ${Number(item.median).toFixed(2)}`
+            rangeStatus.textContent = `Range (${item.window_s}s): ${Number(item.min).toFixed(2)} - ${Number(item.max).toFixed(2)}${median}`
+        }
+        // update symbol label
+        if (symbolStatus) symbolStatus.textContent = `Symbol: ${sym}`
+        return
+    }
 
-        if (streamMessagesContainer) {
-            // create a new div for each message row
-            const node = document.createElement("div")
-            node.textContent = messageParser(item)
-            streamMessagesContainer.appendChild(node)
-            // keep the most recent ~100 lines
-            while (streamMessagesContainer.childNodes.length > 100) streamMessagesContainer.removeChild(streamMessagesContainer.firstChild)
+    // top of book, conflated by the backend to one per symbol per interval
+    if (item.type === 'book' && item.symbol) {
+        if (bookStatus && item.bid !== null && item.ask !== null) {
+            const bps = item.spread_bps === null ? '' : ` (${item.spread_bps.toFixed(1)} bps)`
+            bookStatus.textContent = `Book: ${item.bid_size} x ${item.bid} / ${item.ask} x ${item.ask_size}${bps}`
         }
-    } catch (err) {
-        console.error("parse forward message", err, evt.data)
+        return
+    }
+
+    // If backend sent a finished bar, update priceSeries with close
+    if (item.type === 'bar' && item.close !== undefined && item.time !== undefined) {
+        // only 1s bars feed the price line; larger bars would arrive out of time order
+        if ((item.bar_s ?? 1) !== 1) return
+        // backend bar.time is seconds
+        const timeSec = Number(item.time)
+        pushPricePoint(timeSec, Number(item.close))
+        return
+    }
+
+    // Try to extract price and timestamp; adapt to your Alpaca message shape
+    const price = item.p ?? item.price ?? item.last ?? item.px
+    const tsMs = parseTimestampMs(item)
+
+    if (price !== undefined && tsMs !== null) {
+        const timeSec = Math.round(tsMs / 1000)
+        pushPricePoint(timeSec, Number(price))
+        return
     }
-})
+
+    if (streamMessagesContainer) {
+        // create a new div for each message row
+        const node = document.createElement("div")
+        node.textContent = messageParser(item)
+        streamMessagesContainer.appendChild(node)
+        // keep the most recent ~100 lines
+        while (streamMessagesContainer.childNodes.length > 100) streamMessagesContainer.removeChild(streamMessagesContainer.firstChild)
+    }
+}
 
 function messageParser(msg) {
     // msg is JSON
@@ -216,84 +336,60 @@ disconnectBtn.addEventListener('click', async function () {
     }
 })
 
-startBtn.addEventListener("click", async () => {
-    // make sure connection is established
-    if (connectionStatus) {
-        const symbol = symbolInput.value.trim().toUpperCase()
+// per-viewer subscriptions go over the forward socket; the server replies with
+// {type: "subscriptions", symbols: [...]} and subscribes upstream as needed
+let pendingSubscription = null
 
-        if (!symbol) {
-            showFlashMessage("Please enter a symbol.")
-            return
-        }
+function sendSubscription(action, symbol) {
+    if (forwardWs.readyState !== WebSocket.OPEN) {
+        showFlashMessage("Forward socket is not open.", 'error')
+        return false
+    }
+    pendingSubscription = { action, symbol }
+    forwardWs.send(JSON.stringify({ action, symbols: [symbol] }))
+    return true
+}
 
-        try {
-            // Ask server to subscribe
-            const resp = await fetch("/api/subscribe", {
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ symbol: symbol }),
-            })
-            if (!resp.ok) {
-                const txt = await resp.text().catch(() => resp.statusText)
-                showFlashMessage("Subscribe failed: " + resp.status + " " + txt, 'error')
-                return
-            }
-            const body = await resp.json()
-            if (body && body.ok && body.symbol === symbol) {
-                symbolStatus.textContent = `Symbol: ${body.symbol}`
-                symbolInput.disabled = true
-                showFlashMessage("Subscribed: " + body.symbol)
-            } else if (body && body.ok && body.symbol !== symbol) {
-                symbolStatus.textContent = `Symbol: ${body.symbol}`
-                symbolInput.disabled = true
-                showFlashMessage("Subscribe response: " + JSON.stringify(body))
-            } else {
-                symbolStatus.textContent = `Symbol: N/A`
-                showFlashMessage("Subscribe failed: " + JSON.stringify(body), 'error')
-            }
-        } catch (err) {
-            console.error("subscribe error", err)
-            showFlashMessage("Subscribe failed check server logs", 'error')
-        }
+function handleSubscriptions(symbols) {
+    const pending = pendingSubscription
+    pendingSubscription = null
+    if (!pending) return
+    const subscribed = symbols.includes(pending.symbol)
+    if (pending.action === "subscribe" && subscribed) {
+        symbolStatus.textContent = `Symbol: ${pending.symbol}`
+        symbolInput.disabled = true
+        showFlashMessage("Subscribed: " + pending.symbol)
+    } else if (pending.action === "unsubscribe" && !subscribed) {
+        symbolStatus.textContent = `Symbol: N/A`
+        streamMessagesContainer.innerHTML = ""
+        symbolInput.disabled = false
+        showFlashMessage("Unsubscribed successfully.")
     } else {
-        showFlashMessage("Please connect the streamer first.", 'error')
+        showFlashMessage(pending.action + " failed: " + JSON.stringify(symbols), 'error')
     }
-})
+}
 
-stopBtn.addEventListener("click", async () => {
+startBtn.addEventListener("click", () => {
+    // make sure connection is established
+    if (!connectionStatus) {
+        showFlashMessage("Please connect the streamer first.", 'error')
+        return
+    }
     const symbol = symbolInput.value.trim().toUpperCase()
-
     if (!symbol) {
         showFlashMessage("Please enter a symbol.")
         return
     }
+    sendSubscription("subscribe", symbol)
+})
 
-    try {
-        const resp = await fetch("/api/unsubscribe", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ symbol: symbol }),
-        })
-        if (!resp.ok) {
-            showFlashMessage("Unsubscribe failed: " + resp.statusText, 'error')
-            return
-        }
-        const body = await resp.json()
-        
-        if (body && body.ok) {
-            symbolStatus.textContent = `Symbol: N/A`
-            streamMessagesContainer.innerHTML = ""
-            symbolInput.disabled = false
-            showFlashMessage("Unsubscribed successfully.")
-        } else if (body && body.error) {
-            showFlashMessage("Unsubscribe failed: " + body.error, 'error')
-        } else {
-            showFlashMessage("Unsubscribe failed: " + JSON.stringify(body), 'error')
-        }
-    } catch (err) {
-        console.error("unsubscribe error", err)
-        showFlashMessage("Unsubscribe failed check server logs", 'error')
+stopBtn.addEventListener("click", () => {
+    const symbol = symbolInput.value.trim().toUpperCase()
+    if (!symbol) {
+        showFlashMessage("Please enter a symbol.")
+        return
     }
+    sendSubscription("unsubscribe", symbol)
 })
 
 function showFlashMessage(message, type = 'success') {
@@ -1,39 +1,522 @@
-from collections import deque, defaultdict
-from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from array import array
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 import math
+import sys
 import time
-import statistics
+
+import numpy as np
 
 # Each tick: (ts_ms, price, size)
 Tick = Tuple[int, float, float]
 
 
+class TickBuffer:
+    """Columnar tick storage: parallel ts/price/size arrays (8 bytes per field per tick).
+
+    Live ticks occupy ``[head, tail)``; popleft only advances ``head`` and the columns
+    are compacted (or grown) when the tail reaches capacity, so the live region is
+    always contiguous and can be exposed as zero-copy memoryviews. Supports the
+    deque operations (append, popleft, len, iter, [0], [-1]).
+
+    Every tick also has an absolute sequence number (``start_seq`` .. ``end_seq``)
+    that survives compaction, which is how several TickWindows share one buffer.
+    """
+    __slots__ = ("_ts", "_px", "_sz", "_head", "_tail", "_cap", "_popped")
+
+    def __init__(self, capacity: int = 64):
+        self._cap = max(8, int(capacity))
+        self._ts = array("q", bytes(8 * self._cap))
+        self._px = array("d", bytes(8 * self._cap))
+        self._sz = array("d", bytes(8 * self._cap))
+        self._head = 0
+        self._tail = 0
+        self._popped = 0  # sequence number of the tick at _head
+
+    def __len__(self) -> int:
+        return self._tail - self._head
+
+    def __bool__(self) -> bool:
+        return self._tail > self._head
+
+    def __iter__(self) -> Iterator[Tick]:
+        ts, px, sz = self._ts, self._px, self._sz
+        for i in range(self._head, self._tail):
+            yield ts[i], px[i], sz[i]
+
+    def __getitem__(self, i: int) -> Tick:
+        n = self._tail - self._head
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("TickBuffer index out of range")
+        i += self._head
+        return self._ts[i], self._px[i], self._sz[i]
+
+    def append(self, tick: Tick):
+        if self._tail == self._cap:
+            self._make_room()
+        i = self._tail
+        ts, px, sz = tick
+        self._ts[i] = int(ts)
+        self._px[i] = px
+        self._sz[i] = sz
+        self._tail = i + 1
+
+    def extend(self, ts_ms: np.ndarray, prices: np.ndarray, sizes: np.ndarray):
+        """Bulk append from NumPy columns."""
+        n = len(ts_ms)
+        while self._cap - self._tail < n:
+            self._make_room()
+        i = self._tail
+        np.frombuffer(self._ts, dtype=np.int64)[i:i + n] = ts_ms
+        np.frombuffer(self._px, dtype=np.float64)[i:i + n] = prices
+        np.frombuffer(self._sz, dtype=np.float64)[i:i + n] = sizes
+        self._tail = i + n
+
+    def popleft(self) -> Tick:
+        i = self._head
+        if i == self._tail:
+            raise IndexError("pop from an empty TickBuffer")
+        self._head = i + 1
+        self._popped += 1
+        tick = self._ts[i], self._px[i], self._sz[i]
+        if self._head == self._tail:
+            self._head = self._tail = 0
+        return tick
+
+    @property
+    def start_seq(self) -> int:
+        return self._popped
+
+    @property
+    def end_seq(self) -> int:
+        return self._popped + self._tail - self._head
+
+    def ts_at(self, seq: int) -> int:
+        return self._ts[self._head + seq - self._popped]
+
+    def price_at(self, seq: int) -> float:
+        return self._px[self._head + seq - self._popped]
+
+    def size_at(self, seq: int) -> float:
+        return self._sz[self._head + seq - self._popped]
+
+    def discard_until(self, seq: int):
+        """Drop every tick with sequence number < seq."""
+        n = min(seq - self._popped, self._tail - self._head)
+        if n <= 0:
+            return
+        self._head += n
+        self._popped += n
+        if self._head == self._tail:
+            self._head = self._tail = 0
+
+    def _make_room(self):
+        n = self._tail - self._head
+        if n <= self._cap // 2 and self._head > 0:
+            # compact in place (same-length slice assignment, no resize)
+            h, t = self._head, self._tail
+            self._ts[0:n] = self._ts[h:t]
+            self._px[0:n] = self._px[h:t]
+            self._sz[0:n] = self._sz[h:t]
+        else:
+            # grow into fresh arrays so outstanding views of the old ones stay valid
+            self._cap *= 2
+            pad = bytes(8 * (self._cap - n))
+            self._ts = self._ts[self._head:self._tail] + array("q", pad)
+            self._px = self._px[self._head:self._tail] + array("d", pad)
+            self._sz = self._sz[self._head:self._tail] + array("d", pad)
+        self._head, self._tail = 0, n
+
+    def clear(self):
+        self._popped += self._tail - self._head
+        self._head = self._tail = 0
+
+    def shrink(self, min_capacity: int = 64):
+        """Give back capacity a burst left behind: once the live ticks fill a quarter of
+        it or less, move them into fresh arrays twice their size (at least min_capacity)."""
+        n = self._tail - self._head
+        cap = max(8, int(min_capacity))
+        while cap < 2 * n:
+            cap *= 2
+        if cap * 2 > self._cap:
+            return
+        pad = bytes(8 * (cap - n))
+        self._ts = self._ts[self._head:self._tail] + array("q", pad)
+        self._px = self._px[self._head:self._tail] + array("d", pad)
+        self._sz = self._sz[self._head:self._tail] + array("d", pad)
+        self._cap = cap
+        self._head, self._tail = 0, n
+
+    def _first(self, start_seq: Optional[int]) -> int:
+        if start_seq is None:
+            return self._head
+        return self._head + max(0, start_seq - self._popped)
+
+    def price_view(self, start_seq: Optional[int] = None) -> memoryview:
+        """Zero-copy view of live prices (from start_seq); valid until the next append."""
+        return memoryview(self._px)[self._first(start_seq):self._tail]
+
+    def size_view(self, start_seq: Optional[int] = None) -> memoryview:
+        """Zero-copy view of live sizes (from start_seq); valid until the next append."""
+        return memoryview(self._sz)[self._first(start_seq):self._tail]
+
+    def ts_view(self, start_seq: Optional[int] = None) -> memoryview:
+        """Zero-copy view of live timestamps in ms (from start_seq); valid until the next append."""
+        return memoryview(self._ts)[self._first(start_seq):self._tail]
+
+    def nbytes(self) -> int:
+        return 3 * 8 * self._cap
+
+
+class SortedMultiset:
+    """Sorted multiset of floats with O(log n) insert, remove and k-th smallest.
+
+    Values are kept in sorted chunks of at most ``2 * load`` (bisect over the chunk
+    maxima, then an insort within one chunk, a memmove of a few KB at most), and a
+    Fenwick tree over the chunk lengths finds the chunk holding the k-th value. Chunks
+    split when they grow past ``2 * load`` and merge below ``load / 4``, which rebuilds
+    the tree (O(chunks), amortized over at least ``load / 2`` updates).
+    """
+    __slots__ = ("load", "_chunks", "_maxes", "_tree", "_len")
+
+    def __init__(self, values: Iterable[float] = (), load: int = 256):
+        self.load = max(4, int(load))
+        self.reset(sorted(values))
+
+    def __len__(self) -> int:
+        return self._len
+
+    def reset(self, ordered):
+        """Replace the contents with ``ordered`` (already sorted: a list or a NumPy array)."""
+        if isinstance(ordered, np.ndarray):
+            ordered = ordered.tolist()
+        load = self.load
+        self._chunks: List[List[float]] = [ordered[i:i + load] for i in range(0, len(ordered), load)]
+        self._maxes: List[float] = [c[-1] for c in self._chunks]
+        self._len = len(ordered)
+        self._build()
+
+    def _build(self):
+        chunks = self._chunks
+        m = len(chunks)
+        tree = [0] * (m + 1)
+        for i in range(1, m + 1):
+            tree[i] += len(chunks[i - 1])
+            j = i + (i & -i)
+            if j <= m:
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def _update(self, i: int, delta: int):
+        tree = self._tree
+        m = len(tree) - 1
+        i += 1
+        while i <= m:
+            tree[i] += delta
+            i += i & -i
+
+    def _split(self, i: int):
+        chunk = self._chunks[i]
+        half = len(chunk) >> 1
+        self._chunks.insert(i + 1, chunk[half:])
+        del chunk[half:]
+        self._maxes[i] = chunk[-1]
+        self._maxes.insert(i + 1, self._chunks[i + 1][-1])
+
+    def add(self, value: float):
+        chunks, maxes = self._chunks, self._maxes
+        self._len += 1
+        if not maxes:
+            chunks.append([value])
+            maxes.append(value)
+            self._build()
+            return
+        i = bisect_left(maxes, value)
+        if i == len(maxes):
+            i -= 1
+            chunk = chunks[i]
+            chunk.append(value)
+            maxes[i] = value
+        else:
+            chunk = chunks[i]
+            insort(chunk, value)
+        if len(chunk) > 2 * self.load:
+            self._split(i)
+            self._build()
+        else:
+            self._update(i, 1)
+
+    def remove(self, value: float):
+        """Remove one occurrence of ``value``; ValueError if there is none."""
+        chunks, maxes = self._chunks, self._maxes
+        i = bisect_left(maxes, value)
+        if i == len(maxes):
+            raise ValueError(value)
+        chunk = chunks[i]
+        j = bisect_left(chunk, value)
+        if j == len(chunk) or chunk[j] != value:
+            raise ValueError(value)
+        del chunk[j]
+        self._len -= 1
+        if not chunk:
+            del chunks[i]
+            del maxes[i]
+            self._build()
+            return
+        if j == len(chunk):
+            maxes[i] = chunk[-1]
+        if len(chunk) < self.load >> 2 and len(chunks) > 1:
+            k = i if i + 1 < len(chunks) else i - 1
+            chunks[k].extend(chunks.pop(k + 1))
+            del maxes[k + 1]
+            maxes[k] = chunks[k][-1]
+            if len(chunks[k]) > 2 * self.load:
+                self._split(k)
+            self._build()
+        else:
+            self._update(i, -1)
+
+    def kth(self, k: int) -> float:
+        """The k-th smallest value (0-based; negative counts from the largest)."""
+        if k < 0:
+            k += self._len
+        if not 0 <= k < self._len:
+            raise IndexError(k)
+        tree = self._tree
+        m = len(tree) - 1
+        pos = 0
+        bit = 1 << (m.bit_length() - 1)
+        while bit:
+            nxt = pos + bit
+            if nxt <= m and tree[nxt] <= k:
+                pos = nxt
+                k -= tree[nxt]
+            bit >>= 1
+        return self._chunks[pos][k]
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Linearly interpolated quantile, as numpy.quantile's default method."""
+        n = self._len
+        if not n:
+            return None
+        h = (n - 1) * min(1.0, max(0.0, q))
+        lo = int(h)
+        value = self.kth(lo)
+        if h > lo:
+            value += (h - lo) * (self.kth(lo + 1) - value)
+        return value
+
+    def nbytes(self) -> int:
+        return _ORDER_STAT_ENTRY * self._len + _CHUNK_OVERHEAD * len(self._chunks)
+
+
 class TickWindow:
-    """Time-windowed tick buffer with simple metric helpers."""
-    def __init__(self, window_seconds: int):
+    """Time-windowed tick buffer with simple metric helpers.
+
+    Running sums are maintained as ticks enter and leave the window so every metric
+    read is O(1): Welford mean/variance of prices, the same for log returns between
+    consecutive ticks, and one per-tick EMA per span that has been requested.
+
+    Order statistics are tracked once first requested: min/max through monotonic
+    deques of sequence numbers (O(1) amortized per tick, O(1) reads), median and
+    quantiles through a SortedMultiset of the window's prices (O(log n) per tick and
+    per read).
+
+    A window either owns its TickBuffer or is a cursor (``_start`` sequence number)
+    over a buffer shared with the symbol's other windows, see SymbolTicks.
+    """
+    def __init__(self, window_seconds: int, buffer: Optional[TickBuffer] = None):
+        self.window_seconds = window_seconds
         self.window_ms = int(window_seconds * 1000)
-        self.deq: Deque[Tick] = deque()
+        self._owns_buffer = buffer is None
+        self.buffer = buffer if buffer is not None else TickBuffer()
+        # sequence number of the oldest tick inside the window
+        self._start = self.buffer.end_seq
         self._vol_sum = 0.0
         self._pv_sum = 0.0  # price * volume
+        # Welford state for prices
+        self._mean = 0.0
+        self._m2 = 0.0
+        # Welford state for log returns between consecutive prices
+        self._lr_n = 0
+        self._lr_mean = 0.0
+        self._lr_m2 = 0.0
+        # span -> [alpha, value]
+        self._emas: Dict[int, List[float]] = {}
+        # sequence numbers whose prices increase (_mins) / decrease (_maxs) front to back
+        self._mins: Optional[Deque[int]] = None
+        self._maxs: Optional[Deque[int]] = None
+        self._sorted: Optional[SortedMultiset] = None
+
+    def __len__(self) -> int:
+        return self.buffer.end_seq - self._start
 
     def add(self, ts_ms: int, price: float, size: float = 1.0):
-        self.deq.append((ts_ms, float(price), float(size)))
+        if not self._owns_buffer:
+            raise RuntimeError("windows over a shared buffer are fed by their SymbolTicks")
+        self.buffer.append((ts_ms, price, size))
+        self._on_append(ts_ms, float(price), float(size))
+        self.buffer.discard_until(self._start)
+
+    def _on_append(self, ts_ms: int, price: float, size: float):
+        """Account for the tick just appended to the buffer, then prune."""
+        self._ingest(self.buffer.end_seq - 1, price, size)
+        for state in self._emas.values():
+            state[1] = state[0] * price + (1 - state[0]) * state[1]
+        if self._mins is not None:
+            self._push_extrema(self.buffer.end_seq - 1, price)
+        if self._sorted is not None:
+            self._sorted.add(price)
+        self._prune(ts_ms)
+
+    def _push_extrema(self, seq: int, price: float):
+        price_at = self.buffer.price_at
+        mins, maxs = self._mins, self._maxs
+        while mins and price_at(mins[-1]) >= price:
+            mins.pop()
+        mins.append(seq)
+        while maxs and price_at(maxs[-1]) <= price:
+            maxs.pop()
+        maxs.append(seq)
+
+    def _ingest(self, seq: int, price: float, size: float):
+        if seq > self._start:
+            self._add_return(self.buffer.price_at(seq - 1), price)
         self._pv_sum += price * size
         self._vol_sum += size
-        self._prune(ts_ms)
+        n = seq - self._start + 1
+        d = price - self._mean
+        self._mean += d / n
+        self._m2 += d * (price - self._mean)
+
+    def _rebuild(self, now_ms: int):
+        """Recompute the running sums (vectorized) for the window ending at now_ms.
+
+        Assumes the buffer is time-ordered: the window becomes every retained tick with
+        ts >= now_ms - window_ms, exactly what per-tick pruning would have kept.
+        """
+        self._reset_sums()
+        buf = self.buffer
+        ts = np.frombuffer(buf.ts_view(), dtype=np.int64)
+        self._start = buf.start_seq + int(np.searchsorted(ts, now_ms - self.window_ms, side="left"))
+        px = np.frombuffer(self.price_view(), dtype=np.float64)
+        if not len(px):
+            self._seed_order_stats()
+            return
+        sz = np.frombuffer(self.volume_view(), dtype=np.float64)
+        self._pv_sum = float(np.dot(px, sz))
+        self._vol_sum = float(sz.sum())
+        self._mean = float(px.mean())
+        self._m2 = float(np.square(px - self._mean).sum())
+        if len(px) >= 2:
+            prev, cur = px[:-1], px[1:]
+            ok = (prev > 0) & (cur > 0)
+            lr = np.log(cur[ok] / prev[ok])
+            if len(lr):
+                self._lr_n = len(lr)
+                self._lr_mean = float(lr.mean())
+                self._lr_m2 = float(np.square(lr - self._lr_mean).sum())
+        self._seed_order_stats()
+
+    def _seed_order_stats(self):
+        """Rebuild the tracked order statistics from the window's prices (vectorized)."""
+        if self._mins is None and self._sorted is None:
+            return
+        px = np.frombuffer(self.price_view(), dtype=np.float64)
+        if self._sorted is not None:
+            self._sorted.reset(np.sort(px))
+        if self._mins is not None:
+            # a tick stays in the min deque while no later tick is priced at or below it
+            seqs = np.arange(self._start, self._start + len(px), dtype=np.int64)
+            if len(px):
+                later_min = np.minimum.accumulate(px[::-1])[::-1]
+                later_max = np.maximum.accumulate(px[::-1])[::-1]
+                keep_min = np.append(px[:-1] < later_min[1:], True)
+                keep_max = np.append(px[:-1] > later_max[1:], True)
+            else:
+                keep_min = keep_max = np.zeros(0, dtype=bool)
+            self._mins = deque(seqs[keep_min].tolist())
+            self._maxs = deque(seqs[keep_max].tolist())
+
+    def _advance_emas(self, prices: np.ndarray):
+        """Apply a batch of ticks to every tracked EMA in closed form."""
+        n = len(prices)
+        for state in self._emas.values():
+            decay = 1 - state[0]
+            weights = decay ** np.arange(n - 1, -1, -1, dtype=np.float64)
+            state[1] = decay ** n * state[1] + state[0] * float(np.dot(weights, prices))
 
     def _prune(self, now_ms: int):
         cutoff = now_ms - self.window_ms
-        while self.deq and self.deq[0][0] < cutoff:
-            ts, p, s = self.deq.popleft()
+        buf = self.buffer
+        end = buf.end_seq
+        first = self._start
+        while self._start < end and buf.ts_at(self._start) < cutoff:
+            p = buf.price_at(self._start)
+            s = buf.size_at(self._start)
+            self._start += 1
+            if self._sorted is not None:
+                self._sorted.remove(p)
             self._pv_sum -= p * s
             self._vol_sum -= s
+            n = end - self._start
+            if n == 0:
+                self._reset_sums()
+                continue
+            d = p - self._mean
+            self._mean -= d / n
+            self._m2 = max(0.0, self._m2 - d * (p - self._mean))
+            self._remove_return(p, buf.price_at(self._start))
+        if self._mins is not None and self._start != first:
+            start = self._start
+            for q in (self._mins, self._maxs):
+                while q and q[0] < start:
+                    q.popleft()
+
+    def _reset_sums(self):
+        # window emptied: drop accumulated floating point error
+        self._pv_sum = self._vol_sum = 0.0
+        self._mean = self._m2 = 0.0
+        self._lr_n = 0
+        self._lr_mean = self._lr_m2 = 0.0
+
+    def _add_return(self, prev: float, price: float):
+        if prev <= 0 or price <= 0:
+            return
+        r = math.log(price / prev)
+        self._lr_n += 1
+        d = r - self._lr_mean
+        self._lr_mean += d / self._lr_n
+        self._lr_m2 += d * (r - self._lr_mean)
+
+    def _remove_return(self, prev: float, price: float):
+        if prev <= 0 or price <= 0:
+            return
+        r = math.log(price / prev)
+        self._lr_n -= 1
+        if self._lr_n == 0:
+            self._lr_mean = self._lr_m2 = 0.0
+            return
+        d = r - self._lr_mean
+        self._lr_mean -= d / self._lr_n
+        self._lr_m2 = max(0.0, self._lr_m2 - d * (r - self._lr_mean))
 
     def prices(self) -> List[float]:
-        return [p for _, p, _ in self.deq]
+        return self.price_view().tolist()
 
     def volumes(self) -> List[float]:
-        return [s for _, _, s in self.deq]
+        return self.volume_view().tolist()
+
+    def price_view(self) -> memoryview:
+        """Zero-copy float64 view of window prices; valid until the next add."""
+        return self.buffer.price_view(self._start)
+
+    def volume_view(self) -> memoryview:
+        """Zero-copy float64 view of window volumes; valid until the next add."""
+        return self.buffer.size_view(self._start)
 
     def vwap(self) -> Optional[float]:
         if self._vol_sum <= 0:
@@ -41,16 +524,68 @@ class TickWindow:
         return self._pv_sum / self._vol_sum
 
     def sma(self) -> Optional[float]:
-        ps = self.prices()
-        if not ps:
+        if self.buffer.end_seq <= self._start:
             return None
-        return statistics.mean(ps)
+        return self._mean
 
     def std(self) -> Optional[float]:
-        ps = self.prices()
-        if len(ps) < 2:
+        n = len(self)
+        if n < 2:
             return None
-        return statistics.pstdev(ps)
+        return math.sqrt(self._m2 / n)
+
+    def ema(self, span: int = 20) -> Optional[float]:
+        """EMA updated on every tick. The first request for a span seeds it from the window."""
+        state = self._emas.get(span)
+        if state is None:
+            if self.buffer.end_seq <= self._start:
+                return None
+            alpha = 2 / (span + 1)
+            last = self._mean
+            for p in self.price_view():
+                last = alpha * p + (1 - alpha) * last
+            state = self._emas[span] = [alpha, last]
+        return state[1]
+
+    def _track_extrema(self):
+        if self._mins is None:
+            self._mins, self._maxs = deque(), deque()
+            self._seed_order_stats()
+
+    def min(self) -> Optional[float]:
+        """Lowest price in the window (tracked per tick from the first request)."""
+        self._track_extrema()
+        return self.buffer.price_at(self._mins[0]) if self._mins else None
+
+    def max(self) -> Optional[float]:
+        """Highest price in the window (tracked per tick from the first request)."""
+        self._track_extrema()
+        return self.buffer.price_at(self._maxs[0]) if self._maxs else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Price quantile ``q`` in [0, 1], interpolated like numpy.quantile (tracked per
+        tick from the first request)."""
+        if self._sorted is None:
+            self._sorted = SortedMultiset()
+            self._seed_order_stats()
+        return self._sorted.quantile(q)
+
+    def median(self) -> Optional[float]:
+        return self.quantile(0.5)
+
+    @property
+    def tracks_order_stats(self) -> bool:
+        """Whether min/max or quantiles have been requested (and are now kept per tick)."""
+        return self._mins is not None or self._sorted is not None
+
+    def nbytes(self) -> int:
+        """Approximate memory of the window's own state (ticks live in the buffer)."""
+        n = _WINDOW_OVERHEAD
+        if self._mins is not None:
+            n += _ORDER_STAT_ENTRY * (len(self._mins) + len(self._maxs))
+        if self._sorted is not None:
+            n += self._sorted.nbytes()
+        return n
 
     def log_returns(self) -> List[float]:
         ps = self.prices()
@@ -58,6 +593,12 @@ class TickWindow:
             return []
         return [math.log(ps[i] / ps[i - 1]) for i in range(1, len(ps))]
 
+    def log_return_std(self) -> Optional[float]:
+        """Population std of log returns between consecutive ticks in the window."""
+        if self._lr_n < 1:
+            return None
+        return math.sqrt(self._lr_m2 / self._lr_n)
+
 
 class BarAggregator:
     """Aggregate ticks into time bars (open/high/low/close, volume)."""
@@ -84,7 +625,14 @@ class BarAggregator:
             return None
 
         # bar rolled over -> emit previous bar and start new
-        finished = {
+        finished = self._finished()
+        # start new bar from this tick
+        self.current_start = bar_start
+        self._init_bar(price, size)
+        return finished
+
+    def _finished(self) -> Dict:
+        return {
             "time": self.current_start // 1000,  # seconds
             "open": self.open,
             "high": self.high,
@@ -92,10 +640,6 @@ class BarAggregator:
             "close": self.close,
             "volume": self.volume,
         }
-        # start new bar from this tick
-        self.current_start = bar_start
-        self._init_bar(price, size)
-        return finished
 
     def _init_bar(self, price: float, size: float):
         self.open = self.high = self.low = self.close = price
@@ -110,85 +654,773 @@ class BarAggregator:
         self.volume += size
 
 
+class BarRollup(BarAggregator):
+    """Roll finished lower-timeframe bars (e.g. 1s) up into bar_seconds bars."""
+
+    def add_bar(self, bar: Dict) -> Optional[Dict]:
+        """Fold in one finished bar; returns the rolled-up bar if this one starts a new bucket."""
+        start_ms = int(bar["time"]) * 1000
+        finished = self.advance(start_ms)
+        if self.current_start is None:
+            self.current_start = start_ms - (start_ms % self.bar_ms)
+            self.open = bar["open"]
+            self.high = bar["high"]
+            self.low = bar["low"]
+            self.close = bar["close"]
+            self.volume = bar["volume"]
+        else:
+            if bar["high"] > self.high:
+                self.high = bar["high"]
+            if bar["low"] < self.low:
+                self.low = bar["low"]
+            self.close = bar["close"]
+            self.volume += bar["volume"]
+        return finished
+
+    def advance(self, ts_ms: int) -> Optional[Dict]:
+        """Finish the current bar once time (ts_ms) has moved past its bucket."""
+        if self.current_start is None or ts_ms - (ts_ms % self.bar_ms) == self.current_start:
+            return None
+        finished = self._finished()
+        self.current_start = None
+        return finished
+
+
+class BarHistory:
+    """Bounded ring of finished bars for one (symbol, timeframe), stored column-wise.
+
+    Columns grow up to ``capacity`` and then wrap, overwriting the oldest bar.
+    """
+    FIELDS = ("time", "open", "high", "low", "close", "volume")
+    __slots__ = ("capacity", "_cols", "_next")
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = max(1, int(capacity))
+        self._cols = (array("q"), array("d"), array("d"), array("d"), array("d"), array("d"))
+        self._next = 0  # slot overwritten by the next append once full
+
+    def __len__(self) -> int:
+        return len(self._cols[0])
+
+    def nbytes(self) -> int:
+        return sum(col.itemsize * len(col) for col in self._cols)
+
+    def append(self, bar: Dict):
+        values = (int(bar["time"]), bar["open"], bar["high"], bar["low"], bar["close"], bar["volume"])
+        if len(self._cols[0]) < self.capacity:
+            for col, v in zip(self._cols, values):
+                col.append(v)
+            return
+        i = self._next
+        for col, v in zip(self._cols, values):
+            col[i] = v
+        self._next = (i + 1) % self.capacity
+
+    def extend(self, cols: Tuple[np.ndarray, ...]):
+        """Append bars given as (time, open, high, low, close, volume) columns; only the
+        newest ``capacity`` rows are touched."""
+        n = len(cols[0])
+        start = max(0, n - self.capacity)
+        t, o, h, l, c, v = (col[start:].tolist() for col in cols)
+        for row in zip(t, o, h, l, c, v):
+            self.append({"time": row[0], "open": row[1], "high": row[2], "low": row[3], "close": row[4], "volume": row[5]})
+
+    def last(self, n: int) -> List[Dict]:
+        """The most recent n bars, oldest first. O(n), independent of capacity."""
+        count = len(self._cols[0])
+        n = max(0, min(n, count))
+        oldest = self._next if count == self.capacity else 0
+        t, o, h, l, c, v = self._cols
+        out = []
+        for k in range(count - n, count):
+            i = (oldest + k) % count
+            out.append({"time": t[i], "open": o[i], "high": h[i], "low": l[i], "close": c[i], "volume": v[i]})
+        return out
+
+
+# Approximate fixed Python object costs (measured with tracemalloc on CPython 3.11),
+# added to the array payloads by SymbolTicks.nbytes / Analyzer.symbol_nbytes.
+_SYMBOL_OVERHEAD = 1000  # SymbolTicks, its dicts and the Analyzer index entries
+_BUFFER_OVERHEAD = 500
+_WINDOW_OVERHEAD = 300
+_ORDER_STAT_ENTRY = 36  # list / deque slot plus the float or int object it points to
+_CHUNK_OVERHEAD = 120  # one SortedMultiset chunk list and its max / tree entries
+_BAR_OVERHEAD = 300  # BarAggregator / BarRollup
+_HISTORY_OVERHEAD = 650
+_BOOK_OVERHEAD = 150
+
+# finished bars as parallel columns: (time_ms, open, high, low, close, volume)
+BarColumns = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def _fold_bars(agg: BarAggregator, start_ms: np.ndarray, o, h, l, c, v) -> BarColumns:
+    """Vectorized equivalent of feeding rows (ticks or finished bars, in arrival order)
+    through ``agg``: consecutive rows in the same bucket form one bar. Returns the bars
+    finished along the way and leaves the last, still open bar in ``agg``."""
+    bucket = start_ms - start_ms % agg.bar_ms
+    cut = np.flatnonzero(bucket[1:] != bucket[:-1]) + 1
+    first = np.concatenate(([0], cut))
+    last = np.concatenate((cut, [len(bucket)])) - 1
+    g_start = bucket[first]
+    g_open = o[first]
+    g_high = np.maximum.reduceat(h, first)
+    g_low = np.minimum.reduceat(l, first)
+    g_close = c[last]
+    g_vol = np.add.reduceat(v, first)
+    if agg.current_start is not None:
+        if g_start[0] == agg.current_start:
+            g_open[0] = agg.open
+            g_high[0] = max(g_high[0], agg.high)
+            g_low[0] = min(g_low[0], agg.low)
+            g_vol[0] += agg.volume
+        else:
+            g_start = np.concatenate(([agg.current_start], g_start))
+            g_open = np.concatenate(([agg.open], g_open))
+            g_high = np.concatenate(([agg.high], g_high))
+            g_low = np.concatenate(([agg.low], g_low))
+            g_close = np.concatenate(([agg.close], g_close))
+            g_vol = np.concatenate(([agg.volume], g_vol))
+    agg.current_start = int(g_start[-1])
+    agg.open = float(g_open[-1])
+    agg.high = float(g_high[-1])
+    agg.low = float(g_low[-1])
+    agg.close = float(g_close[-1])
+    agg.volume = float(g_vol[-1])
+    return g_start[:-1], g_open[:-1], g_high[:-1], g_low[:-1], g_close[:-1], g_vol[:-1]
+
+
+def _close_open_bar(agg: BarAggregator, cols: BarColumns) -> BarColumns:
+    """Append agg's open bar to cols and clear it (BarRollup.advance, vectorized)."""
+    extra = ([agg.current_start], [agg.open], [agg.high], [agg.low], [agg.close], [agg.volume])
+    agg.current_start = None
+    return tuple(np.concatenate((col, e)) for col, e in zip(cols, extra))
+
+
+class SymbolTicks:
+    """One symbol's shared tick buffer plus the windows and bar aggregators fed from it.
+
+    The buffer keeps ticks only as long as the longest window needs them; each
+    window is a cursor into it, so adding a window costs running sums, not a copy.
+
+    Ticks are aggregated into 1s bars only; every larger timeframe is a BarRollup of
+    those 1s bars. Finished bars are kept in a bounded BarHistory per timeframe.
+    """
+    BASE_BAR_SECONDS = 1
+    __slots__ = ("symbol", "buffer", "windows", "bars", "history", "history_size", "last_ms", "_window_list",
+                 "_rollups")
+
+    def __init__(
+        self,
+        symbol: str,
+        window_seconds: Iterable[int] = (),
+        bar_seconds: Iterable[int] = (),
+        history_size: int = 1000,
+    ):
+        self.symbol = symbol
+        self.buffer = TickBuffer()
+        self.windows: Dict[int, TickWindow] = {}
+        self.bars: Dict[int, BarAggregator] = {}
+        self.history: Dict[int, BarHistory] = {}
+        self.history_size = history_size
+        self.last_ms = 0  # timestamp of the newest tick
+        self._window_list: List[TickWindow] = []
+        self._rollups: List[Tuple[int, BarRollup]] = []
+        for ws in window_seconds:
+            self.add_window(ws)
+        for bs in bar_seconds:
+            self.add_bar(bs)
+
+    def add_window(self, window_seconds: int) -> TickWindow:
+        w = self.windows.get(window_seconds)
+        if w is None:
+            w = TickWindow(window_seconds, buffer=self.buffer)
+            if self.buffer:
+                # seed from whatever history the buffer still retains
+                w._rebuild(self.buffer[-1][0])
+            self.windows[window_seconds] = w
+            self._window_list.append(w)
+        return w
+
+    def remove_window(self, window_seconds: int):
+        w = self.windows.pop(window_seconds, None)
+        if w is not None:
+            self._window_list.remove(w)
+            self._trim()
+
+    def prune(self, now_ms: int):
+        """Expire ticks every window has left by ``now_ms`` (windows otherwise prune only
+        on the symbol's next tick) and release buffer capacity no longer needed."""
+        for w in self._window_list:
+            w._prune(now_ms)
+        self._trim()
+        self.buffer.shrink()
+
+    def _trim(self):
+        buf = self.buffer
+        buf.discard_until(min((w._start for w in self._window_list), default=buf.end_seq))
+
+    def nbytes(self) -> int:
+        """Approximate memory held for this symbol: tick buffer, bar histories and the
+        fixed per-object costs of windows and aggregators."""
+        return (
+            _SYMBOL_OVERHEAD + _BUFFER_OVERHEAD + self.buffer.nbytes()
+            + sum(w.nbytes() for w in self.windows.values())
+            + _BAR_OVERHEAD * len(self.bars)
+            + sum(_HISTORY_OVERHEAD + h.nbytes() for h in self.history.values())
+        )
+
+    def add_bar(self, bar_seconds: int) -> BarAggregator:
+        """Maintain bars of this timeframe (adds the 1s base aggregator if needed)."""
+        agg = self.bars.get(bar_seconds)
+        if agg is not None:
+            return agg
+        base = self.BASE_BAR_SECONDS
+        if base not in self.bars:
+            self.bars[base] = BarAggregator(base)
+            self.history[base] = BarHistory(self.history_size)
+        if bar_seconds != base:
+            rollup = self.bars[bar_seconds] = BarRollup(bar_seconds)
+            self.history[bar_seconds] = BarHistory(self.history_size)
+            self._rollups.append((bar_seconds, rollup))
+        return self.bars[bar_seconds]
+
+    def add_ticks(self, ts_ms: np.ndarray, prices: np.ndarray, sizes: np.ndarray, collect: bool = True) -> List[Dict]:
+        """Bulk ingest of time-ordered ticks (replay / catch-up).
+
+        Bars are built with vectorized run-length aggregation: ticks -> 1s bars, 1s
+        bars -> rollups, so a day of ticks costs a handful of NumPy passes. Windows
+        only see the ticks young enough to survive pruning. Returns the finished
+        bars (1s first, then each rollup) when ``collect`` is set.
+        """
+        ts_ms = np.asarray(ts_ms, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        sizes = np.asarray(sizes, dtype=np.float64)
+        n = len(ts_ms)
+        if n == 0:
+            return []
+        self.last_ms = int(ts_ms[-1])
+        finished_bars: List[Dict] = []
+        base = self.bars.get(self.BASE_BAR_SECONDS)
+        if base is not None:
+            base_cols = _fold_bars(base, ts_ms, prices, prices, prices, prices, sizes)
+            self._store_bars(self.BASE_BAR_SECONDS, base_cols, finished_bars if collect else None)
+            for bar_sec, rollup in self._rollups:
+                if len(base_cols[0]):
+                    cols = _fold_bars(rollup, *base_cols)
+                else:
+                    cols = tuple(col[:0] for col in base_cols)
+                cur = rollup.current_start
+                if cur is not None and base.current_start - base.current_start % rollup.bar_ms != cur:
+                    # same as BarRollup.advance: the open 1s bar has left this bucket
+                    cols = _close_open_bar(rollup, cols)
+                self._store_bars(bar_sec, cols, finished_bars if collect else None)
+
+        buf = self.buffer
+        if self._window_list:
+            now_ms = int(ts_ms[-1])
+            horizon = now_ms - max(w.window_ms for w in self._window_list)
+            first = int(np.searchsorted(ts_ms, horizon, side="left"))
+            buf.extend(ts_ms[first:], prices[first:], sizes[first:])
+            oldest = buf.end_seq
+            for w in self._window_list:
+                w._advance_emas(prices)
+                w._rebuild(now_ms)
+                if w._start < oldest:
+                    oldest = w._start
+            buf.discard_until(oldest)
+        else:
+            buf.discard_until(buf.end_seq)
+        return finished_bars
+
+    def _store_bars(self, bar_sec: int, cols: BarColumns, out: Optional[List[Dict]]):
+        if not len(cols[0]):
+            return
+        t_sec = cols[0] // 1000
+        cols = (t_sec,) + tuple(cols[1:])
+        self.history[bar_sec].extend(cols)
+        if out is not None:
+            for t, o, h, l, c, v in zip(*(col.tolist() for col in cols)):
+                out.append({
+                    "time": t, "open": o, "high": h, "low": l, "close": c, "volume": v,
+                    "type": "bar", "symbol": self.symbol, "bar_s": bar_sec,
+                })
+
+    def recent_bars(self, bar_seconds: int, limit: int = 100) -> List[Dict]:
+        history = self.history.get(bar_seconds)
+        return history.last(limit) if history is not None else []
+
+    def _finish(self, bar: Dict, bar_sec: int, out: List[Dict]):
+        bar["type"] = "bar"
+        bar["symbol"] = self.symbol
+        bar["bar_s"] = bar_sec
+        self.history[bar_sec].append(bar)
+        out.append(bar)
+
+    def add_tick(self, ts_ms: int, price: float, size: float = 1.0) -> List[Dict]:
+        price = float(price)
+        size = float(size)
+        self.last_ms = ts_ms
+        buf = self.buffer
+        buf.append((ts_ms, price, size))
+        windows = self._window_list
+        if windows:
+            oldest = buf.end_seq
+            for w in windows:
+                w._on_append(ts_ms, price, size)
+                if w._start < oldest:
+                    oldest = w._start
+            buf.discard_until(oldest)
+        else:
+            buf.discard_until(buf.end_seq)
+        finished_bars: List[Dict] = []
+        base = self.bars.get(self.BASE_BAR_SECONDS)
+        if base is None:
+            return finished_bars
+        finished = base.add_tick(ts_ms, price, size)
+        if finished:
+            self._finish(finished, self.BASE_BAR_SECONDS, finished_bars)
+            # roll the finished 1s bar up, then close any bucket the new 1s bar has left
+            for bar_sec, rollup in self._rollups:
+                done = rollup.add_bar(finished)
+                if done:
+                    self._finish(done, bar_sec, finished_bars)
+                done = rollup.advance(base.current_start)
+                if done:
+                    self._finish(done, bar_sec, finished_bars)
+        return finished_bars
+
+
+class QuoteBook:
+    """Top of book for one symbol plus time-weighted rolling spread statistics.
+
+    Each spread is weighted by how long it was in force: when the next quote arrives
+    ``dt`` ms later the previous spread enters an exponentially weighted mean/variance
+    with ``alpha = 1 - exp(-dt / tau_ms)``. O(1) per quote, no buffer. One-sided
+    quotes (bid or ask <= 0) update the book but not the statistics.
+    """
+    __slots__ = ("symbol", "tau_ms", "ts_ms", "bid", "ask", "bid_size", "ask_size", "quotes",
+                 "_sp_mean", "_sp_var", "_sp_n")
+
+    def __init__(self, symbol: str, tau_ms: float):
+        self.symbol = symbol
+        self.tau_ms = float(tau_ms)
+        self.ts_ms = 0
+        self.bid = 0.0
+        self.ask = 0.0
+        self.bid_size = 0.0
+        self.ask_size = 0.0
+        self.quotes = 0
+        self._sp_mean = 0.0
+        self._sp_var = 0.0
+        self._sp_n = 0  # spreads folded into the statistics
+
+    def update(self, ts_ms: int, bid: float, bid_size: float, ask: float, ask_size: float):
+        prev_bid = self.bid
+        prev_ask = self.ask
+        if prev_bid > 0 and prev_ask > 0:
+            spread = prev_ask - prev_bid
+            if not self._sp_n:
+                self._sp_mean = spread
+                self._sp_n = 1
+            else:
+                dt = ts_ms - self.ts_ms
+                if dt > 0:
+                    a = 1.0 - math.exp(-dt / self.tau_ms)
+                    d = spread - self._sp_mean
+                    self._sp_mean += a * d
+                    self._sp_var = (1.0 - a) * (self._sp_var + a * d * d)
+                    self._sp_n += 1
+        self.ts_ms = ts_ms
+        self.bid = bid
+        self.ask = ask
+        self.bid_size = bid_size
+        self.ask_size = ask_size
+        self.quotes += 1
+
+    @property
+    def spread(self) -> Optional[float]:
+        return self.ask - self.bid if self.bid > 0 and self.ask > 0 else None
+
+    @property
+    def mid(self) -> Optional[float]:
+        return (self.ask + self.bid) / 2 if self.bid > 0 and self.ask > 0 else None
+
+    def message(self, window_s: int) -> Dict:
+        """The "book" message broadcast for this symbol."""
+        mid = self.mid
+        spread = self.spread
+        return {
+            "type": "book",
+            "symbol": self.symbol,
+            "time": self.ts_ms,
+            "bid": self.bid,
+            "bid_size": self.bid_size,
+            "ask": self.ask,
+            "ask_size": self.ask_size,
+            "mid": mid,
+            "spread": spread,
+            "spread_bps": spread / mid * 1e4 if mid else None,
+            "window_s": window_s,
+            "spread_avg": self._sp_mean if self._sp_n else None,
+            "spread_std": math.sqrt(self._sp_var) if self._sp_n > 1 else None,
+        }
+
+
 class Analyzer:
-    """Top-level helper to manage per-symbol buckets and compute metrics."""
-    def __init__(self, default_window_seconds: int = 60):
+    """Top-level helper to manage per-symbol buckets and compute metrics.
+
+    ``window_seconds`` and ``bar_seconds`` are the windows / bar timeframes maintained
+    for every symbol (the default window is always included); ``register`` adds more
+    for individual symbols. All windows of a symbol share one SymbolTicks buffer, and
+    the last ``bar_history`` finished bars per timeframe are kept for get_recent_bars.
+
+    Memory is bounded by ``sweep``, called on a timer: it expires ticks of symbols
+    that stopped trading, drops windows created by a metric query for a window size
+    nobody has asked for in ``query_window_ttl_s``, evicts symbols idle for
+    ``idle_ttl_s`` of feed time and, while the estimated total exceeds ``max_bytes``,
+    the least recently traded symbols (0 disables either limit). An evicted symbol
+    starts over with the default windows and bars on its next tick.
+
+    Metrics messages carry the default window's min/max and median plus the price
+    quantiles listed in ``quantiles``.
+    """
+    def __init__(
+        self,
+        default_window_seconds: int = 60,
+        window_seconds: Iterable[int] = (),
+        bar_seconds: Iterable[int] = (1, 60),
+        bar_history: int = 1000,
+        idle_ttl_s: float = 0.0,
+        max_bytes: int = 0,
+        query_window_ttl_s: float = 300.0,
+        quantiles: Iterable[float] = (),
+        order_stats: bool = False,
+    ):
         self.default_window_seconds = default_window_seconds
-        self.windows: Dict[str, TickWindow] = {}
+        self.quantiles: Tuple[float, ...] = tuple(sorted(set(float(q) for q in quantiles)))
+        # metrics messages carry min/max/median for every symbol (quantiles imply it);
+        # otherwise only for windows whose order statistics were already requested
+        self.order_stats = bool(order_stats) or bool(self.quantiles)
+        self.bar_history = bar_history
+        self.idle_ttl_s = idle_ttl_s
+        self.max_bytes = int(max_bytes)
+        self.query_window_ttl_s = query_window_ttl_s
+        self.window_seconds: Tuple[int, ...] = tuple(sorted(set(window_seconds) | {default_window_seconds}))
+        self.bar_seconds: Tuple[int, ...] = tuple(sorted(set(bar_seconds)))
+        self.symbols: Dict[str, SymbolTicks] = {}
+        self.windows: Dict[Tuple[str, int], TickWindow] = {}
         self.buckets: Dict[Tuple[str, int], BarAggregator] = {}
-        # optional: maintain last EMA per symbol/window
-        self._last_ema: Dict[Tuple[str, int], float] = {}
-
-    def _get_window(self, symbol: str, window_seconds: int) -> TickWindow:
-        key = f"{symbol}:{window_seconds}"
-        if key not in self.windows:
-            self.windows[key] = TickWindow(window_seconds)
-        return self.windows[key]
-
-    def add_tick(self, symbol: str, ts_ms: int, price: float, size: float = 1.0):
-        """Call for each incoming tick."""
-        # default window
-        w = self._get_window(symbol, self.default_window_seconds)
-        w.add(ts_ms, price, size)
-        # update any bar aggregators for this symbol
-        # common bar sizes: 1s, 60s
-        for bar_sec in (1, 60):
-            key = (symbol, bar_sec)
-            if key not in self.buckets:
-                self.buckets[key] = BarAggregator(bar_sec)
-            finished = self.buckets[key].add_tick(ts_ms, price, size)
-            if finished:
-                # you can store finished bars or compute indicators that need bars
-                pass
+        # top of book per quoted symbol; spread statistics decay over the default window
+        self.books: Dict[str, QuoteBook] = {}
+        # windows added by a metric query for an unconfigured size -> last read (monotonic s)
+        self._query_windows: Dict[Tuple[str, int], TickWindow] = {}
+        self._query_reads: Dict[Tuple[str, int], float] = {}
+        self.evicted = 0
+
+    def register(
+        self,
+        symbol: str,
+        window_seconds: Iterable[int] = (),
+        bar_seconds: Iterable[int] = (),
+    ) -> SymbolTicks:
+        """Maintain extra windows / bar timeframes for one symbol (on top of the defaults)."""
+        st = self._get_symbol(symbol)
+        for ws in window_seconds:
+            self.windows[(st.symbol, ws)] = st.add_window(ws)
+            self._query_windows.pop((st.symbol, ws), None)
+            self._query_reads.pop((st.symbol, ws), None)
+        for bs in bar_seconds:
+            st.add_bar(bs)
+        for bs, agg in st.bars.items():
+            self.buckets[(st.symbol, bs)] = agg
+        return st
+
+    def _get_symbol(self, symbol: str) -> SymbolTicks:
+        st = self.symbols.get(symbol)
+        if st is None:
+            symbol = sys.intern(symbol)
+            st = self.symbols[symbol] = SymbolTicks(
+                symbol, self.window_seconds, self.bar_seconds, history_size=self.bar_history
+            )
+            for ws, w in st.windows.items():
+                self.windows[(symbol, ws)] = w
+            for bs, agg in st.bars.items():
+                self.buckets[(symbol, bs)] = agg
+        return st
+
+    def _get_window(self, symbol: str, window_seconds: int) -> Optional[TickWindow]:
+        """Window for (symbol, seconds); an unregistered window is added and seeded from the
+        buffer, and dropped by ``sweep`` once it goes unread for ``query_window_ttl_s``."""
+        key = (symbol, window_seconds)
+        w = self.windows.get(key)
+        if w is None:
+            w = self._query_windows.get(key)
+            if w is None:
+                st = self.symbols.get(symbol)
+                if st is None:
+                    return None
+                w = self._query_windows[key] = st.add_window(window_seconds)
+            self._query_reads[key] = time.monotonic()
+        return w
+
+    def add_tick(self, symbol: str, ts_ms: int, price: float, size: float = 1.0) -> List[Dict]:
+        """Call for each incoming tick. Returns bars finished by this tick (usually empty)."""
+        st = self.symbols.get(symbol)
+        if st is None:
+            st = self._get_symbol(symbol)
+        return st.add_tick(ts_ms, price, size)
+
+    def add_ticks(
+        self,
+        symbols,
+        ts_ms,
+        prices,
+        sizes=None,
+        collect: bool = True,
+    ) -> List[Dict]:
+        """Bulk ingest of a mixed-symbol batch (replay, catch-up after a reconnect).
+
+        ``symbols`` is one symbol for the whole batch or one per tick; the other columns
+        are NumPy arrays or sequences (``sizes`` defaults to 1). Ticks are grouped by
+        symbol with a stable sort, so each symbol's ticks keep their order and must be
+        time-ordered, then each group goes through SymbolTicks.add_ticks in vectorized
+        passes. Returns the finished bars (per symbol: 1s bars first, then each rollup)
+        when ``collect`` is set.
+        """
+        ts_ms = np.asarray(ts_ms, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        sizes = np.ones(len(prices)) if sizes is None else np.asarray(sizes, dtype=np.float64)
+        if not len(ts_ms):
+            return []
+        if isinstance(symbols, str):
+            return self.register(symbols).add_ticks(ts_ms, prices, sizes, collect)
+        names, inverse = np.unique(np.asarray(symbols), return_inverse=True)
+        if len(names) == 1:
+            return self.register(str(names[0])).add_ticks(ts_ms, prices, sizes, collect)
+        order = np.argsort(inverse, kind="stable")
+        ends = np.cumsum(np.bincount(inverse, minlength=len(names))).tolist()
+        finished_bars: List[Dict] = []
+        start = 0
+        for name, end in zip(names.tolist(), ends):
+            idx = order[start:end]
+            start = end
+            st = self.symbols.get(name)
+            if st is None:
+                st = self._get_symbol(name)
+            finished_bars.extend(st.add_ticks(ts_ms[idx], prices[idx], sizes[idx], collect))
+        return finished_bars
 
     def vwap(self, symbol: str, window_seconds: Optional[int] = None) -> Optional[float]:
-        ws = window_seconds or self.default_window_seconds
-        return self._get_window(symbol, ws).vwap()
+        w = self._get_window(symbol, window_seconds or self.default_window_seconds)
+        return w.vwap() if w is not None else None
 
     def sma(self, symbol: str, window_seconds: Optional[int] = None) -> Optional[float]:
-        ws = window_seconds or self.default_window_seconds
-        return self._get_window(symbol, ws).sma()
+        w = self._get_window(symbol, window_seconds or self.default_window_seconds)
+        return w.sma() if w is not None else None
 
     def std(self, symbol: str, window_seconds: Optional[int] = None) -> Optional[float]:
-        ws = window_seconds or self.default_window_seconds
-        return self._get_window(symbol, ws).std()
+        w = self._get_window(symbol, window_seconds or self.default_window_seconds)
+        return w.std() if w is not None else None
 
     def ema(self, symbol: str, span: int = 20, window_seconds: Optional[int] = None) -> Optional[float]:
-        """Simple EMA computed over available window prices; maintains last value for efficiency."""
-        ws = window_seconds or self.default_window_seconds
-        window = self._get_window(symbol, ws)
-        ps = window.prices()
-        if not ps:
-            return None
-        alpha = 2 / (span + 1)
-        key = (symbol, span)
-        last = self._last_ema.get(key)
-        if last is None:
-            # seed with SMA
-            last = statistics.mean(ps)
-        # compute EMA by iterating through prices (cheap if window small)
-        for p in ps:
-            last = alpha * p + (1 - alpha) * last
-        self._last_ema[key] = last
-        return last
+        """Per-tick EMA; seeded from the window SMA on first request, then updated on each tick."""
+        w = self._get_window(symbol, window_seconds or self.default_window_seconds)
+        return w.ema(span) if w is not None else None
+
+    def min(self, symbol: str, window_seconds: Optional[int] = None) -> Optional[float]:
+        w = self._get_window(symbol, window_seconds or self.default_window_seconds)
+        return w.min() if w is not None else None
+
+    def max(self, symbol: str, window_seconds: Optional[int] = None) -> Optional[float]:
+        w = self._get_window(symbol, window_seconds or self.default_window_seconds)
+        return w.max() if w is not None else None
+
+    def quantile(self, symbol: str, q: float, window_seconds: Optional[int] = None) -> Optional[float]:
+        """Rolling price quantile (0.5 = median) over the window."""
+        w = self._get_window(symbol, window_seconds or self.default_window_seconds)
+        return w.quantile(q) if w is not None else None
+
+    def median(self, symbol: str, window_seconds: Optional[int] = None) -> Optional[float]:
+        return self.quantile(symbol, 0.5, window_seconds)
 
     def volatility(self, symbol: str, window_seconds: Optional[int] = None) -> Optional[float]:
         """Return simple volatility = std(log returns) annualized approx (assuming seconds -> trading seconds per year)."""
         ws = window_seconds or self.default_window_seconds
-        lr = self._get_window(symbol, ws).log_returns()
-        if not lr:
+        w = self._get_window(symbol, ws)
+        sigma = w.log_return_std() if w is not None else None
+        if sigma is None:
             return None
-        sigma = statistics.pstdev(lr)
         # annualize: sqrt(N) where N ~ trading seconds/year / window_seconds
         # approximate trading seconds per year ~ 252 * 6.5 * 3600 = 589,680
         seconds_per_year = 252 * 6.5 * 3600
         factor = math.sqrt(seconds_per_year / ws)
         return sigma * factor
 
+    def snapshot(self, symbol: str) -> Dict:
+        """The "metrics" message broadcast for a symbol (default window).
+
+        ``min``/``max``/``median`` are included only with ``order_stats`` (or
+        ``quantiles``) or once the window tracks them, so plain metrics never switch
+        on per-tick order-statistic upkeep.
+        """
+        msg = {
+            "type": "metrics",
+            "symbol": symbol,
+            "window_s": self.default_window_seconds,
+            "vwap": self.vwap(symbol),
+            "sma": self.sma(symbol),
+            "ema20": self.ema(symbol, span=20),
+            "std": self.std(symbol),
+        }
+        if not self.order_stats:
+            w = self._get_window(symbol, self.default_window_seconds)
+            if w is None or not w.tracks_order_stats:
+                return msg
+        msg["min"] = self.min(symbol)
+        msg["max"] = self.max(symbol)
+        msg["median"] = self.median(symbol)
+        if self.quantiles:
+            msg["quantiles"] = {f"{q:g}": self.quantile(symbol, q) for q in self.quantiles}
+        return msg
+
+    def snapshots(self, symbols: Iterable[str]) -> List[Dict]:
+        """``snapshot`` for each known symbol, in one call (the metrics scheduler's pass)."""
+        known = self.symbols
+        return [self.snapshot(s) for s in symbols if s in known]
+
+    def add_quote(self, symbol: str, ts_ms: int, bid: float, bid_size: float, ask: float, ask_size: float):
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = QuoteBook(symbol, self.default_window_seconds * 1000)
+        book.update(ts_ms, bid, bid_size, ask, ask_size)
+
+    def book(self, symbol: str) -> Optional[Dict]:
+        """The "book" message for a symbol (None if it has no quotes)."""
+        book = self.books.get(symbol)
+        return None if book is None else book.message(self.default_window_seconds)
+
+    def book_messages(self, symbols: Iterable[str]) -> List[Dict]:
+        """``book`` for each quoted symbol, in one call (the book scheduler's pass)."""
+        books = self.books
+        window_s = self.default_window_seconds
+        return [books[s].message(window_s) for s in symbols if s in books]
+
+    def evict(self, symbol: str) -> bool:
+        """Forget everything held for a symbol; False if nothing was."""
+        st = self.symbols.pop(symbol, None)
+        book = self.books.pop(symbol, None)
+        if st is None:
+            return book is not None
+        for ws in st.windows:
+            self.windows.pop((symbol, ws), None)
+            self._query_windows.pop((symbol, ws), None)
+            self._query_reads.pop((symbol, ws), None)
+        for bs in st.bars:
+            self.buckets.pop((symbol, bs), None)
+        return True
+
+    def clock_ms(self) -> int:
+        """Feed time: the newest tick or quote timestamp over all symbols."""
+        return max(
+            max((st.last_ms for st in self.symbols.values()), default=0),
+            max((book.ts_ms for book in self.books.values()), default=0),
+        )
+
+    def sweep(self, now_ms: Optional[int] = None, keep: Iterable[str] = ()) -> List[str]:
+        """Bound memory (see class docstring); returns the evicted symbols.
+
+        Idleness is measured in feed time (``now_ms`` defaults to ``clock_ms()``), so
+        a replay of old ticks or a closed market evicts nothing by age. Symbols in
+        ``keep`` (e.g. ones clients are subscribed to) are never evicted for idleness
+        and are the last to go when over budget.
+        """
+        now_ms = self.clock_ms() if now_ms is None else now_ms
+        keep = keep if isinstance(keep, (set, frozenset, dict)) else set(keep)
+        evicted: List[str] = []
+        if self.idle_ttl_s > 0:
+            cutoff = now_ms - self.idle_ttl_s * 1000
+            for symbol, st in list(self.symbols.items()):
+                book = self.books.get(symbol)
+                last = st.last_ms if book is None else max(st.last_ms, book.ts_ms)
+                if last < cutoff and symbol not in keep and self.evict(symbol):
+                    evicted.append(symbol)
+            for symbol, book in list(self.books.items()):
+                if book.ts_ms < cutoff and symbol not in keep and self.evict(symbol):
+                    evicted.append(symbol)
+
+        if self._query_reads:
+            stale = time.monotonic() - self.query_window_ttl_s
+            for key, read in list(self._query_reads.items()):
+                if read < stale:
+                    del self._query_reads[key]
+                    del self._query_windows[key]
+                    st = self.symbols.get(key[0])
+                    if st is not None:
+                        st.remove_window(key[1])
+
+        for st in self.symbols.values():
+            # a symbol's windows are current as of its last tick; empty buffers have nothing to expire
+            if st.last_ms < now_ms and st.buffer:
+                st.prune(now_ms)
+
+        if self.max_bytes > 0:
+            sizes = {symbol: self.symbol_nbytes(symbol) for symbol in set(self.symbols) | set(self.books)}
+            total = sum(sizes.values())
+            if total > self.max_bytes:
+                def age(symbol: str):
+                    st = self.symbols.get(symbol)
+                    book = self.books.get(symbol)
+                    last = max(st.last_ms if st is not None else 0, book.ts_ms if book is not None else 0)
+                    return symbol in keep, last
+                for symbol in sorted(sizes, key=age):
+                    if total <= self.max_bytes:
+                        break
+                    self.evict(symbol)
+                    evicted.append(symbol)
+                    total -= sizes[symbol]
+        self.evicted += len(evicted)
+        return evicted
+
+    def symbol_nbytes(self, symbol: str) -> int:
+        """Approximate bytes held for one symbol (ticks, bars, windows, top of book)."""
+        st = self.symbols.get(symbol)
+        n = st.nbytes() if st is not None else 0
+        if symbol in self.books:
+            n += _BOOK_OVERHEAD
+        return n
+
+    def memory(self, limit: int = 20) -> Dict:
+        """Memory accounting: estimated total, symbol count and the ``limit`` largest symbols."""
+        sizes = [(symbol, self.symbol_nbytes(symbol)) for symbol in set(self.symbols) | set(self.books)]
+        sizes.sort(key=lambda item: item[1], reverse=True)
+        return {
+            "bytes": sum(n for _, n in sizes),
+            "symbols": len(sizes),
+            "query_windows": len(self._query_windows),
+            "evicted": self.evicted,
+            "top": [{"symbol": symbol, "bytes": n} for symbol, n in sizes[:max(0, limit)]],
+        }
+
     def get_recent_bars(self, symbol: str, bar_seconds: int = 60, limit: int = 100) -> List[Dict]:
-        """Return last N finished bars if you stored them — placeholder to show API shape."""
-        # For a full implementation you'd persist finished bars; this stub returns empty list.
-        return []
+        """Return the last N finished bars (oldest first) from the bounded bar history."""
+        st = self.symbols.get(symbol)
+        if st is None:
+            return []
+        return st.recent_bars(bar_seconds, limit)
+
+    def recent_state(self, bars_limit: int = 100) -> List[Dict]:
+        """Every symbol's last ``bars_limit`` bars per timeframe and its metrics message
+        (seeds late-join snapshots after a journal replay)."""
+        out: List[Dict] = []
+        for symbol, st in self.symbols.items():
+            if bars_limit > 0:
+                for bar_s in sorted(st.history):
+                    out.extend(
+                        dict(bar, type="bar", symbol=symbol, bar_s=bar_s)
+                        for bar in st.recent_bars(bar_s, bars_limit)
+                    )
+            out.append(self.snapshot(symbol))
+        return out
 
 
 
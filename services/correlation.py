@@ -0,0 +1,199 @@
+"""Rolling cross-symbol covariance, correlation and beta-to-benchmark for a basket.
+
+``CorrelationMatrix.add_bar`` takes finished 1s bars (the BarAggregator output the
+server already broadcasts). Their closes are aligned on a 1s grid: a second is
+committed once the newest bar is ``lag_s`` seconds past it, using each symbol's last
+close so far (a symbol that did not trade in a second keeps its price, i.e. a zero
+return). Seconds in which no basket symbol traded are skipped, so closed-market gaps
+do not dilute the statistics with zero rows. A bar arriving after its second was
+committed moves the symbol's price into the next committed second.
+
+Each committed second is a row of log returns. The last ``window`` rows are kept in a
+ring and summarized by running sums S1 = sum(r) and S2 = sum(r r^T), updated with
+one rank-one NumPy update per row entering and leaving (O(n^2) per second rather than
+O(n^2 * window)); every ``window`` rows the sums are recomputed exactly from the ring
+so floating point error cannot accumulate. Covariances are population covariances,
+like TickWindow.std.
+"""
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# signs of the row entering and the row leaving the window
+_ADD_REMOVE = np.array([1.0, -1.0])
+
+
+class CorrelationMatrix:
+    """Rolling return statistics for ``symbols`` over the last ``window`` grid seconds.
+
+    ``benchmark`` (added to the basket if missing) is the symbol betas are measured
+    against. Must be used from one thread (the event loop).
+    """
+
+    def __init__(self, symbols: Iterable[str], benchmark: Optional[str] = None, window: int = 300, lag_s: int = 2):
+        names = list(dict.fromkeys(symbols))
+        if benchmark and benchmark not in names:
+            names.append(benchmark)
+        self.symbols: List[str] = names
+        self.benchmark = benchmark
+        self.window = max(2, int(window))
+        self.lag_s = max(0, int(lag_s))
+        self._index: Dict[str, int] = {s: i for i, s in enumerate(names)}
+        n = len(names)
+        # last close per symbol as of the last committed second (NaN = no price yet)
+        self._prices = np.full(n, np.nan)
+        # second -> {symbol index: close} for seconds not committed yet
+        self._staged: Dict[int, Dict[int, float]] = {}
+        # closes of bars whose second was already committed, applied to the next row
+        self._late: Dict[int, float] = {}
+        self._clock = 0  # newest bar second seen
+        self.committed_s = 0  # last committed grid second
+        self._rows = np.zeros((self.window, n))
+        self._pos = 0
+        self._count = 0
+        self._since_resync = 0
+        self._s1 = np.zeros(n)
+        self._s2 = np.zeros((n, n))
+        self.rows = 0  # rows committed since start (the message version)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+
+    @property
+    def samples(self) -> int:
+        return self._count
+
+    def add_bar(self, bar: Dict) -> int:
+        """Feed one finished 1s bar; returns the number of grid seconds it committed."""
+        i = self._index.get(bar.get("symbol"))
+        if i is None or bar.get("bar_s", 1) != 1:
+            return 0
+        t = int(bar["time"])
+        close = float(bar["close"])
+        if t <= self.committed_s:
+            self._late[i] = close
+        else:
+            staged = self._staged.get(t)
+            if staged is None:
+                staged = self._staged[t] = {}
+            staged[i] = close
+        if t > self._clock:
+            self._clock = t
+        return self.advance(self._clock - self.lag_s)
+
+    def advance(self, until_s: int) -> int:
+        """Commit every staged second up to ``until_s`` (inclusive)."""
+        committed = 0
+        while self._staged:
+            t = min(self._staged)
+            if t > until_s:
+                break
+            closes = self._staged.pop(t)
+            if self._late:
+                late, self._late = self._late, {}
+                late.update(closes)
+                closes = late
+            self._commit(t, closes)
+            committed += 1
+        return committed
+
+    def _commit(self, t: int, closes: Dict[int, float]):
+        prev = self._prices
+        cur = prev.copy()
+        idx = np.fromiter(closes.keys(), dtype=np.intp, count=len(closes))
+        cur[idx] = np.fromiter(closes.values(), dtype=np.float64, count=len(closes))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = np.log(cur / prev)
+        # first price, or a non-positive one: no return yet
+        r[~np.isfinite(r)] = 0.0
+        self._prices = cur
+        self.committed_s = t
+        self._add_row(r)
+
+    def _add_row(self, r: np.ndarray):
+        rows = self._rows
+        if self._count == self.window:
+            old = rows[self._pos]
+            self._s1 += r - old
+            # r r^T - old old^T as one rank-2 product
+            pair = np.stack((r, old))
+            self._s2 += (pair.T * _ADD_REMOVE) @ pair
+        else:
+            self._count += 1
+            self._s1 += r
+            self._s2 += np.outer(r, r)
+        rows[self._pos] = r
+        self._pos = (self._pos + 1) % self.window
+        self.rows += 1
+        self._since_resync += 1
+        if self._since_resync >= self.window:
+            self.resync()
+
+    def resync(self):
+        """Recompute the running sums exactly from the retained rows."""
+        live = self._rows[: self._count]
+        self._s1 = live.sum(axis=0)
+        self._s2 = live.T @ live
+        self._since_resync = 0
+
+    def returns(self) -> np.ndarray:
+        """The retained return rows, oldest first (count x symbols)."""
+        if self._count < self.window:
+            return self._rows[: self._count].copy()
+        return np.roll(self._rows, -self._pos, axis=0)
+
+    def covariance(self) -> Optional[np.ndarray]:
+        k = self._count
+        if k < 2:
+            return None
+        mean = self._s1 / k
+        return self._s2 / k - np.outer(mean, mean)
+
+    def correlation(self) -> Optional[np.ndarray]:
+        cov = self.covariance()
+        if cov is None:
+            return None
+        sd = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = cov / np.outer(sd, sd)
+        corr[~np.isfinite(corr)] = np.nan  # a symbol that never moved has no correlation
+        np.clip(corr, -1.0, 1.0, out=corr)
+        np.fill_diagonal(corr, np.where(sd > 0, 1.0, np.nan))
+        return corr
+
+    def beta(self) -> Optional[np.ndarray]:
+        """Each symbol's beta to the benchmark: cov(symbol, benchmark) / var(benchmark)."""
+        cov = self.covariance()
+        if cov is None or self.benchmark is None:
+            return None
+        b = self._index[self.benchmark]
+        var = cov[b, b]
+        if var <= 0:
+            return np.full(len(self.symbols), np.nan)
+        return cov[:, b] / var
+
+    def message(self, digits: int = 4) -> Dict:
+        """The "correlation" message broadcast on the metrics cadence (NaN = null)."""
+
+        def cells(a: Optional[np.ndarray], digits: int = digits):
+            if a is None:
+                return None
+            out = np.round(a, digits).astype(object)
+            out[np.isnan(a)] = None
+            return out.tolist()
+
+        cov = self.covariance()
+        return {
+            "type": "correlation",
+            "symbols": self.symbols,
+            "benchmark": self.benchmark,
+            "window_s": self.window,
+            "samples": self._count,
+            "time": self.committed_s,
+            "version": self.rows,
+            # n x n, rows and columns in ``symbols`` order
+            "corr": cells(self.correlation()),
+            "beta": cells(self.beta()),
+            # std of 1s log returns per symbol
+            "return_std": cells(None if cov is None else np.sqrt(np.clip(np.diag(cov), 0.0, None)), 8),
+        }
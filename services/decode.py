@@ -0,0 +1,222 @@
+"""Decoding of upstream Alpaca frames.
+
+Trade frames are decoded straight into ``Trade`` records (symbol, price, size and the
+timestamp parsed to epoch nanoseconds); exchange, conditions, tape and trade id are
+never materialized. Quotes likewise become ``Quote`` records (bid/ask price and size).
+With msgspec installed a schema-typed decoder does this in one pass for frames of
+trades and quotes; otherwise frames go through json.loads and the dicts are converted.
+Every other message (auth, subscription, errors, bars) stays a plain dict.
+"""
+import json
+from typing import Any, Dict, List, Optional, Union
+
+try:
+    import msgspec
+except ImportError:  # optional; the json fallback produces the same records
+    msgspec = None
+
+_DAYS_BEFORE_MONTH = (0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334)
+# last ("YYYY-MM-DDTHH:MM:SS", epoch seconds); one immutable tuple, swapped in a single
+# assignment, so threads parsing concurrently never see one's prefix with another's seconds
+_prefix_cache = ("", 0)
+
+
+def _epoch_days(y: int, m: int, d: int) -> int:
+    """Days since 1970-01-01 for a proleptic Gregorian date."""
+    leap = y % 4 == 0 and (y % 100 != 0 or y % 400 == 0)
+    yb = y - 1
+    days = 365 * yb + yb // 4 - yb // 100 + yb // 400 - 719162  # days before Jan 1 of y
+    return days + _DAYS_BEFORE_MONTH[m] + (1 if leap and m > 2 else 0) + d - 1
+
+
+def parse_rfc3339_ns(s: str) -> Optional[int]:
+    """Epoch nanoseconds from an RFC3339 timestamp such as 2024-01-02T14:30:00.123456789Z.
+
+    Keeps all nine fractional digits (datetime stops at microseconds) and allocates no
+    datetime objects; the date/time prefix is cached, so trades within the same second
+    only parse their fraction. Returns None for anything it does not recognise.
+    """
+    n = len(s)
+    if n < 20:
+        return None
+    last = s[-1]
+    if last == "Z" or last == "z":
+        end = n - 1
+        offset = 0
+    elif s[-6] in "+-" and s[-3] == ":":
+        end = n - 6
+        hh, mm = s[-5:-3], s[-2:]
+        if not (hh.isdigit() and mm.isdigit()):
+            return None
+        offset = int(hh) * 3600 + int(mm) * 60
+        if s[-6] == "-":
+            offset = -offset
+    else:
+        return None
+    global _prefix_cache
+    prefix = s[:19]
+    cached, sec = _prefix_cache
+    if prefix != cached:
+        if s[4] != "-" or s[7] != "-" or s[10] not in "Tt " or s[13] != ":" or s[16] != ":":
+            return None
+        parts = (s[0:4], s[5:7], s[8:10], s[11:13], s[14:16], s[17:19])
+        if not all(p.isdigit() for p in parts):
+            return None
+        y, mo, d, h, mi, se = map(int, parts)
+        if not (1 <= mo <= 12 and 1 <= d <= 31 and h < 24 and mi < 60 and se < 61):
+            return None
+        sec = _epoch_days(y, mo, d) * 86400 + h * 3600 + mi * 60 + se
+        _prefix_cache = (prefix, sec)
+    frac = 0
+    if end > 19:
+        digits = s[20:end]
+        if s[19] != "." or not digits.isdigit():
+            return None
+        frac = int(digits[:9]) * 10 ** (9 - len(digits)) if len(digits) < 9 else int(digits[:9])
+    elif end != 19:
+        return None
+    return (sec - offset) * 1_000_000_000 + frac
+
+
+if msgspec is not None:
+
+    class Trade(
+        msgspec.Struct,
+        tag_field="T",
+        tag="t",
+        gc=False,
+        rename={"symbol": "S", "price": "p", "size": "s", "timestamp": "t", "gen_ns": "_gen_ns"},
+    ):
+        """One trade; only the fields the pipeline uses are decoded."""
+
+        symbol: str
+        price: float
+        timestamp: str
+        size: float = 1.0
+        gen_ns: int = 0  # simulator send stamp, kept for latency benchmarks
+        ts_ns: int = 0  # parsed ``timestamp``; 0 if unparseable
+        rx_ns: int = 0  # receive time, set by the streamer when metrics are on
+
+        def __post_init__(self):
+            self.ts_ns = parse_rfc3339_ns(self.timestamp) or 0
+
+    class Quote(
+        msgspec.Struct,
+        tag_field="T",
+        tag="q",
+        gc=False,
+        rename={"symbol": "S", "bid": "bp", "bid_size": "bs", "ask": "ap", "ask_size": "as", "timestamp": "t"},
+    ):
+        """Top-of-book quote; exchanges, conditions and tape are not decoded."""
+
+        symbol: str
+        bid: float
+        ask: float
+        timestamp: str
+        bid_size: float = 0.0
+        ask_size: float = 0.0
+        ts_ns: int = 0
+        rx_ns: int = 0
+
+        def __post_init__(self):
+            self.ts_ns = parse_rfc3339_ns(self.timestamp) or 0
+
+    _trade_frame = msgspec.json.Decoder(List[Union[Trade, Quote]])
+
+else:
+
+    class Trade:
+        """One trade; only the fields the pipeline uses are decoded."""
+
+        __slots__ = ("symbol", "price", "timestamp", "size", "gen_ns", "ts_ns", "rx_ns")
+
+        def __init__(self, symbol: str, price: float, timestamp: str, size: float = 1.0, gen_ns: int = 0):
+            self.symbol = symbol
+            self.price = price
+            self.timestamp = timestamp
+            self.size = size
+            self.gen_ns = gen_ns
+            self.ts_ns = parse_rfc3339_ns(timestamp) or 0
+            self.rx_ns = 0
+
+
+    class Quote:
+        """Top-of-book quote; exchanges, conditions and tape are not decoded."""
+
+        __slots__ = ("symbol", "bid", "ask", "timestamp", "bid_size", "ask_size", "ts_ns", "rx_ns")
+
+        def __init__(self, symbol: str, bid: float, ask: float, timestamp: str, bid_size: float = 0.0,
+                     ask_size: float = 0.0):
+            self.symbol = symbol
+            self.bid = bid
+            self.ask = ask
+            self.timestamp = timestamp
+            self.bid_size = bid_size
+            self.ask_size = ask_size
+            self.ts_ns = parse_rfc3339_ns(timestamp) or 0
+            self.rx_ns = 0
+
+
+def _trade_from_dict(item: Dict) -> Union["Trade", Dict]:
+    t = item.get("t")
+    if not isinstance(t, str):
+        return item  # epoch timestamps etc.: leave to the generic path
+    try:
+        return Trade(
+            str(item["S"]),
+            float(item["p"]),
+            t,
+            float(item["s"]) if item.get("s") is not None else 1.0,
+            int(item.get("_gen_ns") or 0),
+        )
+    except (KeyError, TypeError, ValueError):
+        return item
+
+
+def _quote_from_dict(item: Dict) -> Union["Quote", Dict]:
+    t = item.get("t")
+    if not isinstance(t, str):
+        return item
+    try:
+        return Quote(
+            str(item["S"]),
+            float(item["bp"]),
+            float(item["ap"]),
+            t,
+            float(item.get("bs") or 0.0),
+            float(item.get("as") or 0.0),
+        )
+    except (KeyError, TypeError, ValueError):
+        return item
+
+
+def decode_frame(raw: Union[str, bytes]) -> List[Any]:
+    """Decode one upstream frame into a list of Trade / Quote records and dicts.
+
+    Raises ValueError (or msgspec.DecodeError) on malformed JSON.
+    """
+    if msgspec is not None:
+        try:
+            return _trade_frame.decode(raw)
+        except msgspec.ValidationError:
+            pass  # not a trades/quotes-only frame (control messages): generic path
+    data = json.loads(raw)
+    items = data if isinstance(data, list) else [data]
+    out = []
+    for it in items:
+        if isinstance(it, dict):
+            kind = it.get("T")
+            if kind == "t":
+                it = _trade_from_dict(it)
+            elif kind == "q":
+                it = _quote_from_dict(it)
+        out.append(it)
+    return out
+
+
+def trade_to_dict(trade: "Trade") -> Dict:
+    """Wire form forwarded to browser clients (same keys as Alpaca's trade message)."""
+    out = {"T": "t", "S": trade.symbol, "p": trade.price, "s": trade.size, "t": trade.timestamp}
+    if trade.gen_ns:
+        out["_gen_ns"] = trade.gen_ns
+    return out
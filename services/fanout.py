@@ -0,0 +1,393 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from services.decode import Trade, trade_to_dict
+from services.metrics import PipelineMetrics
+from services import wire
+
+# Overflow policies for a client's outbound queue
+DROP_OLDEST = "drop_oldest"   # evict the oldest frame when full
+CONFLATE = "conflate"         # keep only the latest keyed frame (tick or tick batch/metrics per symbol); evict oldest when full
+DISCONNECT = "disconnect"     # close the client once its queue is full (maxsize frames behind)
+POLICIES = (DROP_OLDEST, CONFLATE, DISCONNECT)
+
+# subscribing to this topic receives every symbol
+WILDCARD = "*"
+
+# (conflation key or None, payload): Message carries a dict. Frame is (topic, key, text,
+# binary wire encoding or None while no binary clients are connected); topic is the
+# symbol it concerns, or None for messages every client gets (upstream control etc.)
+Message = Tuple[Optional[Hashable], Any]
+Frame = Tuple[Optional[str], Optional[Hashable], str, Optional[bytes]]
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, Trade):
+        return trade_to_dict(obj)
+    return str(obj)
+
+
+def dumps(obj: Any) -> str:
+    try:
+        return json.dumps(obj, default=_default)
+    except Exception:
+        return json.dumps({"_serialize_error": True, "raw": str(obj)})
+
+
+def topic_of(key: Optional[Hashable], msg: Any) -> Optional[str]:
+    """Symbol a message is routed by: its conflation key's symbol, else a bar's ``symbol``."""
+    if key is not None:
+        return key[1]
+    if isinstance(msg, dict):
+        return msg.get("symbol")
+    return None
+
+
+class ClientQueue:
+    """Bounded outbound queue for one websocket client, drained by its own writer task.
+
+    Producers call ``put`` (never blocks); ``run`` sends frames in order with ``send``.
+    Frames carry an optional conflation key, e.g. ("t", "AAPL"); under CONFLATE a new
+    frame replaces a still-queued frame with the same key in place if that frame is
+    still the newest one queued for its topic; otherwise the stale frame is dropped and
+    the new one appended, so a symbol's frames never overtake one produced earlier. ``binary`` clients
+    are given the bytes form of each frame (see services.wire) instead of the text.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Any], Awaitable],
+        maxsize: int = 1000,
+        policy: str = DROP_OLDEST,
+        close: Optional[Callable[[], Awaitable]] = None,
+        name: str = "",
+        metrics: Optional[PipelineMetrics] = None,
+        binary: bool = False,
+        metrics_interval_ms: float = 0,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown client queue policy: {policy}")
+        self._send = send
+        self._close = close
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.name = name
+        self.binary = binary
+        # per-client metrics cadence; 0 takes every scheduler emission
+        self.metrics_interval_ms = max(0.0, float(metrics_interval_ms))
+        self._metrics_sent: Dict[Hashable, float] = {}
+        self._metrics = metrics
+        # entries are [key, payload, enqueue perf_counter_ns or 0, topic]; _keyed points at the
+        # queued entry for each key, _newest at the last queued entry per topic (CONFLATE only)
+        self._buf: Deque[List] = deque()
+        self._keyed: Dict[Hashable, List] = {}
+        self._newest: Dict[str, List] = {}
+        self._wakeup = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.closed = False
+
+    @property
+    def depth(self) -> int:
+        return len(self._buf)
+
+    def put(self, payload: Any, key: Optional[Hashable] = None, topic: Optional[str] = None) -> bool:
+        """Enqueue a frame; returns False if it was rejected because the client is closed.
+
+        ``topic`` is the symbol the frame concerns (defaults to the key's symbol).
+        """
+        if self.closed:
+            return False
+        conflate = self.policy == CONFLATE
+        if conflate:
+            if topic is None and key is not None:
+                topic = key[1]
+            if key is not None:
+                entry = self._keyed.get(key)
+                if entry is not None:
+                    self.conflated += 1
+                    if self._newest.get(topic) is entry:
+                        entry[1] = payload
+                        return True
+                    # another frame of the topic is queued behind it: replacing in place
+                    # would deliver this frame ahead of that older one
+                    self._unlink(entry)
+                    for i, queued in enumerate(self._buf):
+                        if queued is entry:
+                            del self._buf[i]
+                            break
+        if len(self._buf) >= self.maxsize:
+            if self.policy == DISCONNECT:
+                self.closed = True
+                self._buf.clear()
+                self._keyed.clear()
+                self._newest.clear()
+                self._wakeup.set()
+                return False
+            self._unlink(self._buf.popleft())
+            self.dropped += 1
+        entry = [key, payload, time.perf_counter_ns() if self._metrics is not None else 0, topic]
+        self._buf.append(entry)
+        if conflate:
+            if key is not None:
+                self._keyed[key] = entry
+            if topic is not None:
+                self._newest[topic] = entry
+        self._wakeup.set()
+        return True
+
+    def _unlink(self, entry: List):
+        """Forget a frame leaving the queue from the conflation indexes."""
+        key, topic = entry[0], entry[3]
+        if key is not None and self._keyed.get(key) is entry:
+            del self._keyed[key]
+        if topic is not None and self._newest.get(topic) is entry:
+            del self._newest[topic]
+
+    def metrics_due(self, key: Hashable, now_ms: float) -> bool:
+        """Whether this client's own metrics interval for a frame key, e.g. ("metrics", "AAPL"),
+        has elapsed (marks it sent)."""
+        if self.metrics_interval_ms <= 0:
+            return True
+        if now_ms - self._metrics_sent.get(key, -1e18) >= self.metrics_interval_ms:
+            self._metrics_sent[key] = now_ms
+            return True
+        return False
+
+    def forget(self, symbol: str):
+        """Drop per-symbol cadence state (the symbol was evicted from the analyzer)."""
+        if self._metrics_sent:
+            self._metrics_sent.pop(("metrics", symbol), None)
+            self._metrics_sent.pop(("book", symbol), None)
+
+    async def run(self):
+        """Writer loop; returns when the queue is closed or the send fails."""
+        try:
+            while not self.closed:
+                if not self._buf:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                entry = self._buf.popleft()
+                self._unlink(entry)
+                metrics = self._metrics
+                if metrics is None:
+                    await self._send(entry[1])
+                else:
+                    t0 = time.perf_counter_ns()
+                    metrics.client_queue.record_ns(t0 - entry[2])
+                    await self._send(entry[1])
+                    metrics.send.record_ns(time.perf_counter_ns() - t0)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.closed = True
+        if self._close is not None:
+            try:
+                await self._close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict:
+        return {
+            "client": self.name,
+            "policy": self.policy,
+            "binary": self.binary,
+            "metrics_interval_ms": self.metrics_interval_ms,
+            "depth": self.depth,
+            "maxsize": self.maxsize,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "closed": self.closed,
+        }
+
+
+class TopicIndex:
+    """Symbol -> subscribed clients, with reference counts for the upstream subscription.
+
+    ``subscribe`` / ``unsubscribe`` / ``remove`` return the symbols whose first
+    subscriber arrived or last one left, i.e. what to (un)subscribe upstream. ``pin``
+    holds an upstream subscription without a client (the HTTP subscribe API). Must be
+    used from the event loop thread.
+    """
+
+    def __init__(self):
+        self._subs: Dict[str, Set[ClientQueue]] = {}
+        self._topics: Dict[ClientQueue, Set[str]] = {}
+        self._pins: Dict[str, int] = {}
+
+    def _refs(self, symbol: str) -> int:
+        return len(self._subs.get(symbol, ())) + self._pins.get(symbol, 0)
+
+    def subscribe(self, client: ClientQueue, symbols: Iterable[str]) -> List[str]:
+        added = []
+        mine = self._topics.setdefault(client, set())
+        for symbol in symbols:
+            if symbol in mine:
+                continue
+            if not self._refs(symbol):
+                added.append(symbol)
+            mine.add(symbol)
+            self._subs.setdefault(symbol, set()).add(client)
+        return added
+
+    def unsubscribe(self, client: ClientQueue, symbols: Iterable[str]) -> List[str]:
+        removed = []
+        mine = self._topics.get(client, set())
+        for symbol in symbols:
+            if symbol not in mine:
+                continue
+            mine.discard(symbol)
+            subs = self._subs[symbol]
+            subs.discard(client)
+            if not subs:
+                del self._subs[symbol]
+            if not self._refs(symbol):
+                removed.append(symbol)
+        return removed
+
+    def remove(self, client: ClientQueue) -> List[str]:
+        """Drop a disconnected client; returns the symbols nobody wants any more."""
+        removed = self.unsubscribe(client, list(self._topics.get(client, ())))
+        self._topics.pop(client, None)
+        return removed
+
+    def pin(self, symbol: str) -> bool:
+        """Hold ``symbol`` upstream; True if it was not subscribed upstream before."""
+        first = not self._refs(symbol)
+        self._pins[symbol] = self._pins.get(symbol, 0) + 1
+        return first
+
+    def unpin(self, symbol: str) -> bool:
+        """Release one pin; True if that was the last reference."""
+        n = self._pins.get(symbol, 0)
+        if not n:
+            return False
+        if n == 1:
+            del self._pins[symbol]
+        else:
+            self._pins[symbol] = n - 1
+        return not self._refs(symbol)
+
+    def topics(self, client: ClientQueue) -> List[str]:
+        return sorted(self._topics.get(client, ()))
+
+    @property
+    def symbols(self) -> List[str]:
+        """Every symbol that should be subscribed upstream."""
+        return sorted(set(self._subs) | set(self._pins))
+
+    def clients_for(self, topic: str) -> List[ClientQueue]:
+        subs = self._subs.get(topic)
+        everything = self._subs.get(WILDCARD)
+        if not everything:
+            return list(subs) if subs else []
+        if not subs:
+            return list(everything)
+        return list(subs | everything)
+
+
+class FrameBatcher:
+    """Coalesce messages produced within ``window_ms`` into one JSON array frame per topic.
+
+    Each topic's batch is serialized once and the same text is handed to ``publish``
+    for all of its clients. A batch holding nothing but the topic's ticks is keyed
+    ("t", topic) like a single tick, so under CONFLATE it replaces a still-queued
+    tick-only batch of the same symbol; batches with bars or control messages carry no
+    key and are never conflated. With ``window_ms <= 0`` every message is serialized and
+    published on its own (keeping its conflation key). While ``binary`` is set the batch is also encoded
+    once in the binary wire format for binary clients. Must be used from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[List[Frame]], None],
+        window_ms: float = 50,
+        max_items: int = 1000,
+        metrics: Optional[PipelineMetrics] = None,
+    ):
+        self._publish = publish
+        self._metrics = metrics
+        self.binary = False  # set by the owner while any binary client is connected
+        self._first_ns = 0
+        self.window_s = max(0.0, window_ms) / 1000.0
+        self.max_items = max(1, int(max_items))
+        self._pending: Dict[Optional[str], List[Any]] = {}
+        self._mixed: Set[Optional[str]] = set()  # pending topics with more than ticks
+        self._count = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+
+    def add(self, messages: List[Message]):
+        if not messages:
+            return
+        metrics = self._metrics
+        if self.window_s <= 0:
+            self._publish(self.serialize(messages))
+            return
+        if metrics is not None and not self._count:
+            self._first_ns = time.perf_counter_ns()
+        pending = self._pending
+        for key, msg in messages:
+            topic = topic_of(key, msg)
+            if key is None or key[0] != "t":
+                self._mixed.add(topic)
+            batch = pending.get(topic)
+            if batch is None:
+                pending[topic] = [msg]
+            else:
+                batch.append(msg)
+        self._count += len(messages)
+        if self._count >= self.max_items:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_event_loop().call_later(self.window_s, self.flush)
+
+    def serialize(self, messages: List[Message]) -> List[Frame]:
+        """One frame per message, keeping its conflation key (no batching window)."""
+        binary = self.binary
+        metrics = self._metrics
+        if metrics is None:
+            return [
+                (topic_of(key, msg), key, dumps(msg), wire.encode((msg,)) if binary else None)
+                for key, msg in messages
+            ]
+        frames = []
+        for key, msg in messages:
+            t0 = time.perf_counter_ns()
+            frames.append((topic_of(key, msg), key, dumps(msg), wire.encode((msg,)) if binary else None))
+            metrics.serialize.record_ns(time.perf_counter_ns() - t0)
+        return frames
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._count:
+            return
+        pending, self._pending, self._count = self._pending, {}, 0
+        mixed, self._mixed = self._mixed, set()
+        self.batches += 1
+        binary = self.binary
+        metrics = self._metrics
+        if metrics is None:
+            self._publish([
+                (topic, None if topic in mixed else ("t", topic), dumps(batch),
+                 wire.encode(batch) if binary else None)
+                for topic, batch in pending.items()
+            ])
+            return
+        metrics.batch.record_ns(time.perf_counter_ns() - self._first_ns)
+        frames = []
+        for topic, batch in pending.items():
+            t0 = time.perf_counter_ns()
+            key = None if topic in mixed else ("t", topic)
+            frames.append((topic, key, dumps(batch), wire.encode(batch) if binary else None))
+            metrics.serialize.record_ns(time.perf_counter_ns() - t0)
+        self._publish(frames)
@@ -0,0 +1,478 @@
+"""Single-ingest hub: one process ingests and analyzes, any number of web workers serve /ws.
+
+The hub owns the upstream connection, the analyzer and the batcher. Every frame it
+broadcasts is already serialized (JSON text, plus the binary wire encoding while
+any worker has binary clients), and ``HubServer.publish`` forwards those bytes to
+the workers subscribed to the frame's topic. A worker (``HubClient``) only hands
+them to its own client queues, so fan-out scales with worker processes while
+upstream stays one connection and serialization stays once per batch.
+
+Transport is a Unix domain socket (``/path/to/hub.sock`` or ``unix:/path``) or
+loopback TCP (``tcp://127.0.0.1:8766``, e.g. on Windows). Each message is a 5-byte
+header, the u32 body length and a u8 type, followed by the body:
+
+    FRAMES  (hub -> worker)  u32 request id (0 = live broadcast), u32 count, then per frame
+                             topic and key as u16 length + UTF-8 (0xFFFF = None; a key is
+                             "kind\\x1fsymbol"), text as u32 length + UTF-8, data as u32
+                             length + bytes (0xFFFFFFFF = None)
+    CONTROL (both ways)      one JSON object
+
+Worker -> hub CONTROL ops: ``subscribe`` / ``unsubscribe`` (symbols), ``binary``
+(on), ``snapshot`` (id, symbols; answered with FRAMES under that id) and ``call``
+(id, method, kwargs; answered with ``{"op": "reply", "id", "value", "error"}``).
+A worker that reconnects sends its subscriptions and binary flag again. A worker
+whose socket buffer exceeds ``max_buffer`` is disconnected rather than buffered
+without bound (it reconnects and resubscribes).
+"""
+import asyncio
+import itertools
+import json
+import os
+import struct
+import tempfile
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from services.fanout import Frame, TopicIndex
+
+FRAMES = 1
+CONTROL = 2
+
+_HEADER = struct.Struct("<IB")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_NONE16 = 0xFFFF
+_NONE32 = 0xFFFFFFFF
+_KEY_SEP = "\x1f"
+
+DEFAULT_ADDRESS = (
+    "tcp://127.0.0.1:8766" if os.name == "nt" else os.path.join(tempfile.gettempdir(), "stock-streamer-hub.sock")
+)
+
+
+def _str16(s: Optional[str]) -> bytes:
+    if s is None:
+        return _U16.pack(_NONE16)
+    b = s.encode()
+    return _U16.pack(len(b)) + b
+
+
+def encode_frame(frame: Frame) -> bytes:
+    """One frame's wire bytes (encoded once, shared by every worker that gets it)."""
+    topic, key, text, data = frame
+    key_s = None if key is None else _KEY_SEP.join(key) if isinstance(key, tuple) else str(key)
+    body = text.encode()
+    parts = [_str16(topic), _str16(key_s), _U32.pack(len(body)), body]
+    if data is None:
+        parts.append(_U32.pack(_NONE32))
+    else:
+        parts.append(_U32.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def pack_frames(encoded: List[bytes], req_id: int = 0) -> bytes:
+    body = b"".join(encoded)
+    return _HEADER.pack(8 + len(body), FRAMES) + _U32.pack(req_id) + _U32.pack(len(encoded)) + body
+
+
+def pack_control(obj: Dict) -> bytes:
+    body = json.dumps(obj).encode()
+    return _HEADER.pack(len(body), CONTROL) + body
+
+
+def decode_frames(body: bytes):
+    """FRAMES body -> (request id, [Frame, ...])."""
+    mv = memoryview(body)
+    req_id, count = struct.unpack_from("<II", mv, 0)
+    pos = 8
+    frames: List[Frame] = []
+    for _ in range(count):
+        fields: List[Optional[str]] = []
+        for _ in range(2):
+            (n,) = _U16.unpack_from(mv, pos)
+            pos += 2
+            if n == _NONE16:
+                fields.append(None)
+            else:
+                fields.append(bytes(mv[pos:pos + n]).decode())
+                pos += n
+        topic, key_s = fields
+        (n,) = _U32.unpack_from(mv, pos)
+        pos += 4
+        text = bytes(mv[pos:pos + n]).decode()
+        pos += n
+        (n,) = _U32.unpack_from(mv, pos)
+        pos += 4
+        if n == _NONE32:
+            data = None
+        else:
+            data = bytes(mv[pos:pos + n])
+            pos += n
+        key = None if key_s is None else tuple(key_s.split(_KEY_SEP)) if _KEY_SEP in key_s else key_s
+        frames.append((topic, key, text, data))
+    return req_id, frames
+
+
+async def _read_message(reader: asyncio.StreamReader):
+    length, kind = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return kind, await reader.readexactly(length)
+
+
+def _tcp(address: str):
+    host, _, port = address[len("tcp://"):].rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def _unix_path(address: str) -> str:
+    return address[len("unix:"):] if address.startswith("unix:") else address
+
+
+class _Peer:
+    """One connected worker."""
+
+    __slots__ = ("writer", "binary", "name", "frames")
+
+    def __init__(self, writer: asyncio.StreamWriter, name: str):
+        self.writer = writer
+        self.binary = False
+        self.name = name
+        self.frames = 0
+
+
+class HubServer:
+    """Publishes the ingest process's serialized frames to worker processes.
+
+    ``upstream(symbols, subscribe)`` is called with the symbols whose first worker
+    subscriber arrived (or last one left), to pin them upstream. ``snapshot(symbols,
+    binary)`` returns late-join snapshot frames. ``calls`` maps method names a
+    worker may ``call`` to coroutine functions taking keyword arguments; their
+    JSON-serializable result is sent back. ``on_binary`` runs when the set of
+    workers with binary clients changes. Must be used from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        upstream: Callable[[List[str], bool], None],
+        snapshot: Callable[[List[str], bool], List[Frame]],
+        calls: Optional[Dict[str, Callable[..., Awaitable[Any]]]] = None,
+        on_binary: Optional[Callable[[], None]] = None,
+        max_buffer: int = 64 << 20,
+    ):
+        self.address = address
+        self._upstream = upstream
+        self._snapshot = snapshot
+        self._calls = dict(calls or {})
+        self._on_binary = on_binary
+        self.max_buffer = max_buffer
+        self.topics = TopicIndex()
+        self._peers: Set[_Peer] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._lock_file = None
+        self._names = itertools.count(1)
+        self.frames = 0
+        self.dropped_peers = 0
+
+    @property
+    def peers(self) -> int:
+        return len(self._peers)
+
+    @property
+    def binary(self) -> bool:
+        return any(p.binary for p in self._peers)
+
+    async def start(self) -> "HubServer":
+        """Listen on ``address``; raises OSError if another hub already holds it."""
+        if self.address.startswith("tcp://"):
+            host, port = _tcp(self.address)
+            self._server = await asyncio.start_server(self._serve, host, port, reuse_address=False)
+            return self
+        path = _unix_path(self.address)
+        # the lock, not the socket file, decides who is hub: a crashed hub leaves the file behind
+        import fcntl
+
+        lock = open(path + ".lock", "a+")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            raise
+        self._lock_file = lock
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = await asyncio.start_unix_server(self._serve, path=path)
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for peer in list(self._peers):
+            peer.writer.close()
+        if self._lock_file is not None:
+            if not self.address.startswith("tcp://"):
+                try:
+                    os.unlink(_unix_path(self.address))
+                except OSError:
+                    pass
+            self._lock_file.close()
+            self._lock_file = None
+
+    def publish(self, frames: List[Frame]):
+        """Forward a batch of broadcast frames to the workers subscribed to each topic."""
+        if not self._peers or not frames:
+            return
+        out: Dict[_Peer, List[bytes]] = {}
+        everyone = self._peers
+        for frame in frames:
+            topic = frame[0]
+            peers = everyone if topic is None else self.topics.clients_for(topic)
+            if not peers:
+                continue
+            encoded = encode_frame(frame)
+            for peer in peers:
+                batch = out.get(peer)
+                if batch is None:
+                    out[peer] = [encoded]
+                else:
+                    batch.append(encoded)
+        for peer, encoded in out.items():
+            self._send(peer, pack_frames(encoded))
+            peer.frames += len(encoded)
+            self.frames += len(encoded)
+
+    def _send(self, peer: _Peer, payload: bytes):
+        writer = peer.writer
+        if writer.is_closing():
+            return
+        if writer.transport.get_write_buffer_size() > self.max_buffer:
+            # a stuck worker: cut it loose instead of buffering without bound
+            self.dropped_peers += 1
+            writer.close()
+            return
+        writer.write(payload)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = _Peer(writer, f"worker-{next(self._names)}")
+        self._peers.add(peer)
+        try:
+            while True:
+                kind, body = await _read_message(reader)
+                if kind == CONTROL:
+                    await self._handle(peer, json.loads(body))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._peers.discard(peer)
+            removed = self.topics.remove(peer)
+            if removed:
+                self._upstream(removed, False)
+            if peer.binary and self._on_binary is not None:
+                self._on_binary()
+            writer.close()
+
+    async def _handle(self, peer: _Peer, msg: Dict):
+        op = msg.get("op")
+        if op == "subscribe":
+            added = self.topics.subscribe(peer, msg.get("symbols") or [])
+            if added:
+                self._upstream(added, True)
+        elif op == "unsubscribe":
+            removed = self.topics.unsubscribe(peer, msg.get("symbols") or [])
+            if removed:
+                self._upstream(removed, False)
+        elif op == "binary":
+            on = bool(msg.get("on"))
+            if on != peer.binary:
+                peer.binary = on
+                if self._on_binary is not None:
+                    self._on_binary()
+        elif op == "snapshot":
+            frames = self._snapshot(msg.get("symbols") or [], peer.binary)
+            self._send(peer, pack_frames([encode_frame(f) for f in frames], msg["id"]))
+        elif op == "call":
+            # a slow call must not hold up this worker's subscriptions
+            asyncio.ensure_future(self._call(peer, msg))
+
+    async def _call(self, peer: _Peer, msg: Dict):
+        fn = self._calls.get(msg.get("method"))
+        value, error = None, None
+        if fn is None:
+            error = f"unknown method {msg.get('method')!r}"
+        else:
+            try:
+                value = await fn(**(msg.get("kwargs") or {}))
+            except Exception as e:
+                error = repr(e)
+        self._send(peer, pack_control({"op": "reply", "id": msg["id"], "value": value, "error": error}))
+
+    def stats(self) -> Dict:
+        return {
+            "address": self.address,
+            "workers": [
+                {"name": p.name, "binary": p.binary, "frames": p.frames, "topics": self.topics.topics(p),
+                 "buffered": p.writer.transport.get_write_buffer_size()}
+                for p in self._peers
+            ],
+            "frames": self.frames,
+            "dropped_workers": self.dropped_peers,
+        }
+
+
+class HubClient:
+    """A web worker's connection to the hub (see module docstring).
+
+    ``on_frames(frames)`` receives every live broadcast batch on the event loop.
+    ``subscribe`` / ``unsubscribe`` track the symbols this worker's clients want
+    (reference counting stays in the worker's TopicIndex) and are replayed after a
+    reconnect, like the upstream streamer's desired subscriptions.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        on_frames: Callable[[List[Frame]], None],
+        backoff_min_ms: float = 100,
+        backoff_max_ms: float = 5000,
+    ):
+        self.address = address
+        self._on_frames = on_frames
+        self.backoff_min_s = backoff_min_ms / 1000
+        self.backoff_max_s = backoff_max_ms / 1000
+        self._desired: Set[str] = set()
+        self._binary = False
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._task: Optional[asyncio.Task] = None
+        self.connects = 0
+        self.frames = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def _open(self):
+        if self.address.startswith("tcp://"):
+            return await asyncio.open_connection(*_tcp(self.address))
+        return await asyncio.open_unix_connection(_unix_path(self.address))
+
+    async def connect(self, timeout: float = 5.0) -> bool:
+        """One connection attempt (used to find an existing hub); True if connected."""
+        try:
+            reader, writer = await asyncio.wait_for(self._open(), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        self._attach(reader, writer)
+        return True
+
+    def _attach(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader, self._writer = reader, writer
+        self.connects += 1
+        if self._desired:
+            self._send({"op": "subscribe", "symbols": sorted(self._desired)})
+        if self._binary:
+            self._send({"op": "binary", "on": True})
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def _run(self):
+        delay = self.backoff_min_s
+        while True:
+            if not self.connected and not await self.connect():
+                await asyncio.sleep(delay)
+                delay = min(self.backoff_max_s, delay * 2)
+                continue
+            delay = self.backoff_min_s
+            try:
+                await self._read_loop(self._reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            for fut in self._pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("hub connection lost"))
+            self._pending.clear()
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        while True:
+            kind, body = await _read_message(reader)
+            if kind == FRAMES:
+                req_id, frames = decode_frames(body)
+                if req_id:
+                    fut = self._pending.pop(req_id, None)
+                    if fut is not None and not fut.done():
+                        fut.set_result(frames)
+                else:
+                    self.frames += len(frames)
+                    self._on_frames(frames)
+            elif kind == CONTROL:
+                msg = json.loads(body)
+                fut = self._pending.pop(msg.get("id"), None)
+                if fut is not None and not fut.done():
+                    if msg.get("error") is None:
+                        fut.set_result(msg.get("value"))
+                    else:
+                        fut.set_exception(RuntimeError(msg["error"]))
+
+    def _send(self, msg: Dict):
+        if self.connected:
+            self._writer.write(pack_control(msg))
+
+    def subscribe(self, symbols: Iterable[str]):
+        symbols = [s for s in symbols if s not in self._desired]
+        if symbols:
+            self._desired.update(symbols)
+            self._send({"op": "subscribe", "symbols": symbols})
+
+    def unsubscribe(self, symbols: Iterable[str]):
+        symbols = [s for s in symbols if s in self._desired]
+        if symbols:
+            self._desired.difference_update(symbols)
+            self._send({"op": "unsubscribe", "symbols": symbols})
+
+    def set_binary(self, on: bool):
+        if on != self._binary:
+            self._binary = on
+            self._send({"op": "binary", "on": on})
+
+    async def _request(self, msg: Dict, timeout: float):
+        if not self.connected:
+            raise ConnectionError("not connected to the hub")
+        req_id = next(self._ids)
+        fut = self._pending[req_id] = asyncio.get_event_loop().create_future()
+        self._send(dict(msg, id=req_id))
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            self._pending.pop(req_id, None)
+
+    async def snapshot(self, symbols: List[str], timeout: float = 10.0) -> List[Frame]:
+        """Late-join snapshot frames for ``symbols`` from the hub's cache."""
+        return await self._request({"op": "snapshot", "symbols": symbols}, timeout)
+
+    async def call(self, method: str, timeout: float = 10.0, **kwargs) -> Any:
+        """Run one of the hub's registered calls (HTTP API state owned by the hub)."""
+        return await self._request({"op": "call", "method": method, "kwargs": kwargs}, timeout)
+
+    def stats(self) -> Dict:
+        return {
+            "address": self.address,
+            "connected": self.connected,
+            "connects": self.connects,
+            "frames": self.frames,
+            "symbols": sorted(self._desired),
+        }
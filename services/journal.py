@@ -0,0 +1,209 @@
+import datetime
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+# File layout: 16-byte header, then fixed-width little-endian records (ts_ms, price, size)
+MAGIC = b"TICKJRN1"
+HEADER = struct.Struct("<8sII")  # magic, record size, reserved
+RECORD = struct.Struct("<qdd")
+RECORD_DTYPE = np.dtype([("ts", "<i8"), ("price", "<f8"), ("size", "<f8")])
+SUFFIX = ".ticks"
+
+
+def day_of(ts_ms: int) -> str:
+    """UTC trading day (YYYYMMDD) a tick belongs to."""
+    return datetime.datetime.fromtimestamp(ts_ms / 1000, datetime.timezone.utc).strftime("%Y%m%d")
+
+
+class TickJournal:
+    """Append-only tick journal: one file per symbol per UTC day under ``directory``.
+
+    ``append`` only packs the record into an in-memory buffer; buffers are written
+    + fsync'ed every ``fsync_interval`` seconds by a background thread (``start``),
+    which is also woken early to write them once they exceed ``max_buffered`` bytes,
+    so file I/O never runs on the appending (event loop) thread. Replay reads the
+    files through mmap, see ``replay``.
+    """
+
+    def __init__(self, directory: str, fsync_interval: float = 1.0, max_buffered: int = 1 << 20):
+        self.directory = Path(directory)
+        self.fsync_interval = fsync_interval
+        self.max_buffered = max_buffered
+        self._lock = threading.Lock()  # buffers
+        self._io_lock = threading.Lock()  # files; held while writing, never by append
+        self._buffers: Dict[Tuple[str, str], bytearray] = {}
+        self._buffered = 0
+        self._files: Dict[Tuple[str, str], object] = {}
+        self._day_ms: Optional[int] = None  # start of the cached day, ms
+        self._day = ""
+        self._timer: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.records = 0
+
+    def _day_for(self, ts_ms: int) -> str:
+        day_ms = ts_ms - ts_ms % 86_400_000
+        if day_ms != self._day_ms:
+            self._day_ms = day_ms
+            self._day = day_of(ts_ms)
+        return self._day
+
+    def append(self, symbol: str, ts_ms: int, price: float, size: float):
+        with self._lock:
+            key = (self._day_for(ts_ms), symbol)
+            buf = self._buffers.get(key)
+            if buf is None:
+                buf = self._buffers[key] = bytearray()
+            buf += RECORD.pack(ts_ms, price, size)
+            self._buffered += RECORD.size
+            self.records += 1
+            full = self._buffered >= self.max_buffered
+        if full:
+            if self._timer is not None:
+                self._wake.set()
+            else:
+                self.flush(sync=False)
+
+    def _open(self, key: Tuple[str, str]):
+        f = self._files.get(key)
+        if f is None:
+            day, symbol = key
+            path = self._path(day, symbol)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            f = open(path, "ab")
+            size = f.tell()
+            if size < HEADER.size:
+                # new file, or a crash before the header made it to disk
+                f.truncate(0)
+                f.write(HEADER.pack(MAGIC, RECORD.size, 0))
+            elif (size - HEADER.size) % RECORD.size:
+                # drop a torn trailing record so appends stay record-aligned
+                f.truncate(size - (size - HEADER.size) % RECORD.size)
+            # keep handles for the current day only
+            for old in [k for k in self._files if k[0] != day]:
+                self._files.pop(old).close()
+            self._files[key] = f
+        return f
+
+    def flush(self, sync: bool = True):
+        """Write buffered records; with ``sync`` also fsync every open file."""
+        with self._io_lock:
+            # swapped out under the io lock so concurrent flushes write in append order
+            with self._lock:
+                buffers, self._buffers = self._buffers, {}
+                self._buffered = 0
+            for key, buf in buffers.items():
+                if buf:
+                    self._open(key).write(buf)
+            for f in self._files.values():
+                f.flush()
+                if sync:
+                    os.fsync(f.fileno())
+
+    def _run(self):
+        next_sync = time.monotonic() + self.fsync_interval
+        while not self._stop.is_set():
+            self._wake.wait(max(0.0, next_sync - time.monotonic()))
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            # woken early (buffers full): write only; fsync on the interval
+            sync = time.monotonic() >= next_sync
+            try:
+                self.flush(sync=sync)
+            except Exception:
+                import traceback
+                traceback.print_exc()
+            if sync:
+                next_sync = time.monotonic() + self.fsync_interval
+
+    def start(self):
+        if self._timer is None or not self._timer.is_alive():
+            self._stop.clear()
+            self._wake.clear()
+            self._timer = threading.Thread(target=self._run, name="tick-journal", daemon=True)
+            self._timer.start()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._timer is not None:
+            self._timer.join(self.fsync_interval + 1)
+            self._timer = None
+        self.flush(sync=True)
+        with self._io_lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+    def _path(self, day: str, symbol: str) -> Path:
+        # crypto symbols contain "/"
+        return self.directory / day / f"{quote(symbol, safe='')}{SUFFIX}"
+
+    # ---- replay ----
+
+    def days(self) -> List[str]:
+        if not self.directory.exists():
+            return []
+        return sorted(p.name for p in self.directory.iterdir() if p.is_dir())
+
+    def symbols(self, day: str) -> List[str]:
+        return sorted(unquote(p.name[: -len(SUFFIX)]) for p in (self.directory / day).glob(f"*{SUFFIX}"))
+
+    def iter_day(self, day: str) -> Iterator[Tuple[str, np.ndarray]]:
+        """Yield (symbol, records) per symbol file. ``records`` is a zero-copy structured
+        array over a read-only mmap, which is unmapped once the array is released."""
+        for symbol in self.symbols(day):
+            path = self._path(day, symbol)
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size <= HEADER.size:
+                    continue
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, rec_size, _ = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC or rec_size != RECORD.size:
+                raise ValueError(f"{path}: not a tick journal")
+            # ignore a torn trailing record from a crash
+            count = (size - HEADER.size) // RECORD.size
+            yield symbol, np.frombuffer(mm, dtype=RECORD_DTYPE, count=count, offset=HEADER.size)
+
+    def replay(
+        self,
+        analyzer,
+        day: Optional[str] = None,
+        keep: Optional[Callable[[str], bool]] = None,
+        days: int = 1,
+    ) -> int:
+        """Rebuild analyzer windows and bar history from the journal: ``day`` alone, or
+        else the last ``days`` UTC days up to and including today, oldest first (the
+        default is today only, so right after 00:00 UTC nothing of the previous session
+        comes back unless ``days`` > 1). ``keep`` limits the replay to the symbols it
+        accepts. Returns the number of ticks replayed."""
+        self.flush(sync=False)
+        if day is None:
+            today = datetime.datetime.now(datetime.timezone.utc).date()
+            wanted = [(today - datetime.timedelta(days=k)).strftime("%Y%m%d") for k in range(max(1, days) - 1, -1, -1)]
+        else:
+            wanted = [day]
+        total = 0
+        for d in wanted:
+            if not (self.directory / d).exists():
+                continue
+            for symbol, records in self.iter_day(d):
+                if keep is not None and not keep(symbol):
+                    continue
+                ts = records["ts"]
+                if len(ts) > 1 and (ts[1:] < ts[:-1]).any():
+                    # appended in arrival order: late ticks (reconnect backfill) go back in place
+                    records = records[np.argsort(ts, kind="stable")]
+                analyzer.register(symbol).add_ticks(records["ts"], records["price"], records["size"], collect=False)
+                total += len(records)
+        return total
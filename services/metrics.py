@@ -0,0 +1,181 @@
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Pipeline stages, in the order a trade passes through them:
+#   exchange      exchange trade timestamp -> frame received from upstream (includes clock skew)
+#   decode        json.loads of one upstream frame
+#   queue         received -> picked up by the forwarder (forward_q / asyncio.Queue wait)
+#   analyzer      Analyzer.add_tick
+#   batch         first message of a batch -> batch flushed (BATCH_WINDOW_MS wait)
+#   serialize     one dumps() (and binary encode, if any binary clients) per published frame
+#   client_queue  frame put on a client's queue -> taken by its writer
+#   send          one websocket send
+# and, per upstream reconnect (not per trade):
+#   reconnect     upstream connection lost -> authenticated again
+#   gap           last trade before the disconnect -> first trade after it (exchange time)
+STAGES = ("exchange", "decode", "queue", "analyzer", "batch", "serialize", "client_queue", "send", "reconnect", "gap")
+
+PREFIX = "stock_streamer"
+
+
+class LatencyHistogram:
+    """Log-linear (HDR-style) histogram of durations, microsecond resolution.
+
+    Values below 16us get their own bucket; above that every power of two is split
+    into 8 linear sub-buckets, so any recorded value is known to within 12.5%.
+    ``record_ns`` is a shift, a bit_length and a list increment.
+    """
+
+    SUB_BUCKETS = 8
+    MAX_EXPONENT = 32  # ~2^35 us (9.5 hours); larger values land in the last bucket
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (self.SUB_BUCKETS * (self.MAX_EXPONENT + 2))
+        self.count = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    @classmethod
+    def index(cls, us: int) -> int:
+        if us < 2 * cls.SUB_BUCKETS:
+            return us if us > 0 else 0
+        e = us.bit_length() - 4  # us >> e is in [8, 16)
+        if e > cls.MAX_EXPONENT:
+            return cls.SUB_BUCKETS * (cls.MAX_EXPONENT + 2) - 1
+        return cls.SUB_BUCKETS * e + (us >> e)
+
+    @classmethod
+    def bounds(cls, idx: int) -> Tuple[int, int]:
+        """[low, high) in microseconds of bucket ``idx``."""
+        if idx < 2 * cls.SUB_BUCKETS:
+            return idx, idx + 1
+        e, m = divmod(idx, cls.SUB_BUCKETS)
+        e -= 1
+        m += cls.SUB_BUCKETS
+        return m << e, (m + 1) << e
+
+    def record_ns(self, ns: int):
+        us = ns // 1000
+        if us < 16:
+            if us < 0:
+                us = 0  # wall-clock stages can go slightly negative across clocks
+            self.counts[us] += 1
+        else:
+            # index() inlined: this runs several times per tick
+            e = us.bit_length() - 4
+            self.counts[8 * e + (us >> e) if e <= self.MAX_EXPONENT else -1] += 1
+        self.count += 1
+        self.sum_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate q-quantile in microseconds (bucket midpoint)."""
+        if not self.count:
+            return None
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                low, high = self.bounds(idx)
+                return min((low + high) / 2, self.max_us)
+        return float(self.max_us)
+
+    def cumulative(self, edges_us: Iterable[int]) -> List[int]:
+        """Count of values below each edge; edges must be bucket boundaries, ascending."""
+        out = []
+        seen = 0
+        idx = 0
+        n = len(self.counts)
+        for edge in edges_us:
+            while idx < n and self.bounds(idx)[1] <= edge:
+                seen += self.counts[idx]
+                idx += 1
+            out.append(seen)
+        return out
+
+
+# Prometheus bucket edges: powers of two from 16us to ~67s, all exact HDR bucket boundaries
+EXPORT_EDGES_US = [1 << k for k in range(4, 27)]
+EXPORT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class PipelineMetrics:
+    """Per-stage latency histograms plus tick counters for the ingest -> fan-out path.
+
+    Producers hold a reference and call ``stage(name).record_ns(...)``; when metrics are
+    disabled they hold ``None`` instead and skip every timing call.
+    """
+
+    def __init__(self, stages: Iterable[str] = STAGES):
+        self.histograms: Dict[str, LatencyHistogram] = {s: LatencyHistogram() for s in stages}
+        for name, hist in self.histograms.items():
+            setattr(self, name, hist)
+        self.ticks = 0
+        self.frames_in = 0
+        self.reconnects = 0
+        self.quotes = 0
+        self._rate_mark: Tuple[float, int] = (time.monotonic(), 0)
+        self._rate = 0.0
+
+    def stage(self, name: str) -> LatencyHistogram:
+        return self.histograms[name]
+
+    def ticks_per_sec(self) -> float:
+        """Tick rate since the previous call at least one second ago."""
+        now = time.monotonic()
+        t0, n0 = self._rate_mark
+        if now - t0 >= 1.0:
+            self._rate = (self.ticks - n0) / (now - t0)
+            self._rate_mark = (now, self.ticks)
+        return self._rate
+
+    def snapshot(self) -> Dict:
+        """Stage quantiles in microseconds (JSON-friendly)."""
+        return {
+            name: {
+                "count": h.count,
+                "p50_us": h.quantile(0.5),
+                "p99_us": h.quantile(0.99),
+                "max_us": h.max_us if h.count else None,
+            }
+            for name, h in self.histograms.items()
+        }
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Prometheus text exposition (format 0.0.4)."""
+        lines = [
+            f"# HELP {PREFIX}_stage_latency_seconds Time spent per pipeline stage.",
+            f"# TYPE {PREFIX}_stage_latency_seconds histogram",
+        ]
+        for name, h in self.histograms.items():
+            for edge, c in zip(EXPORT_EDGES_US, h.cumulative(EXPORT_EDGES_US)):
+                lines.append(f'{PREFIX}_stage_latency_seconds_bucket{{stage="{name}",le="{edge / 1e6:g}"}} {c}')
+            lines.append(f'{PREFIX}_stage_latency_seconds_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+            lines.append(f'{PREFIX}_stage_latency_seconds_sum{{stage="{name}"}} {h.sum_us / 1e6:.6f}')
+            lines.append(f'{PREFIX}_stage_latency_seconds_count{{stage="{name}"}} {h.count}')
+        lines += [
+            f"# HELP {PREFIX}_stage_latency_quantile_seconds Stage latency quantiles from the HDR histograms.",
+            f"# TYPE {PREFIX}_stage_latency_quantile_seconds gauge",
+        ]
+        for name, h in self.histograms.items():
+            if not h.count:
+                continue
+            for q in EXPORT_QUANTILES:
+                lines.append(
+                    f'{PREFIX}_stage_latency_quantile_seconds{{stage="{name}",quantile="{q}"}} {h.quantile(q) / 1e6:.6f}'
+                )
+        counters = {
+            "ticks_total": ("Trades processed by the analyzer.", self.ticks),
+            "upstream_frames_total": ("Frames received from the upstream feed.", self.frames_in),
+            "upstream_reconnects_total": ("Reconnects to the upstream feed.", self.reconnects),
+            "quotes_total": ("Quotes applied to the top-of-book state.", self.quotes),
+        }
+        for key, (help_text, value) in counters.items():
+            lines += [f"# HELP {PREFIX}_{key} {help_text}", f"# TYPE {PREFIX}_{key} counter", f"{PREFIX}_{key} {value}"]
+        gauges = dict(gauges or {})
+        gauges.setdefault("ticks_per_second", self.ticks_per_sec())
+        for key, value in gauges.items():
+            lines += [f"# TYPE {PREFIX}_{key} gauge", f"{PREFIX}_{key} {value:g}"]
+        return "\n".join(lines) + "\n"
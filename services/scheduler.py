@@ -0,0 +1,112 @@
+import asyncio
+import inspect
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+SnapshotFn = Callable[[List[str]], Union[List[Dict], Awaitable[List[Dict]]]]
+
+
+class MetricsScheduler:
+    """Emits per-symbol messages (metrics, top of book) on a fixed cadence, only for
+    symbols that changed.
+
+    The ingest path calls ``mark(symbol)`` per tick (one set add, safe from any
+    thread). Every ``resolution_ms`` the scheduler takes the dirty symbols whose
+    interval has elapsed, computes all of them in one ``compute(symbols)`` call and
+    hands the resulting messages to ``publish`` in one list. A symbol that is dirty
+    but not yet due stays dirty, so its last state is always emitted.
+
+    ``interval_ms`` is the default cadence; ``symbol_intervals`` overrides it per
+    symbol. Must run on the event loop (``start``). Only ``mark`` is thread-safe:
+    ``compute`` runs on the loop and must not read state another thread is writing
+    (the server runs in-process analyzer reads on its ingest thread).
+    """
+
+    def __init__(
+        self,
+        compute: SnapshotFn,
+        publish: Callable[[List[Dict]], None],
+        interval_ms: float = 1000,
+        symbol_intervals: Optional[Dict[str, float]] = None,
+    ):
+        self._compute = compute
+        self._publish = publish
+        self.interval_ms = max(1.0, float(interval_ms))
+        self.symbol_intervals: Dict[str, float] = dict(symbol_intervals or {})
+        self._dirty = set()
+        self._next_due: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.emitted = 0
+
+    @property
+    def resolution_ms(self) -> float:
+        return max(10.0, min([self.interval_ms, *self.symbol_intervals.values()]))
+
+    @property
+    def dirty(self) -> int:
+        return len(self._dirty)
+
+    def mark(self, symbol: str):
+        self._dirty.add(symbol)
+
+    def set_interval(self, symbol: str, interval_ms: Optional[float]):
+        """Per-symbol cadence; None restores the default."""
+        if interval_ms is None:
+            self.symbol_intervals.pop(symbol, None)
+        else:
+            self.symbol_intervals[symbol] = max(1.0, float(interval_ms))
+
+    def forget(self, symbol: str):
+        self._dirty.discard(symbol)
+        self._next_due.pop(symbol, None)
+
+    def due(self, now_ms: Optional[float] = None) -> List[str]:
+        """Pop the dirty symbols whose interval has elapsed (and schedule their next run)."""
+        now_ms = time.monotonic() * 1000 if now_ms is None else now_ms
+        dirty = self._dirty
+        due, later = [], []
+        # pop (atomic) rather than swap the set: marks from other threads are never lost
+        while dirty:
+            symbol = dirty.pop()
+            if now_ms >= self._next_due.get(symbol, 0.0):
+                self._next_due[symbol] = now_ms + self.symbol_intervals.get(symbol, self.interval_ms)
+                due.append(symbol)
+            else:
+                later.append(symbol)
+        dirty.update(later)
+        due.sort()
+        return due
+
+    async def run_once(self, now_ms: Optional[float] = None) -> int:
+        symbols = self.due(now_ms)
+        self.runs += 1
+        if not symbols:
+            return 0
+        messages = self._compute(symbols)
+        if inspect.isawaitable(messages):
+            messages = await messages
+        if messages:
+            self._publish(messages)
+            self.emitted += len(messages)
+        return len(messages)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.resolution_ms / 1000)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                import traceback
+                traceback.print_exc()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
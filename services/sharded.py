@@ -0,0 +1,282 @@
+"""Analyzer sharded across worker processes by symbol.
+
+Symbols are hash-partitioned (crc32, stable across processes) over ``shards`` worker
+processes, each running its own ``Analyzer``. ``submit`` buffers ticks per shard;
+``flush`` (or a full buffer) sends each shard's buffer as one pickled batch down its
+pipe. Every symbol lives on exactly one shard and pipes are FIFO, so per-symbol tick
+order is preserved. Quotes (``submit_quote``) are buffered and batched the same way
+and only update the worker's top-of-book state. Workers send back the finished bars and metrics messages as
+``Message`` lists, which a reader thread hands to ``on_messages``.
+
+A tick submitted with ``want_metrics`` gets its metrics message computed right after
+it is applied (the server instead pulls metrics through ``call(idx, "snapshots", ...)``
+from its scheduler), so the sharded output is identical to single-process mode.
+
+A worker that exits (crash, OOM kill) is marked dead: its outstanding calls fail with
+``ShardDied``, later calls to it fail immediately and its ticks are dropped, so callers
+never wait on a shard that cannot answer.
+"""
+import multiprocessing
+import threading
+import zlib
+from concurrent.futures import Future
+from itertools import count
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+# (symbol, ts_ms, price, size, want_metrics)
+ShardTick = Tuple[str, int, float, float, bool]
+# (symbol, ts_ms, bid, bid_size, ask, ask_size)
+ShardQuote = Tuple[str, int, float, float, float, float]
+
+
+class ShardDied(RuntimeError):
+    """The worker process of an analyzer shard exited."""
+
+
+def shard_of(symbol: str, shards: int) -> int:
+    return zlib.crc32(symbol.encode()) % shards
+
+
+def _worker(index: int, shards: int, config: Dict, tasks: Connection, results: Connection):
+    """Worker process main: apply tick batches, answer calls, until a None task."""
+    from services.analyzer import Analyzer
+
+    analyzer = Analyzer(**config)
+    while True:
+        try:
+            task = tasks.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        kind = task[0]
+        if kind == "ticks":
+            out: List[Tuple[Any, Dict]] = []
+            add_tick = analyzer.add_tick
+            for symbol, ts_ms, price, size, want_metrics in task[1]:
+                for bar in add_tick(symbol, ts_ms, price, size):
+                    out.append((None, bar))
+                if want_metrics:
+                    out.append((("metrics", symbol), analyzer.snapshot(symbol)))
+            if out:
+                results.send(("out", out))
+        elif kind == "quotes":
+            add_quote = analyzer.add_quote
+            for quote in task[1]:
+                add_quote(*quote)
+        elif kind == "call":
+            _, req_id, method, args = task
+            try:
+                if method == "replay":
+                    from services.journal import TickJournal
+
+                    directory, day, days = args
+                    value = TickJournal(directory).replay(
+                        analyzer, day, keep=lambda s: shard_of(s, shards) == index, days=days
+                    )
+                elif method == "symbol_count":
+                    value = len(analyzer.symbols)
+                else:
+                    value = getattr(analyzer, method)(*args)
+                results.send(("reply", req_id, value, None))
+            except Exception as e:
+                results.send(("reply", req_id, None, repr(e)))
+
+
+class ShardedAnalyzer:
+    """Front end for ``shards`` Analyzer worker processes (see module docstring).
+
+    ``analyzer_config`` are the keyword arguments of ``Analyzer``. ``on_messages`` is
+    called from the reader thread with each result batch. ``submit``/``flush`` must be
+    called from one thread at a time.
+    """
+
+    def __init__(
+        self,
+        shards: int,
+        analyzer_config: Dict,
+        on_messages: Callable[[List[Tuple[Any, Dict]]], None],
+        max_batch: int = 512,
+    ):
+        self.shards = max(1, int(shards))
+        self.config = dict(analyzer_config)
+        self.default_window_seconds = self.config.get("default_window_seconds", 60)
+        self.bar_history = self.config.get("bar_history", 1000)
+        self.max_batch = max(1, int(max_batch))
+        self._on_messages = on_messages
+        self._pending: List[List[ShardTick]] = [[] for _ in range(self.shards)]
+        self._pending_quotes: List[List[ShardQuote]] = [[] for _ in range(self.shards)]
+        self._shard_cache: Dict[str, int] = {}
+        self._tasks: List[Connection] = []
+        self._results: List[Connection] = []
+        self._procs: List[multiprocessing.Process] = []
+        # req_id -> (shard, future); a dead shard's entries are failed by the reader
+        self._calls: Dict[int, Tuple[int, Future]] = {}
+        self.dead: Set[int] = set()
+        self._ids = count()
+        self._lock = threading.Lock()  # task pipes
+        # _calls / dead; never held while sending, so the reader can always drain results
+        self._calls_lock = threading.Lock()
+        self._reader: Optional[threading.Thread] = None
+        self._closing = False
+        self.batches = 0
+
+    def start(self) -> "ShardedAnalyzer":
+        # spawn: the server process runs threads, which fork would copy mid-flight
+        ctx = multiprocessing.get_context("spawn")
+        for i in range(self.shards):
+            task_r, task_w = ctx.Pipe(duplex=False)
+            res_r, res_w = ctx.Pipe(duplex=False)
+            proc = ctx.Process(
+                target=_worker, args=(i, self.shards, self.config, task_r, res_w),
+                name=f"analyzer-shard-{i}", daemon=True,
+            )
+            proc.start()
+            task_r.close()
+            res_w.close()
+            self._tasks.append(task_w)
+            self._results.append(res_r)
+            self._procs.append(proc)
+        self._reader = threading.Thread(target=self._read, name="analyzer-shards", daemon=True)
+        self._reader.start()
+        return self
+
+    def shard(self, symbol: str) -> int:
+        idx = self._shard_cache.get(symbol)
+        if idx is None:
+            idx = self._shard_cache[symbol] = shard_of(symbol, self.shards)
+        return idx
+
+    def submit(self, symbol: str, ts_ms: int, price: float, size: float, want_metrics: bool = False):
+        idx = self.shard(symbol)
+        batch = self._pending[idx]
+        batch.append((symbol, ts_ms, price, size, want_metrics))
+        if len(batch) >= self.max_batch:
+            self._send(idx)
+
+    def submit_quote(self, symbol: str, ts_ms: int, bid: float, bid_size: float, ask: float, ask_size: float):
+        idx = self.shard(symbol)
+        batch = self._pending_quotes[idx]
+        batch.append((symbol, ts_ms, bid, bid_size, ask, ask_size))
+        if len(batch) >= self.max_batch:
+            self._send_quotes(idx)
+
+    def flush(self):
+        for idx, batch in enumerate(self._pending):
+            if batch:
+                self._send(idx)
+        for idx, batch in enumerate(self._pending_quotes):
+            if batch:
+                self._send_quotes(idx)
+
+    def _send(self, idx: int):
+        batch = self._pending[idx]
+        self._pending[idx] = []
+        self.batches += 1
+        self._post(idx, ("ticks", batch))
+
+    def _send_quotes(self, idx: int):
+        batch = self._pending_quotes[idx]
+        self._pending_quotes[idx] = []
+        self.batches += 1
+        self._post(idx, ("quotes", batch))
+
+    def _post(self, idx: int, task: Tuple):
+        """Send a task to a live shard; False if the shard is (now known to be) dead."""
+        if idx in self.dead:
+            return False
+        try:
+            with self._lock:
+                self._tasks[idx].send(task)
+            return True
+        except OSError:
+            pass
+        self._died(idx)
+        return False
+
+    def _died(self, idx: int):
+        """Mark shard ``idx`` dead and fail every call still waiting on it."""
+        with self._calls_lock:
+            if idx in self.dead:
+                return
+            self.dead.add(idx)
+            failed = [req_id for req_id, (shard, _) in self._calls.items() if shard == idx]
+            futures = [self._calls.pop(req_id)[1] for req_id in failed]
+        proc = self._procs[idx] if idx < len(self._procs) else None
+        if proc is not None:
+            proc.join(1.0)
+        code = proc.exitcode if proc is not None else None
+        print(f"Analyzer shard {idx} exited (exit code {code}); its symbols are no longer analyzed")
+        for fut in futures:
+            fut.set_exception(ShardDied(f"analyzer shard {idx} exited"))
+
+    def _read(self):
+        live = list(self._results)
+        while live:
+            for conn in wait(live):
+                try:
+                    msg = conn.recv()
+                except (EOFError, OSError):
+                    live.remove(conn)
+                    if not self._closing:
+                        self._died(self._results.index(conn))
+                    continue
+                if msg[0] == "out":
+                    try:
+                        self._on_messages(msg[1])
+                    except Exception:
+                        import traceback
+                        traceback.print_exc()
+                else:
+                    _, req_id, value, error = msg
+                    with self._calls_lock:
+                        entry = self._calls.pop(req_id, None)
+                    if entry is None:
+                        continue
+                    fut = entry[1]
+                    if error is None:
+                        fut.set_result(value)
+                    else:
+                        fut.set_exception(RuntimeError(error))
+
+    def call(self, idx: int, method: str, *args) -> Future:
+        """Run ``Analyzer.<method>(*args)`` on shard ``idx`` after the ticks already sent to it.
+
+        Besides Analyzer methods: "replay" (journal directory, day, days) replays the shard's
+        own symbols from a tick journal, "symbol_count" returns len(analyzer.symbols).
+        """
+        fut: Future = Future()
+        req_id = next(self._ids)
+        with self._calls_lock:
+            self._calls[req_id] = (idx, fut)
+        if not self._post(idx, ("call", req_id, method, args)):
+            with self._calls_lock:
+                entry = self._calls.pop(req_id, None)
+            # else _died already took it and fails it
+            if entry is not None:
+                fut.set_exception(ShardDied(f"analyzer shard {idx} exited"))
+        return fut
+
+    def call_symbol(self, symbol: str, method: str, *args) -> Future:
+        return self.call(self.shard(symbol), method, *args)
+
+    def call_all(self, method: str, *args) -> List[Future]:
+        return [self.call(i, method, *args) for i in range(self.shards)]
+
+    def close(self, timeout: float = 2.0):
+        self._closing = True
+        self.flush()
+        for conn in self._tasks:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for proc in self._procs:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+        for conn in self._tasks:
+            conn.close()
+        self._tasks.clear()
+        self._procs.clear()
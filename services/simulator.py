@@ -0,0 +1,367 @@
+"""Local stand-in for the Alpaca market-data websocket, for offline load testing.
+
+Speaks the same auth / subscribe / trade JSON protocol as the IEX stream and either
+generates synthetic trades (per-symbol random walks at a configurable rate, with
+periodic bursts) or replays a recorded tick journal at N x speed.
+
+    python -m services.simulator --port 8765 --symbols AAPL,MSFT --rate 200
+    python -m services.simulator --replay ./journal --day 20240102 --speed 10
+
+Point the server at it with FEED=simulator (and SIMULATOR_URL if not the default).
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+import websockets
+
+from services.journal import TickJournal
+
+
+_last_second = [None, ""]
+
+
+def rfc3339_ns(ts_ns: int) -> str:
+    """Alpaca-style timestamp with nanosecond precision, e.g. 2024-01-02T14:30:00.123456789Z."""
+    sec, nanos = divmod(ts_ns, 1_000_000_000)
+    if sec != _last_second[0]:
+        _last_second[0] = sec
+        _last_second[1] = datetime.datetime.fromtimestamp(sec, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+    return f"{_last_second[1]}.{nanos:09d}Z"
+
+
+class MarketSimulator:
+    """Websocket server emitting Alpaca-protocol trade frames.
+
+    Synthetic mode: every ``tick_ms`` each subscribed symbol gets Poisson(rate * dt)
+    trades; for ``burst_seconds`` out of every ``burst_every`` seconds the rate is
+    multiplied by ``burst_mult`` (open-auction style). ``rate <= 0`` sends
+    ``batch``-sized frames back to back. ``max_trades`` stops a connection's stream
+    after that many trades; ``stamp`` adds a ``_gen_ns`` wall-clock field per trade
+    for latency measurement. ``drop_every`` aborts every connection that many seconds
+    after it was opened, to exercise client reconnects. Symbols subscribed on the
+    ``quotes`` channel get Poisson(quote_rate * dt) top-of-book quotes per tick around
+    their last trade price.
+
+    Replay mode (``replay_dir``): streams one journal day, all symbols merged in time
+    order, paced at ``speed`` x real time (``speed <= 0``: as fast as possible).
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        symbols: Iterable[str] = ("AAPL", "MSFT", "NVDA", "TSLA", "AMZN"),
+        rate: float = 100.0,
+        burst_every: float = 0.0,
+        burst_seconds: float = 0.0,
+        burst_mult: float = 1.0,
+        tick_ms: float = 10.0,
+        batch: int = 100,
+        max_trades: int = 0,
+        stamp: bool = False,
+        replay_dir: Optional[str] = None,
+        replay_day: Optional[str] = None,
+        speed: float = 1.0,
+        seed: Optional[int] = None,
+        drop_every: float = 0.0,
+        quote_rate: float = 0.0,
+    ):
+        self.host = host
+        self.port = port
+        self.symbols = [s.upper() for s in symbols]
+        self.rate = rate
+        self.burst_every = burst_every
+        self.burst_seconds = burst_seconds
+        self.burst_mult = burst_mult
+        self.tick_ms = tick_ms
+        self.batch = batch
+        self.max_trades = max_trades
+        self.stamp = stamp
+        self.replay_dir = replay_dir
+        self.replay_day = replay_day
+        self.speed = speed
+        self.drop_every = drop_every
+        self.quote_rate = quote_rate
+        self._rng = np.random.default_rng(seed)
+        self._replay = None  # (ts_ms, symbol index, price, size, symbol names)
+        self.connections = 0
+        self.connects = 0
+        self.drops = 0
+        # subscribe / unsubscribe frames received, over all connections
+        self.control_frames = 0
+        self.trades_sent = 0
+        self.quotes_sent = 0
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+
+    # ---- protocol ----
+
+    async def _handler(self, ws, path=None):
+        self.connections += 1
+        self.connects += 1
+        subscribed: Set[str] = set()
+        quoted: Set[str] = set()
+        producer: Optional[asyncio.Task] = None
+        dropper = asyncio.create_task(self._drop_later(ws)) if self.drop_every > 0 else None
+        try:
+            await ws.send(json.dumps([{"T": "success", "msg": "connected"}]))
+            async for message in ws:
+                try:
+                    msg = json.loads(message)
+                except ValueError:
+                    continue
+                action = msg.get("action")
+                if action == "auth":
+                    await ws.send(json.dumps([{"T": "success", "msg": "authenticated"}]))
+                elif action in ("subscribe", "unsubscribe"):
+                    self.control_frames += 1
+                    trades = self._symbols_of(msg, "trades")
+                    quotes = self._symbols_of(msg, "quotes")
+                    if action == "subscribe":
+                        subscribed |= trades
+                        quoted |= quotes
+                    else:
+                        subscribed -= trades
+                        quoted -= quotes
+                    await ws.send(json.dumps([{"T": "subscription", "trades": sorted(subscribed),
+                                               "quotes": sorted(quoted), "bars": []}]))
+                    if producer is None and (subscribed or quoted):
+                        producer = asyncio.create_task(self._produce(ws, subscribed, quoted))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.connections -= 1
+            if producer is not None:
+                producer.cancel()
+            if dropper is not None:
+                dropper.cancel()
+
+    def _symbols_of(self, msg: Dict, channel: str) -> Set[str]:
+        symbols = {s.upper() for s in msg.get(channel) or []}
+        if "*" in symbols:
+            symbols = (symbols - {"*"}) | set(self.symbols)
+        return symbols
+
+    async def _drop_later(self, ws):
+        await asyncio.sleep(self.drop_every)
+        self.drops += 1
+        # abrupt drop (no closing handshake), like a feed restart or a network blip
+        ws.transport.abort()
+
+    def _trade(self, symbol: str, price: float, size: int, ts_ns: int, trade_id: int) -> Dict:
+        trade = {"T": "t", "S": symbol, "i": trade_id, "x": "V", "p": round(price, 4), "s": size,
+                 "c": ["@"], "z": "C", "t": rfc3339_ns(ts_ns)}
+        if self.stamp:
+            trade["_gen_ns"] = time.time_ns()
+        return trade
+
+    def _quote(self, symbol: str, bid: float, ask: float, bid_size: int, ask_size: int, ts_ns: int) -> Dict:
+        return {"T": "q", "S": symbol, "bx": "V", "bp": round(bid, 2), "bs": bid_size, "ax": "V",
+                "ap": round(ask, 2), "as": ask_size, "c": ["R"], "z": "C", "t": rfc3339_ns(ts_ns)}
+
+    async def _produce(self, ws, subscribed: Set[str], quoted: Set[str]):
+        try:
+            if self.replay_dir:
+                await self._produce_replay(ws, subscribed)
+            else:
+                await self._produce_synthetic(ws, subscribed, quoted)
+        except websockets.ConnectionClosed:
+            pass
+
+    # ---- synthetic feed ----
+
+    def _rate_at(self, elapsed: float) -> float:
+        if self.burst_every > 0 and self.burst_seconds > 0 and elapsed % self.burst_every < self.burst_seconds:
+            return self.rate * self.burst_mult
+        return self.rate
+
+    async def _produce_synthetic(self, ws, subscribed: Set[str], quoted: Set[str]):
+        rng = self._rng
+        prices: Dict[str, float] = {}
+        sent = 0
+        trade_id = 0
+        start = time.monotonic()
+        dt = self.tick_ms / 1000.0
+        next_tick = start
+        while not self.max_trades or sent < self.max_trades:
+            symbols = sorted(subscribed)
+            quote_symbols = sorted(quoted) if self.quote_rate > 0 else []
+            if not symbols and not quote_symbols:
+                await asyncio.sleep(dt)
+                continue
+            if self.rate > 0:
+                counts = rng.poisson(self._rate_at(time.monotonic() - start) * dt, len(symbols))
+            else:
+                counts = np.full(len(symbols), max(1, self.batch // max(1, len(symbols))))
+            frame: List[Dict] = []
+            book: List[Dict] = []
+            now_ns = time.time_ns()
+            if quote_symbols:
+                qcounts = rng.poisson(self.quote_rate * dt, len(quote_symbols))
+                for symbol, n in zip(quote_symbols, qcounts.tolist()):
+                    if not n:
+                        continue
+                    p = prices.get(symbol) or 50.0 + zlib.crc32(symbol.encode()) % 400
+                    half = np.abs(rng.normal(0, p * 5e-5, n)) + 0.005
+                    bid_sizes = rng.integers(1, 20, n) * 100
+                    ask_sizes = rng.integers(1, 20, n) * 100
+                    for k in range(n):
+                        book.append(self._quote(symbol, p - half[k], p + half[k], int(bid_sizes[k]),
+                                                int(ask_sizes[k]), now_ns + k))
+            for symbol, n in zip(symbols, counts.tolist()):
+                if not n:
+                    continue
+                p = prices.get(symbol) or 50.0 + zlib.crc32(symbol.encode()) % 400
+                steps = np.exp(np.cumsum(rng.normal(0, 2e-4, n)))
+                sizes = rng.integers(1, 500, n)
+                for k in range(n):
+                    trade_id += 1
+                    frame.append(self._trade(symbol, p * steps[k], int(sizes[k]), now_ns + k, trade_id))
+                prices[symbol] = p * steps[-1]
+            if self.max_trades:
+                frame = frame[: self.max_trades - sent]
+            if frame or book:
+                await ws.send(json.dumps(frame + book if book else frame))
+                sent += len(frame)
+                self.trades_sent += len(frame)
+                self.quotes_sent += len(book)
+            if self.rate > 0:
+                next_tick += dt
+                await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            else:
+                await asyncio.sleep(0)
+
+    # ---- journal replay ----
+
+    def _load_replay(self):
+        if self._replay is not None:
+            return self._replay
+        journal = TickJournal(self.replay_dir)
+        day = self.replay_day or (journal.days() or [None])[-1]
+        if day is None:
+            raise ValueError(f"no journal days under {self.replay_dir}")
+        names: List[str] = []
+        cols = []
+        for symbol, records in journal.iter_day(day):
+            idx = np.full(len(records), len(names), dtype=np.int32)
+            names.append(symbol)
+            cols.append((records["ts"].copy(), idx, records["price"].copy(), records["size"].copy()))
+        if not cols:
+            raise ValueError(f"no journal records for {day} under {self.replay_dir}")
+        ts = np.concatenate([c[0] for c in cols])
+        order = np.argsort(ts, kind="stable")
+        self._replay = tuple(np.concatenate([c[i] for c in cols])[order] for i in range(4)) + (names,)
+        return self._replay
+
+    async def _produce_replay(self, ws, subscribed: Set[str]):
+        ts, sym, price, size, names = self._load_replay()
+        if not len(ts):
+            return
+        t0_data = int(ts[0])
+        t0_wall = time.monotonic()
+        trade_id = 0
+        i = 0
+        n = len(ts)
+        while i < n and (not self.max_trades or trade_id < self.max_trades):
+            if self.speed > 0:
+                # everything due by now, capped at one frame
+                due_ms = t0_data + (time.monotonic() - t0_wall) * 1000 * self.speed
+                j = min(int(np.searchsorted(ts, due_ms, side="right")), i + self.batch)
+                if j <= i:
+                    wait = (int(ts[i]) - t0_data) / 1000 / self.speed - (time.monotonic() - t0_wall)
+                    await asyncio.sleep(min(max(wait, 0.0), 0.05))
+                    continue
+            else:
+                j = min(n, i + self.batch)
+            frame = []
+            for t, s, p, q in zip(ts[i:j].tolist(), sym[i:j].tolist(), price[i:j].tolist(), size[i:j].tolist()):
+                symbol = names[s]
+                if symbol in subscribed:
+                    trade_id += 1
+                    frame.append(self._trade(symbol, p, int(q), t * 1_000_000, trade_id))
+            i = j
+            if frame:
+                await ws.send(json.dumps(frame))
+                self.trades_sent += len(frame)
+            await asyncio.sleep(0)
+
+    # ---- lifecycle ----
+
+    async def serve_forever(self):
+        async with websockets.serve(self._handler, self.host, self.port, max_queue=None):
+            await asyncio.Future()
+
+    def start_in_thread(self) -> "MarketSimulator":
+        """Run the server on its own event loop in a daemon thread (benchmarks)."""
+        ready = threading.Event()
+
+        def _run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(
+                websockets.serve(self._handler, self.host, self.port, max_queue=None)
+            )
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=_run, name="market-simulator", daemon=True)
+        self._thread.start()
+        ready.wait(10)
+        return self
+
+    async def _shutdown(self):
+        self._server.close()
+        await self._server.wait_closed()
+        asyncio.get_running_loop().call_soon(self._loop.stop)
+
+    def stop(self):
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(5)
+        if self._thread is not None:
+            self._thread.join(5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Alpaca-protocol market data simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--symbols", default="AAPL,MSFT,NVDA,TSLA,AMZN", help="symbols for a '*' subscription")
+    parser.add_argument("--rate", type=float, default=100.0, help="trades/sec per symbol (<=0: as fast as possible)")
+    parser.add_argument("--burst-every", type=float, default=0.0, help="seconds between bursts")
+    parser.add_argument("--burst-seconds", type=float, default=0.0, help="burst duration")
+    parser.add_argument("--burst-mult", type=float, default=1.0, help="rate multiplier during a burst")
+    parser.add_argument("--tick-ms", type=float, default=10.0, help="frame interval")
+    parser.add_argument("--batch", type=int, default=100, help="max trades per frame when unpaced")
+    parser.add_argument("--max-trades", type=int, default=0)
+    parser.add_argument("--stamp", action="store_true", help="add _gen_ns send timestamps")
+    parser.add_argument("--replay", default=None, help="journal directory to replay instead of synthetic trades")
+    parser.add_argument("--day", default=None, help="journal day (YYYYMMDD), default latest")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier (<=0: unpaced)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--drop-every", type=float, default=0.0, help="abort each connection after N seconds (reconnect testing)")
+    parser.add_argument("--quote-rate", type=float, default=0.0, help="quotes/sec per symbol subscribed to quotes")
+    args = parser.parse_args()
+    sim = MarketSimulator(
+        host=args.host, port=args.port, symbols=args.symbols.split(","), rate=args.rate,
+        burst_every=args.burst_every, burst_seconds=args.burst_seconds, burst_mult=args.burst_mult,
+        tick_ms=args.tick_ms, batch=args.batch, max_trades=args.max_trades, stamp=args.stamp,
+        replay_dir=args.replay, replay_day=args.day, speed=args.speed, seed=args.seed,
+        drop_every=args.drop_every, quote_rate=args.quote_rate,
+    )
+    print(f"Simulator listening on ws://{args.host}:{args.port}")
+    try:
+        asyncio.run(sim.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Per-symbol late-join snapshots: recent bars, latest metrics, top of book and last trade.
+
+``SnapshotCache.update`` is fed every broadcast message batch and only keeps
+references (O(1) per message). A symbol's snapshot is serialized on first request
+after a change, once per format, and the text/bytes are reused for every client and
+HTTP request until the symbol changes again, so a burst of reconnecting dashboards
+costs one serialization per symbol.
+
+A snapshot is an ordinary batch frame: ``[{"type": "snapshot", ...}, bars..., metrics,
+book, trade]``, oldest first, so clients apply it with the same code as live frames.
+"""
+import os
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from services.fanout import Message, dumps
+from services import wire
+
+
+class _SymbolSnapshot:
+    __slots__ = ("bars", "metrics", "book", "trade", "version", "_text", "_body", "_data", "_built")
+
+    def __init__(self):
+        self.bars: Dict[int, Deque[Dict]] = {}
+        self.metrics: Optional[Dict] = None
+        self.book: Optional[Dict] = None
+        self.trade: Any = None
+        self.version = 0
+        self._text: Optional[str] = None
+        self._body: Optional[bytes] = None
+        self._data: Optional[bytes] = None
+        self._built = -1
+
+
+class SnapshotCache:
+    """Symbol -> latest state for late joiners (see module docstring).
+
+    ``bars`` finished bars are kept per timeframe. Must be used from one thread (the
+    event loop).
+    """
+
+    def __init__(self, bars: int = 300):
+        self.max_bars = max(0, int(bars))
+        self._symbols: Dict[str, _SymbolSnapshot] = {}
+        # distinguishes ETags across restarts, where versions start over
+        self._epoch = os.urandom(4).hex()
+        self.builds = 0
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._symbols
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    @property
+    def symbols(self) -> List[str]:
+        return sorted(self._symbols)
+
+    def _get(self, symbol: str) -> _SymbolSnapshot:
+        snap = self._symbols.get(symbol)
+        if snap is None:
+            snap = self._symbols[symbol] = _SymbolSnapshot()
+        return snap
+
+    def update(self, messages: Iterable[Message]):
+        """Record the state carried by a batch of broadcast messages."""
+        for key, msg in messages:
+            if key is not None:
+                kind, symbol = key
+                if kind == "t":
+                    snap = self._get(symbol)
+                    snap.trade = msg
+                    snap.version += 1
+                elif kind == "metrics":
+                    snap = self._get(symbol)
+                    snap.metrics = msg
+                    snap.version += 1
+                elif kind == "book":
+                    snap = self._get(symbol)
+                    snap.book = msg
+                    snap.version += 1
+            elif isinstance(msg, dict) and msg.get("type") == "bar" and self.max_bars:
+                snap = self._get(msg["symbol"])
+                bars = snap.bars.get(msg.get("bar_s", 1))
+                if bars is None:
+                    bars = snap.bars[msg.get("bar_s", 1)] = deque(maxlen=self.max_bars)
+                bars.append(msg)
+                snap.version += 1
+
+    def forget(self, symbol: str):
+        self._symbols.pop(symbol, None)
+
+    def messages(self, symbol: str) -> List[Any]:
+        snap = self._symbols.get(symbol)
+        if snap is None:
+            return []
+        out: List[Any] = [{"type": "snapshot", "symbol": symbol, "version": snap.version}]
+        for bar_s in sorted(snap.bars):
+            out.extend(snap.bars[bar_s])
+        if snap.metrics is not None:
+            out.append(snap.metrics)
+        if snap.book is not None:
+            out.append(snap.book)
+        if snap.trade is not None:
+            out.append(snap.trade)
+        return out
+
+    def etag(self, symbol: str) -> Optional[str]:
+        snap = self._symbols.get(symbol)
+        return None if snap is None else f'"{self._epoch}-{snap.version}"'
+
+    def _current(self, symbol: str) -> Optional[_SymbolSnapshot]:
+        snap = self._symbols.get(symbol)
+        if snap is not None and snap._built != snap.version:
+            snap._text = snap._body = snap._data = None
+            snap._built = snap.version
+        return snap
+
+    def text(self, symbol: str) -> Optional[str]:
+        """The JSON snapshot frame, serialized at most once per change."""
+        snap = self._current(symbol)
+        if snap is None:
+            return None
+        if snap._text is None:
+            snap._text = dumps(self.messages(symbol))
+            self.builds += 1
+        return snap._text
+
+    def body(self, symbol: str) -> Optional[bytes]:
+        """``text`` as UTF-8 bytes (the HTTP response body), cached alongside it."""
+        snap = self._current(symbol)
+        if snap is None:
+            return None
+        if snap._body is None:
+            snap._body = self.text(symbol).encode()
+        return snap._body
+
+    def data(self, symbol: str) -> Optional[bytes]:
+        """The binary wire snapshot frame, encoded at most once per change."""
+        snap = self._current(symbol)
+        if snap is None:
+            return None
+        if snap._data is None:
+            snap._data = wire.encode(self.messages(symbol))
+            self.builds += 1
+        return snap._data
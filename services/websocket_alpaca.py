@@ -1,22 +1,50 @@
 import os
 import json
+import asyncio
+import random
 import threading
+import time
 import websocket
-from typing import Callable, Iterable, Optional
+import websockets
+from typing import Callable, Dict, Iterable, List, Optional, Set
 from queue import Queue
 from pathlib import Path
 from dotenv import load_dotenv
 
+from services.decode import Quote, Trade, decode_frame
+from services.metrics import PipelineMetrics
+
 # load secrets
 env_path = Path(__file__).parents[1] / ".env"
 load_dotenv(env_path)
 
 ALPACA_KEY = os.getenv("ALPACA_API_KEY")
 ALPACA_SECRET = os.getenv("ALPACA_API_SECRET")
-ALPACA_URL = "wss://stream.data.alpaca.markets/v2/iex"
+# FEED=simulator points the streamer at a local services.simulator instance
+FEED = os.getenv("FEED", "alpaca").lower()
+SIMULATOR_URL = os.getenv("SIMULATOR_URL", "ws://127.0.0.1:8765")
+ALPACA_URL = os.getenv("ALPACA_URL") or (
+    SIMULATOR_URL if FEED == "simulator" else "wss://stream.data.alpaca.markets/v2/iex"
+)
+# reconnect backoff: doubles from RECONNECT_MIN_MS up to RECONNECT_MAX_MS, jittered, reset on auth
+RECONNECT_MIN_MS = float(os.getenv("RECONNECT_MIN_MS", "500"))
+RECONNECT_MAX_MS = float(os.getenv("RECONNECT_MAX_MS", "30000"))
+# (un)subscribe requests within this window go upstream as one payload per action
+SUBSCRIBE_COALESCE_MS = float(os.getenv("SUBSCRIBE_COALESCE_MS", "20"))
+
+CHANNELS = ("trades", "quotes", "bars")
 
 
 class WebSocketStreamer:
+    """Alpaca market-data client on a websocket-client thread.
+
+    Keeps the desired subscription set per channel and reconciles it with what the
+    current connection was told: (un)subscribe calls only update the set and schedule
+    a flush ``coalesce_ms`` later, which sends at most one unsubscribe and one subscribe
+    payload for everything that changed. After every (re)authentication the whole set
+    is sent again. A dropped connection is retried with jittered exponential backoff
+    until ``stop``.
+    """
 
     def __init__(
         self,
@@ -24,17 +52,47 @@ class WebSocketStreamer:
         out_queue: Optional[Queue] = None,
         ping_interval: int = 20,
         ping_timeout: int = 10,
+        url: str = ALPACA_URL,
+        metrics: Optional[PipelineMetrics] = None,
+        reconnect: bool = True,
+        backoff_min_ms: float = RECONNECT_MIN_MS,
+        backoff_max_ms: float = RECONNECT_MAX_MS,
+        coalesce_ms: float = SUBSCRIBE_COALESCE_MS,
     ):
         self._on_message_cb = on_message_cb
+        # when set, decode time is recorded and items carry their receive time (rx_ns / "_rx_ns")
+        self._metrics = metrics
         self._queue = out_queue
+        self._url = url
         self._ping_interval = ping_interval
         self._ping_timeout = ping_timeout
+        self.reconnect = reconnect
+        self.backoff_min_s = max(0.0, backoff_min_ms) / 1000
+        self.backoff_max_s = max(self.backoff_min_s, backoff_max_ms / 1000)
+        self.coalesce_s = max(0.0, coalesce_ms) / 1000
 
         self.ws: Optional[websocket.WebSocketApp] = None
         self.thread: Optional[threading.Thread] = None
         self._running = False
         self._authenticated = False
-        self._pending_subscriptions = []
+        self._stopping = threading.Event()
+        # channel -> symbols we want / symbols the current connection was sent
+        self._desired: Dict[str, Set[str]] = {c: set() for c in CHANNELS}
+        self._sent: Dict[str, Set[str]] = {c: set() for c in CHANNELS}
+        self._sub_lock = threading.Lock()
+        self._flush_scheduled = False
+        # raw payloads sent before authentication
+        self._pending_raw: List[dict] = []
+        # reconnect bookkeeping (also reported through metrics)
+        self._attempt = 0
+        self._lost_at: Optional[float] = None
+        self._last_trade_ns = 0
+        self._gap_from_ns = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.subscribe_payloads = 0
+        self.last_reconnect_ms: Optional[float] = None
+        self.last_gap_ms: Optional[float] = None
 
     def _handle_item(self, item: dict):
         # deliver parsed item to callback or queue
@@ -47,72 +105,185 @@ class WebSocketStreamer:
                 traceback.print_exc()
         if self._queue:
             try:
-                self._queue.put(item)
+                self._queue.put_nowait(item)
             except Exception:
                 pass
 
+    def _auth_payload(self) -> str:
+        return json.dumps({"action": "auth", "key": ALPACA_KEY, "secret": ALPACA_SECRET})
+
     def _on_open(self, ws):
-        auth_msg = {"action": "auth", "key": ALPACA_KEY, "secret": ALPACA_SECRET}
         try:
-            # print(auth_msg)
-            ws.send(json.dumps(auth_msg))
+            ws.send(self._auth_payload())
         except Exception as e:
             self._handle_item({"_ws_error": True, "error": f"Auth send failed: {e}"})
 
-    def _flush_pending_subscriptions(self):
-        while self._pending_subscriptions:
-            payload = self._pending_subscriptions.pop(0)
+    # ---- subscriptions ----
+
+    def _change(self, subscribe: bool, channels: Dict[str, Optional[Iterable[str]]]):
+        with self._sub_lock:
+            for channel, symbols in channels.items():
+                if not symbols:
+                    continue
+                if subscribe:
+                    self._desired[channel].update(symbols)
+                else:
+                    self._desired[channel].difference_update(symbols)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        if self.coalesce_s > 0:
+            self._schedule_flush()
+        else:
+            self._flush_subscriptions()
+
+    def _schedule_flush(self):
+        timer = threading.Timer(self.coalesce_s, self._flush_subscriptions)
+        timer.daemon = True
+        timer.start()
+
+    def _diff(self) -> List[dict]:
+        """Payloads that bring the connection from ``_sent`` to ``_desired`` (marks them sent)."""
+        with self._sub_lock:
+            self._flush_scheduled = False
+            if not self._authenticated:
+                return []
+            unsub = {c: sorted(self._sent[c] - self._desired[c]) for c in CHANNELS}
+            sub = {c: sorted(self._desired[c] - self._sent[c]) for c in CHANNELS}
+            self._sent = {c: set(self._desired[c]) for c in CHANNELS}
+        payloads = []
+        for action, change in (("unsubscribe", unsub), ("subscribe", sub)):
+            change = {c: syms for c, syms in change.items() if syms}
+            if change:
+                payloads.append({"action": action, **change})
+        pending, self._pending_raw = self._pending_raw, []
+        return pending + payloads
+
+    def _flush_subscriptions(self):
+        ws = self.ws
+        for payload in self._diff():
             try:
-                if self.ws:
-                    self.ws.send(json.dumps(payload))
+                ws.send(json.dumps(payload))
+                self.subscribe_payloads += 1
             except Exception as e:
-                # Put it back and stop trying
-                self._pending_subscriptions.insert(0, payload)
+                # the connection is going away; the next auth resends the whole set
                 self._handle_item({"_ws_error": True, "error": f"Subscribe send failed: {e}"})
                 break
 
+    def _on_authenticated(self):
+        with self._sub_lock:
+            self._authenticated = True
+            self._sent = {c: set() for c in CHANNELS}
+            self._flush_scheduled = True
+        self._attempt = 0
+        self.connects += 1
+        if self._lost_at is not None:
+            self.reconnects += 1
+            self.last_reconnect_ms = (time.monotonic() - self._lost_at) * 1000
+            self._lost_at = None
+            if self._metrics is not None:
+                self._metrics.reconnects += 1
+                self._metrics.reconnect.record_ns(int(self.last_reconnect_ms * 1e6))
+        self._flush_subscriptions()
+
+    def _on_lost(self):
+        """Connection gone (closed, failed or never opened)."""
+        with self._sub_lock:
+            self._authenticated = False
+        if self._lost_at is None and self.connects:
+            self._lost_at = time.monotonic()
+            self._gap_from_ns = self._last_trade_ns
+
+    def _backoff_s(self) -> float:
+        """Next reconnect delay: exponential in the attempt number, with equal jitter."""
+        delay = min(self.backoff_max_s, self.backoff_min_s * (2 ** min(self._attempt, 30)))
+        self._attempt += 1
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    # ---- frames ----
+
     def _on_message(self, ws, message: str):
+        metrics = self._metrics
+        if metrics is not None:
+            rx_ns = time.time_ns()
+            t0 = time.perf_counter_ns()
         try:
-            data = json.loads(message)
+            # trades become Trade records, everything else stays a dict
+            items = decode_frame(message)
         except Exception:
             return
-        items = data if isinstance(data, list) else [data]
+        if metrics is not None:
+            metrics.decode.record_ns(time.perf_counter_ns() - t0)
+            metrics.frames_in += 1
+            for item in items:
+                if isinstance(item, dict):
+                    item["_rx_ns"] = rx_ns
+                else:
+                    item.rx_ns = rx_ns
+        if items and type(items[-1]) is Trade:
+            if self._gap_from_ns:
+                self._record_gap(items)
+            self._last_trade_ns = items[-1].ts_ns
+        # a frame's quotes travel as one list item: they arrive at many times the trade rate
+        quotes = None
         for item in items:
-            if not self._authenticated:
+            if type(item) is Quote:
+                if quotes is None:
+                    quotes = [item]
+                else:
+                    quotes.append(item)
+                continue
+            if not self._authenticated and isinstance(item, dict):
                 if (item.get("T") == "success" and "authenticated" in item.get("msg", "").lower()) or \
                    (item.get("action") == "auth" and item.get("status") in ("authorized", "authorized.0")):
-                    self._authenticated = True
-                    self._flush_pending_subscriptions()
-            
+                    self._on_authenticated()
+
             self._handle_item(item)
+        if quotes is not None:
+            self._handle_item(quotes)
+
+    def _record_gap(self, items: list):
+        first = next(item for item in items if type(item) is Trade)
+        if first.ts_ns:
+            self.last_gap_ms = (first.ts_ns - self._gap_from_ns) / 1e6
+            if self._metrics is not None:
+                self._metrics.gap.record_ns(first.ts_ns - self._gap_from_ns)
+        self._gap_from_ns = 0
 
     def _on_error(self, ws, error):
         self._handle_item({"_ws_error": True, "error": str(error)})
 
     def _on_close(self, ws, close_status_code=None, close_msg=None):
         self._handle_item({"_ws_closed": True, "code": close_status_code, "msg": close_msg})
-        self._running = False
-        self._authenticated = False
+        self._on_lost()
+
+    # ---- lifecycle ----
 
     def start(self, run_async: bool = True):
         if self._running:
             return
-        
+
         self._authenticated = False
-        self.ws = websocket.WebSocketApp(
-            ALPACA_URL,
-            on_open=self._on_open,
-            on_message=self._on_message,
-            on_error=self._on_error,
-            on_close=self._on_close,
-        )
+        self._stopping.clear()
+        self._running = True
 
         def _run():
-            self._running = True
             try:
-                self.ws.run_forever(ping_interval=self._ping_interval, ping_timeout=self._ping_timeout)
-            except Exception as e:
-                self._handle_item({"_ws_error": True, "error": str(e)})
+                while not self._stopping.is_set():
+                    self.ws = websocket.WebSocketApp(
+                        self._url,
+                        on_open=self._on_open,
+                        on_message=self._on_message,
+                        on_error=self._on_error,
+                        on_close=self._on_close,
+                    )
+                    try:
+                        self.ws.run_forever(ping_interval=self._ping_interval, ping_timeout=self._ping_timeout)
+                    except Exception as e:
+                        self._handle_item({"_ws_error": True, "error": str(e)})
+                    self._on_lost()
+                    if not self.reconnect or self._stopping.wait(self._backoff_s()):
+                        break
             finally:
                 self._running = False
                 self._authenticated = False
@@ -123,6 +294,7 @@ class WebSocketStreamer:
             self.thread.join()
 
     def stop(self, timeout: float = 2.0):
+        self._stopping.set()
         if not self.ws:
             return
         try:
@@ -136,34 +308,54 @@ class WebSocketStreamer:
         self.thread = None
         self._running = False
         self._authenticated = False
-        self._pending_subscriptions.clear()
+        self._pending_raw.clear()
 
     def send_raw(self, payload: dict):
-        if self.ws and getattr(self.ws, "sock", None) and getattr(self.ws.sock, "connected", False):
+        """Send a control payload now, or right after the next authentication."""
+        if self.connected:
             try:
                 self.ws.send(json.dumps(payload))
                 return
             except Exception:
                 pass
-        self._pending_subscriptions.append(payload)
+        self._pending_raw.append(payload)
 
     def subscribe_trades(self, symbols: Iterable[str]):
-        subscribe_msg = {"action": "subscribe", "trades": list(symbols)}
-        self.send_raw(subscribe_msg)
+        self._change(True, {"trades": symbols})
 
     def unsubscribe_trades(self, symbols: Iterable[str]):
-        unsubscribe_msg = {"action": "unsubscribe", "trades": list(symbols)}
-        self.send_raw(unsubscribe_msg)
+        self._change(False, {"trades": symbols})
+
+    def subscribe_quotes(self, symbols: Iterable[str]):
+        self._change(True, {"quotes": symbols})
+
+    def unsubscribe_quotes(self, symbols: Iterable[str]):
+        self._change(False, {"quotes": symbols})
 
     def subscribe(self, trades: Optional[Iterable[str]] = None, quotes: Optional[Iterable[str]] = None, bars: Optional[Iterable[str]] = None):
-        payload = {"action": "subscribe"}
-        if trades:
-            payload["trades"] = list(trades)
-        if quotes:
-            payload["quotes"] = list(quotes)
-        if bars:
-            payload["bars"] = list(bars)
-        self.send_raw(payload)
+        self._change(True, {"trades": trades, "quotes": quotes, "bars": bars})
+
+    def unsubscribe(self, trades: Optional[Iterable[str]] = None, quotes: Optional[Iterable[str]] = None, bars: Optional[Iterable[str]] = None):
+        self._change(False, {"trades": trades, "quotes": quotes, "bars": bars})
+
+    @property
+    def desired(self) -> Dict[str, List[str]]:
+        """Channel -> symbols that are (or will be, once connected) subscribed upstream."""
+        with self._sub_lock:
+            return {c: sorted(syms) for c, syms in self._desired.items()}
+
+    def stats(self) -> Dict:
+        return {
+            "url": self._url,
+            "running": self._running,
+            "connected": bool(self.connected),
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "subscribe_payloads": self.subscribe_payloads,
+            "last_reconnect_ms": self.last_reconnect_ms,
+            "last_gap_ms": self.last_gap_ms,
+            "desired": self.desired,
+        }
 
     @property
     def running(self):
@@ -174,3 +366,93 @@ class WebSocketStreamer:
         return self._running and self._authenticated and \
                self.ws and getattr(self.ws, "sock", None) and \
                getattr(self.ws.sock, "connected", False)
+
+
+class AsyncWebSocketStreamer(WebSocketStreamer):
+    """Same protocol as WebSocketStreamer, but runs as a task on the caller's event loop.
+
+    Items are delivered to ``on_message_cb`` / ``out_queue`` (an ``asyncio.Queue``)
+    from the loop itself, so consumers never cross a thread boundary. Subscription
+    changes must be made from the loop as well.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    async with websockets.connect(
+                        self._url,
+                        ping_interval=self._ping_interval,
+                        ping_timeout=self._ping_timeout,
+                        max_queue=None,
+                    ) as ws:
+                        self.ws = ws
+                        await ws.send(self._auth_payload())
+                        async for message in ws:
+                            self._on_message(ws, message)
+                        self._on_close(ws, ws.close_code, ws.close_reason)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._handle_item({"_ws_error": True, "error": str(e)})
+                self.ws = None
+                self._on_lost()
+                if not self.reconnect:
+                    break
+                await asyncio.sleep(self._backoff_s())
+        finally:
+            self.ws = None
+            self._running = False
+            self._authenticated = False
+
+    def _schedule_flush(self):
+        # subscriptions may be set up before start()
+        (self._loop or asyncio.get_event_loop()).call_later(self.coalesce_s, self._flush_subscriptions)
+
+    def _flush_subscriptions(self):
+        payloads = self._diff()
+        if payloads and self.ws is not None:
+            self._loop.create_task(self._send_all(self.ws, payloads))
+
+    async def _send_all(self, ws, payloads: List[dict]):
+        for payload in payloads:
+            try:
+                await ws.send(json.dumps(payload))
+                self.subscribe_payloads += 1
+            except Exception as e:
+                self._handle_item({"_ws_error": True, "error": f"Subscribe send failed: {e}"})
+                return
+
+    def start(self, run_async: bool = True):
+        if self._running:
+            return
+
+        self._authenticated = False
+        self._loop = asyncio.get_event_loop()
+        self._running = True
+        self.task = self._loop.create_task(self._run())
+
+    def stop(self, timeout: float = 2.0):
+        if self.task and not self.task.done():
+            self.task.cancel()
+
+        self.ws = None
+        self.task = None
+        self._running = False
+        self._authenticated = False
+        self._pending_raw.clear()
+
+    def send_raw(self, payload: dict):
+        if self.connected:
+            self._loop.create_task(self._send_all(self.ws, [payload]))
+            return
+        self._pending_raw.append(payload)
+
+    @property
+    def connected(self):
+        return self._running and self._authenticated and self.ws is not None and self.ws.open
@@ -0,0 +1,119 @@
+"""Compact binary encoding of broadcast messages for /ws clients that negotiate it.
+
+A client opts in by offering the ``SUBPROTOCOL`` websocket subprotocol; everyone else
+keeps getting JSON text frames. A binary frame is a sequence of little-endian records,
+each starting with a one-byte record type:
+
+    SYMBOL   u8 1, u16 id, u8 len, utf-8 name       defines a frame-local symbol id
+    TRADE    u8 2, u16 sym, i64 ts_ms, f64 price, f64 size   (a trade whose timestamp
+             does not parse is sent as JSON, like the text clients get it)
+    BAR      u8 3, u16 sym, u32 bar_s, i64 time_s, f64 open, high, low, close, volume
+    METRICS  u8 4, u16 sym, u32 window_s, f64 vwap, sma, ema20, std (NaN = null)
+    RANGE    u8 6, u16 sym, u32 window_s, f64 min, max, median, u8 n, n x (f64 q, f64 value)
+             order statistics of the METRICS record just before it (same message)
+    BOOK     u8 5, u16 sym, u32 window_s, i64 time_ms, f64 bid, bid_size, ask, ask_size,
+             spread_avg, spread_std (NaN = null; mid / spread are derived by the client)
+    JSON     u8 0, u32 len, utf-8 JSON of one message (control messages, anything else)
+
+Symbol ids are local to a frame (0, 1, ... in order of first use, each defined before
+it is used), so every frame decodes on its own: clients may join at any time and
+queues may drop or conflate frames, and all binary clients share the same bytes.
+"""
+import json
+import math
+import struct
+from typing import Any, Dict, Iterable
+
+from services.decode import Trade, trade_to_dict
+
+SUBPROTOCOL = "stock-streamer.bin.v1"
+
+REC_JSON = 0
+REC_SYMBOL = 1
+REC_TRADE = 2
+REC_BAR = 3
+REC_METRICS = 4
+REC_BOOK = 5
+REC_RANGE = 6
+
+_SYMBOL = struct.Struct("<BHB")
+_TRADE = struct.Struct("<BHqdd")
+_BAR = struct.Struct("<BHIqddddd")
+_METRICS = struct.Struct("<BHIdddd")
+_BOOK = struct.Struct("<BHIqdddddd")
+_RANGE = struct.Struct("<BHIdddB")
+_QUANTILE = struct.Struct("<dd")
+_JSON = struct.Struct("<BI")
+
+_NAN = math.nan
+
+
+def _f(v: Any) -> float:
+    return _NAN if v is None else float(v)
+
+
+def encode(messages: Iterable[Any]) -> bytes:
+    """Binary frame for a list of broadcast messages (one batch)."""
+    out = bytearray()
+    ids: Dict[str, int] = {}
+
+    def sym(symbol: str) -> int:
+        sid = ids.get(symbol)
+        if sid is None:
+            sid = len(ids)
+            ids[symbol] = sid
+            name = symbol.encode()[:255]
+            out.extend(_SYMBOL.pack(REC_SYMBOL, sid, len(name)))
+            out.extend(name)
+        return sid
+
+    for msg in messages:
+        if type(msg) is Trade:
+            if msg.ts_ns:
+                sid = sym(msg.symbol)
+                out += _TRADE.pack(REC_TRADE, sid, msg.ts_ns // 1_000_000, msg.price, msg.size)
+                continue
+            # unparseable timestamp: JSON keeps the original string rather than epoch 0
+            msg = trade_to_dict(msg)
+        kind = msg.get("type") if isinstance(msg, dict) else None
+        # a message that turns out not to fit its records is sent as JSON only: its
+        # partial records and the symbol ids it defined are rolled back
+        mark, known = len(out), len(ids)
+        try:
+            if kind == "bar":
+                out += _BAR.pack(
+                    REC_BAR, sym(msg["symbol"]), int(msg["bar_s"]), int(msg["time"]), _f(msg["open"]),
+                    _f(msg["high"]), _f(msg["low"]), _f(msg["close"]), _f(msg["volume"]),
+                )
+                continue
+            if kind == "metrics":
+                sid, window_s = sym(msg["symbol"]), int(msg.get("window_s") or 0)
+                out += _METRICS.pack(
+                    REC_METRICS, sid, window_s, _f(msg.get("vwap")),
+                    _f(msg.get("sma")), _f(msg.get("ema20")), _f(msg.get("std")),
+                )
+                if "min" in msg:
+                    quantiles = list((msg.get("quantiles") or {}).items())[:255]
+                    out += _RANGE.pack(
+                        REC_RANGE, sid, window_s, _f(msg["min"]), _f(msg["max"]), _f(msg.get("median")),
+                        len(quantiles),
+                    )
+                    for q, v in quantiles:
+                        out += _QUANTILE.pack(float(q), _f(v))
+                continue
+            if kind == "book":
+                out += _BOOK.pack(
+                    REC_BOOK, sym(msg["symbol"]), int(msg.get("window_s") or 0), int(msg["time"]), _f(msg["bid"]),
+                    _f(msg["bid_size"]), _f(msg["ask"]), _f(msg["ask_size"]), _f(msg.get("spread_avg")),
+                    _f(msg.get("spread_std")),
+                )
+                continue
+        except (KeyError, TypeError, ValueError, AttributeError, struct.error):
+            # unexpected shape: send it as JSON instead
+            del out[mark:]
+            while len(ids) > known:
+                ids.popitem()
+        body = json.dumps(msg, default=str).encode()
+        out += _JSON.pack(REC_JSON, len(body))
+        out += body
+    return bytes(out)
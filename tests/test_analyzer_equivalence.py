@@ -0,0 +1,338 @@
+"""Analyzer equivalence tests.
+
+The incremental TickWindow metrics against the list-based reference math
+(statistics.mean / pstdev over prices() and log_returns()), windows sharing a buffer
+against standalone ones, rolling order statistics against sorting the window, bar
+rollups against direct aggregation, batch add_ticks against an add_tick loop, and
+metric reads made from another thread the way the server runs them (queued behind the
+ticks on the ingest thread). Each ``check_*`` returns a list of mismatch descriptions;
+``bench.bench_analyzer --check`` runs the same checks.
+
+    python -m pytest tests
+"""
+import math
+import queue
+import random
+import statistics
+import threading
+
+import numpy as np
+
+from services.analyzer import Analyzer, BarAggregator, TickWindow
+
+
+# ---- list-based reference implementations (the pre-incremental math) ----
+
+def ref_sma(w: TickWindow):
+    ps = w.prices()
+    return statistics.mean(ps) if ps else None
+
+
+def ref_std(w: TickWindow):
+    ps = w.prices()
+    return statistics.pstdev(ps) if len(ps) >= 2 else None
+
+
+def ref_log_return_std(w: TickWindow):
+    lr = w.log_returns()
+    return statistics.pstdev(lr) if lr else None
+
+
+def ref_quantile(w: TickWindow, q: float):
+    ps = w.prices()
+    return float(np.quantile(ps, q)) if ps else None
+
+
+def _close(a, b, rel=1e-7, abs_=1e-9):
+    if a is None or b is None:
+        return a is b
+    return math.isclose(a, b, rel_tol=rel, abs_tol=abs_)
+
+
+def synthetic_ticks(n: int, ticks_per_sec: float, seed: int = 7):
+    rng = random.Random(seed)
+    ts = 1_700_000_000_000
+    price = 100.0
+    step_ms = 1000.0 / ticks_per_sec
+    for _ in range(n):
+        ts += int(rng.expovariate(1.0 / step_ms)) + 1
+        price = max(0.01, price * math.exp(rng.gauss(0, 0.0005)))
+        yield ts, round(price, 4), float(rng.randint(1, 500))
+
+
+def check_equivalence(n: int = 20000) -> list:
+    """Return a list of mismatch descriptions (empty when everything agrees)."""
+    mismatches = []
+    for window_s, rate in ((1, 50.0), (60, 200.0), (5, 5.0)):
+        w = TickWindow(window_s)
+        span = 20
+        alpha = 2 / (span + 1)
+        ref_ema = None
+        for i, (ts, p, s) in enumerate(synthetic_ticks(n, rate, seed=window_s)):
+            w.add(ts, p, s)
+            if ref_ema is not None:
+                ref_ema = alpha * p + (1 - alpha) * ref_ema
+            if i % 97 != 0:
+                continue
+            if ref_ema is None:
+                # seed exactly like TickWindow.ema's first call
+                ref_ema = statistics.mean(w.prices())
+                for q in w.prices():
+                    ref_ema = alpha * q + (1 - alpha) * ref_ema
+            checks = (
+                ("sma", w.sma(), ref_sma(w)),
+                ("std", w.std(), ref_std(w)),
+                ("log_return_std", w.log_return_std(), ref_log_return_std(w)),
+                ("ema", w.ema(span), ref_ema),
+            )
+            for name, got, want in checks:
+                if not _close(got, want):
+                    mismatches.append(f"window={window_s}s tick={i} {name}: {got} != {want}")
+    return mismatches
+
+
+def check_shared_windows(n: int = 20000) -> list:
+    """Windows sharing one SymbolTicks buffer must match standalone TickWindows."""
+    mismatches = []
+    windows = (1, 10, 60)
+    a = Analyzer(default_window_seconds=60, window_seconds=windows)
+    solo = {ws: TickWindow(ws) for ws in windows}
+    for i, (ts, p, s) in enumerate(synthetic_ticks(n, 100.0, seed=11)):
+        a.add_tick("SYM", ts, p, s)
+        for w in solo.values():
+            w.add(ts, p, s)
+        if i == n // 2:
+            # registered late: seeded from the shared buffer's retained history
+            a.register("SYM", window_seconds=(30,))
+            solo[30] = TickWindow(30)
+            for ts2, p2, s2 in a.symbols["SYM"].buffer:
+                solo[30].add(ts2, p2, s2)
+        if i % 101 != 0:
+            continue
+        for ws, w in solo.items():
+            for name, got, want in (
+                ("vwap", a.vwap("SYM", ws), w.vwap()),
+                ("sma", a.sma("SYM", ws), w.sma()),
+                ("std", a.std("SYM", ws), w.std()),
+                ("log_return_std", a._get_window("SYM", ws).log_return_std(), w.log_return_std()),
+            ):
+                if not _close(got, want):
+                    mismatches.append(f"shared window={ws}s tick={i} {name}: {got} != {want}")
+    return mismatches
+
+
+def check_order_stats(n: int = 20000) -> list:
+    """Rolling min/max/quantiles vs sorting the window, per tick, after a late first
+    request, over a shared buffer and after a batch add_ticks rebuild."""
+    mismatches = []
+    qs = (0.0, 0.05, 0.5, 0.95, 1.0)
+    for window_s, rate in ((1, 50.0), (60, 200.0), (5, 5.0)):
+        w = TickWindow(window_s)
+        for i, (ts, p, s) in enumerate(synthetic_ticks(n, rate, seed=window_s + 20)):
+            w.add(ts, p, s)
+            if i < n // 4 or i % 89 != 0:
+                continue  # first requested a quarter of the way in: seeded from the window
+            ps = w.prices()
+            checks = [("min", w.min(), min(ps)), ("max", w.max(), max(ps))]
+            checks += [(f"q{q:g}", w.quantile(q), ref_quantile(w, q)) for q in qs]
+            for name, got, want in checks:
+                if not _close(got, want):
+                    mismatches.append(f"order stats window={window_s}s tick={i} {name}: {got} != {want}")
+    syms, ts, px, sz = mixed_stream(n, 3)
+    a = Analyzer(default_window_seconds=60, window_seconds=(10, 60), quantiles=(0.05, 0.95))
+    bulk = Analyzer(default_window_seconds=60, window_seconds=(10, 60), quantiles=(0.05, 0.95))
+    half = n // 2
+    for i in range(n):
+        a.add_tick(syms[i], ts[i], px[i], sz[i])
+        if i == half:
+            for name in set(syms):
+                a.snapshot(name)  # start tracking halfway through
+    bulk.add_ticks(syms[:half], ts[:half], px[:half], sz[:half])
+    for name in set(syms):
+        bulk.snapshot(name)
+    bulk.add_ticks(syms[half:], ts[half:], px[half:], sz[half:])
+    for name in sorted(set(syms)):
+        for ws in (10, 60):
+            w = a._get_window(name, ws)
+            want = (min(w.prices()), max(w.prices()), ref_quantile(w, 0.5), ref_quantile(w, 0.95))
+            for label, an in (("shared", a), ("batch", bulk)):
+                got = (an.min(name, ws), an.max(name, ws), an.median(name, ws), an.quantile(name, 0.95, ws))
+                if not all(_close(g, e) for g, e in zip(got, want)):
+                    mismatches.append(f"order stats {label} {name} {ws}s: {got} != {want}")
+    return mismatches
+
+
+def check_rollups(n: int = 100000) -> list:
+    """Bars rolled up from 1s bars must equal bars aggregated directly from ticks."""
+    mismatches = []
+    timeframes = (60, 300)
+    a = Analyzer(bar_seconds=(1,) + timeframes, bar_history=n)
+    direct = {tf: BarAggregator(tf) for tf in timeframes}
+    expected = {tf: [] for tf in timeframes}
+    for ts, p, s in synthetic_ticks(n, 20.0, seed=3):
+        a.add_tick("SYM", ts, p, s)
+        for tf, agg in direct.items():
+            bar = agg.add_tick(ts, p, s)
+            if bar:
+                expected[tf].append(bar)
+    for tf in timeframes:
+        got = a.get_recent_bars("SYM", tf, n)
+        if len(got) != len(expected[tf]):
+            mismatches.append(f"rollup {tf}s: {len(got)} bars != {len(expected[tf])}")
+            continue
+        for g, e in zip(got, expected[tf]):
+            if g["time"] != e["time"] or not all(_close(g[k], e[k]) for k in ("open", "high", "low", "close", "volume")):
+                mismatches.append(f"rollup {tf}s bar {e['time']}: {g} != {e}")
+                break
+    return mismatches
+
+
+def mixed_stream(n: int, n_symbols: int, seed: int = 17):
+    """(symbols, ts_ms, prices, sizes) columns of one time-ordered stream over n_symbols."""
+    names = [f"S{i:04d}" for i in range(n_symbols)]
+    rng = random.Random(seed)
+    syms, ts, px, sz = [], [], [], []
+    for t, p, s in synthetic_ticks(n, 1000.0, seed=seed):
+        k = rng.randrange(n_symbols)
+        syms.append(names[k])
+        ts.append(t)
+        px.append(p * (1 + k * 0.01))
+        sz.append(s)
+    return syms, ts, px, sz
+
+
+def _order_stats_mismatch(a: Analyzer, msg: dict):
+    """msg's min/max/median/q0.95 vs sorting the symbol's default window now, or None."""
+    w = a._get_window(msg["symbol"], a.default_window_seconds)
+    ps = w.prices()
+    if not ps:
+        return None
+    got = (msg["min"], msg["max"], msg["median"], msg["quantiles"]["0.95"])
+    want = (min(ps), max(ps), ref_quantile(w, 0.5), ref_quantile(w, 0.95))
+    if all(_close(g, e) for g, e in zip(got, want)):
+        return None
+    return f"threaded reads {msg['symbol']}: {got} != {want}"
+
+
+def check_threaded_reads(n: int = 100_000, n_symbols: int = 3000) -> list:
+    """Metric passes requested from another thread while ticks are ingested, run on the
+    ingest thread between ticks (the server's threaded mode: reads seed EMA and order
+    statistics lazily, which add_tick then updates, so they must never overlap)."""
+    mismatches = []
+    syms, ts, px, sz = mixed_stream(n, n_symbols, seed=29)
+    names = sorted(set(syms))
+    a = Analyzer(default_window_seconds=60, window_seconds=(10, 60), quantiles=(0.05, 0.95))
+    items: queue.Queue = queue.Queue(maxsize=10_000)
+    fed = threading.Event()
+
+    def ingest():
+        while True:
+            item = items.get()
+            if item is None:
+                return
+            try:
+                if callable(item):
+                    item()
+                else:
+                    a.add_tick(*item)
+            except Exception as e:
+                mismatches.append(f"threaded reads: ingest raised {e!r}")
+
+    def reader():
+        rng = random.Random(5)
+        while not fed.is_set():
+            done = threading.Event()
+            batch = rng.sample(names, 500)
+
+            def metrics_pass():
+                for msg in a.snapshots(batch):
+                    bad = _order_stats_mismatch(a, msg)
+                    if bad:
+                        mismatches.append(bad)
+                done.set()
+
+            items.put(metrics_pass)
+            done.wait()
+
+    threads = [threading.Thread(target=ingest), threading.Thread(target=reader)]
+    for t in threads:
+        t.start()
+    for i in range(n):
+        items.put((syms[i], ts[i], px[i], sz[i]))
+    fed.set()
+    threads[1].join()
+    items.put(None)
+    threads[0].join()
+    for msg in a.snapshots(names):
+        bad = _order_stats_mismatch(a, msg)
+        if bad:
+            mismatches.append(bad)
+    return mismatches
+
+
+def check_batch_ingest(n: int = 50000) -> list:
+    """Analyzer.add_ticks must leave the same state and return the same bars as add_tick."""
+    mismatches = []
+    syms, ts, px, sz = mixed_stream(n, 7)
+    kwargs = dict(default_window_seconds=60, window_seconds=(10, 60), bar_seconds=(1, 60, 300), bar_history=n)
+    one, bulk = Analyzer(**kwargs), Analyzer(**kwargs)
+    want, got = [], []
+    for i in range(n):
+        want.extend(one.add_tick(syms[i], ts[i], px[i], sz[i]))
+    # in a few chunks, as drained from a queue
+    for lo in range(0, n, n // 3):
+        got.extend(bulk.add_ticks(syms[lo:lo + n // 3], ts[lo:lo + n // 3], px[lo:lo + n // 3], sz[lo:lo + n // 3]))
+
+    def key(b):
+        return b["symbol"], b["bar_s"], b["time"]
+
+    want.sort(key=key)
+    got.sort(key=key)
+    if len(want) != len(got):
+        mismatches.append(f"batch ingest: {len(got)} bars != {len(want)}")
+    for g, e in zip(got, want):
+        if key(g) != key(e) or not all(_close(g[k], e[k]) for k in ("open", "high", "low", "close", "volume")):
+            mismatches.append(f"batch ingest bar {key(e)}: {g} != {e}")
+            break
+    for name in sorted(set(syms)):
+        for ws in (10, 60):
+            for metric in ("vwap", "sma", "std"):
+                a, b = getattr(one, metric)(name, ws), getattr(bulk, metric)(name, ws)
+                if not _close(a, b):
+                    mismatches.append(f"batch ingest {name} {ws}s {metric}: {b} != {a}")
+    return mismatches
+
+
+CHECKS = (
+    check_equivalence, check_shared_windows, check_order_stats, check_rollups, check_batch_ingest,
+    check_threaded_reads,
+)
+
+
+def run_checks() -> list:
+    """Every check's mismatches, in order (empty when everything agrees)."""
+    return [m for check in CHECKS for m in check()]
+
+
+def test_equivalence():
+    assert check_equivalence() == []
+
+
+def test_shared_windows():
+    assert check_shared_windows() == []
+
+
+def test_order_stats():
+    assert check_order_stats() == []
+
+
+def test_rollups():
+    assert check_rollups() == []
+
+
+def test_batch_ingest():
+    assert check_batch_ingest() == []
+
+
+def test_threaded_reads():
+    assert check_threaded_reads() == []